@@ -37,15 +37,45 @@ HUGGING_FACE_TOKEN = ''
 # Path to save model caching to.
 MODEL_CACHE_PATH = BASE_DIR.joinpath('webui/files/models')
 
+# Path to save decoded audio to. Media is decoded once into 16 kHz mono audio that is shared by every processing stage.
+AUDIO_CACHE_PATH = BASE_DIR.joinpath('webui/files/audio')
+
+# Number of days decoded audio is kept after it was last used. Set to 0 to keep decoded audio forever.
+AUDIO_CACHE_MAX_AGE = 30
+
+# Upload handlers that hash uploaded files while they are received so identical media can be deduplicated.
+FILE_UPLOAD_HANDLERS = [
+   'webui.uploadhandlers.HashingMemoryFileUploadHandler',
+   'webui.uploadhandlers.HashingTemporaryFileUploadHandler',
+]
+
 # Should speaker names be uppercase in file downloads?
 UPPERCASE_SPEAKER_NAMES = True
 
+# Number of seconds file downloads are cached for. Cached downloads are replaced when segments are edited.
+EXPORT_CACHE_TIMEOUT = 86400
+
+# Max number of characters in a cached file download. Larger downloads are not cached.
+EXPORT_CACHE_MAX_SIZE = 5_000_000
+
+# Max number of transcriptions in a bulk ZIP download. The export_transcriptions command has no limit.
+BULK_EXPORT_MAX_TRANSCRIPTIONS = 100
+
 # Default max number of characters per segment.
 MAX_SEGMENT_LENGTH = 42
 
 # Default max length of segments in seconds.
 MAX_SEGMENT_TIME = 7
 
+# Number of seconds between saving batches of segments while a transcription is running.
+SEGMENT_FLUSH_INTERVAL = 10
+
+# Number of seconds between checkpoints of a running transcription. Interrupted transcriptions resume from the last checkpoint.
+CHECKPOINT_INTERVAL = 60
+
+# Minimum number of seconds between saving the progress of a running process.
+PROGRESS_UPDATE_INTERVAL = 5
+
 # The default for the language spoken in the audio. Set to None or '' for auto detection as a default.
 WHISPER_LANGUAGE = 'en'
 
@@ -63,19 +93,62 @@ WHISPER_MODELS = [
 # The default whisper model to show. Leave empty or set to None for default behavior.
 WHISPER_MODEL_DEFAULT = 'base'
 
+# Number of CPU threads used by Whisper when running on the CPU. Set to 0 to use the default.
+WHISPER_CPU_THREADS = 0
+
+# The default for how audio is transcribed. 'sequential' transcribes the whole file in a single call. 'batched' decodes several speech chunks at once using faster-whisper's batched inference pipeline. 'parallel' splits the audio into chunks at silences and transcribes the chunks across PARALLEL_PROCESSES processes (CPU only, requires 'daemonize_workers': False in Q_CLUSTER).
+TRANSCRIPTION_MODE = 'sequential'
+
+# Run diarization at the same time as transcription instead of after it. Speakers are assigned once both have finished.
+CONCURRENT_DIARIZATION = False
+
+# Default number of speech chunks decoded at once by the batched transcription mode.
+WHISPER_BATCH_SIZE = 8
+
+# Number of processes used by the parallel transcription mode.
+PARALLEL_PROCESSES = 2
+
+# Target length (in seconds) of the chunks used by the parallel transcription mode.
+PARALLEL_CHUNK_LENGTH = 60*10
+
+# Memory budget (in MB) for Whisper models and the diarization pipeline kept loaded between jobs by the queue worker. Least recently used models are unloaded once the budget is exceeded. Set to 0 to disable model caching.
+MODEL_CACHE_MAX_MEMORY = 8192
+
+# Number of seconds a cached model can go unused before it is unloaded. Set to 0 to keep models until the memory budget is exceeded.
+MODEL_CACHE_IDLE_TIMEOUT = 60*60
+
 # Enable/disable Django-Q.
 USE_DJANGO_Q = True
 
 Q_CLUSTER = {
     'name': 'DjangORM',
     'workers': 1,
-    'recycle': 2,
+    'recycle': 50,
     'timeout': 60*60*24,
     'retry': 60*60*25, # https://django-q2.readthedocs.io/en/master/configure.html#retry
     'max_attempts': 1,
     'queue_limit': 100,
     'bulk': 10,
-    'orm': 'default'
+    'orm': 'default',
+    # Workers must not be daemonized to start the processes used by parallel transcription
+    'daemonize_workers': False,
+}
+
+# Log messages from the queue worker, such as the model cache counters, to the console.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'webui': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
 }
 
 ##### END WHISPERSCRIBE SPECIFIC CONFIGURATION #####
@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.utils.text import Truncator
 
 from .models import *
+from .utils import resume_submission
 
 
 class TranscriptonAdmin(admin.ModelAdmin):
@@ -10,6 +11,7 @@ class TranscriptonAdmin(admin.ModelAdmin):
    """
    _max_chars = 200
    list_display = ('title', 'get_description', 'get_notes', 'upload_file', 'meta', 'submitted')
+   actions = ['resume_transcriptions']
 
    def get_description(self, obj):
       """
@@ -25,6 +27,14 @@ class TranscriptonAdmin(admin.ModelAdmin):
       trunc = Truncator(obj.notes)
       return trunc.chars(self._max_chars)
 
+   @admin.action(description='Resume selected failed transcriptions')
+   def resume_transcriptions(self, request, queryset):
+      """
+      Resumes the selected transcriptions that have failed or been cancelled.
+      """
+      resumed = sum(resume_submission(transcription) for transcription in queryset)
+      self.message_user(request, f'{resumed} transcription(s) resumed.')
+
    get_description.short_description = 'description'
    get_notes.short_description = 'notes'
 
@@ -1,5 +1,8 @@
+from django.db import transaction
 from django.http import HttpResponse, JsonResponse
 from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.timezone import localtime
 
 from .models import *
 from .utils import is_float, format_seconds
@@ -7,6 +10,121 @@ from .utils import is_float, format_seconds
 import json
 
 
+def api_transcriptions(request):
+   """
+   Handles API GET requests for a page of completed or failed transcriptions using the
+   DataTables server-side processing protocol. Searches the title, description, and
+   notes and orders by title or submitted time.
+
+   Returns:
+      JsonResponse: JSON of the requested page of transcriptions and the number of
+      transcriptions before and after searching.
+   """
+   ORDER_FIELDS = {'1': 'title', '2': 'submitted'}
+   MAX_LENGTH = 100
+   PROCESSES = [TranscriptionStatus.DOWNLOADING, TranscriptionStatus.TRANSCRIBING, TranscriptionStatus.DIARIZING]
+
+   if 'X-Requested-With' not in request.headers or request.headers['X-Requested-With'] != 'XMLHttpRequest':
+      return JsonResponse({'message': 'malformed header'}, status=400)
+
+   if request.method != 'GET':
+      return JsonResponse({'message': 'bad request'}, status=400)
+
+   try:
+      draw = int(request.GET.get('draw', 0))
+      start = max(int(request.GET.get('start', 0)), 0)
+      length = int(request.GET.get('length', 10))
+      # A length of -1 requests every row, which is capped like any other length
+      length = MAX_LENGTH if length < 0 else min(length, MAX_LENGTH)
+   except ValueError:
+      return JsonResponse({'message': 'bad request'}, status=400)
+
+   transcriptions = Transcription.objects.finished()
+   records_total = transcriptions.count()
+   search = request.GET.get('search[value]', '').strip()
+
+   if search:
+      transcriptions = transcriptions.search(search)
+      records_filtered = transcriptions.count()
+   else:
+      records_filtered = records_total
+
+   order_field = ORDER_FIELDS.get(request.GET.get('order[0][column]'), 'submitted')
+   order_prefix = '-' if request.GET.get('order[0][dir]') == 'desc' else ''
+   transcriptions = transcriptions.order_by(f'{order_prefix}{order_field}', f'{order_prefix}id')
+
+   transcriptions = transcriptions[start:start + length]
+
+   data = []
+
+   for transcription in transcriptions.with_statuses():
+      statuses = [transcription.get_status_of(process) for process in PROCESSES]
+      data.append({
+         'DT_RowId': f'transcription-{transcription.id}',
+         'title': transcription.title,
+         'submitted': localtime(transcription.submitted).strftime('%Y-%m-%d %H:%M:%S'),
+         'details': render_to_string('webui/_transcription_details.html', {'transcription': transcription}),
+         'statuses': [{'status': status.status, 'error_message': status.error_message} if status else None for status in statuses],
+         'resumable': any(status and status.status == TranscriptionStatus.FAILED for status in statuses),
+         'urls': {name: reverse(f'webui:{name}', args=[transcription.id]) for name in [
+            'edit', 'view', 'download_text_blob', 'download_text', 'download_srt', 'download_vtt', 'download_json', 'resume', 'delete',
+         ]},
+      })
+
+   return JsonResponse({
+      'draw': draw,
+      'recordsTotal': records_total,
+      'recordsFiltered': records_filtered,
+      'data': data,
+   })
+
+
+def api_transcriptions_segments(request, transcription_id):
+   """
+   Handles API GET requests for a page of a transcription's segments. The page starts at
+   an offset, or if a time is given, at the page of the segment playing at that time.
+   Pages start at multiples of the limit when a time is given.
+
+   Args:
+      transcription_id (int): ID of the transcription whose segments are requested.
+
+   Returns:
+      JsonResponse: JSON of the rendered segments, the offset of the page, and the total
+      number of segments.
+   """
+   MAX_LIMIT = 500
+
+   if 'X-Requested-With' not in request.headers or request.headers['X-Requested-With'] != 'XMLHttpRequest':
+      return JsonResponse({'message': 'malformed header'}, status=400)
+
+   if request.method != 'GET':
+      return JsonResponse({'message': 'bad request'}, status=400)
+
+   if not Transcription.objects.filter(pk=transcription_id).exists():
+      return JsonResponse({'message': f'transcripton {transcription_id} not found'}, status=404)
+
+   try:
+      offset = max(int(request.GET.get('offset', 0)), 0)
+      limit = min(max(int(request.GET.get('limit', 50)), 1), MAX_LIMIT)
+      time = float(request.GET['time']) if 'time' in request.GET else None
+   except ValueError:
+      return JsonResponse({'message': 'bad request'}, status=400)
+
+   segments = Segment.objects.filter(transcription_id=transcription_id)
+
+   # The segment playing at a time is the last one that starts before it
+   if time is not None:
+      offset = max(segments.filter(start__lte=time).count() - 1, 0) // limit * limit
+
+   data = {
+      'segments': [render_to_string('webui/_segment.html', {'segment': segment}) for segment in segments[offset:offset + limit]],
+      'offset': offset,
+      'total': segments.count(),
+   }
+
+   return JsonResponse(data, status=200)
+
+
 def api_transcriptions_id(request, transcription_id):
    """
    Handles API POST requests to update transcriptions.
@@ -99,7 +217,9 @@ def api_segments(request):
          text = ' ',
       )
 
-      new_segment.save()
+      with transaction.atomic():
+         new_segment.save()
+         Transcription.objects.filter(pk=new_segment.transcription_id).bump_version()
 
       # Create segment from template part
       rendered_segment = render_to_string('webui/_segment.html', {'segment': new_segment})
@@ -114,6 +234,107 @@ def api_segments(request):
    return JsonResponse({'message': 'bad request'}, status=400)
 
 
+def api_segments_batch(request):
+   """
+   Handles API POST requests that create, update, and delete segments in a batch. The
+   batch is applied in a single transaction and nothing is saved if any part of it is
+   invalid. When a segment field is updated more than once the last value is kept.
+
+   The request body is JSON with optional creates (a list of segments with
+   transcription, start, end, text, and speaker keys), updates (a list of {id, field,
+   value}), and deletes (a list of segment IDs).
+
+   Returns:
+      JsonResponse: JSON message, the number of updated and deleted segments, the
+      rendered created segments, and the status of the result. A 404 response lists the
+      missing segment IDs.
+   """
+   FIELDS = ['speaker', 'start', 'end', 'text']
+
+   if 'X-Requested-With' not in request.headers or request.headers['X-Requested-With'] != 'XMLHttpRequest':
+      return JsonResponse({'message': 'malformed header'}, status=400)
+
+   if request.method != 'POST':
+      return JsonResponse({'message': 'bad request'}, status=400)
+
+   try:
+      data = json.loads(request.body)
+      creates = data.get('creates', [])
+      deletes = {int(segment_id) for segment_id in data.get('deletes', [])}
+      updates = {}
+
+      # Coalesce updates so each segment field is written once
+      for update in data.get('updates', []):
+         segment_id = int(update['id'])
+         field = update['field']
+         value = update.get('value', '')
+
+         if isinstance(value, str):
+            value = value.strip()
+
+         if field not in FIELDS or value is None:
+            return JsonResponse({'message': 'bad request'}, status=400)
+
+         if field in ['start', 'end'] and not is_float(value):
+            return JsonResponse({'message': f'{field} value is not numeric'}, status=400)
+
+         if segment_id not in deletes:
+            updates.setdefault(segment_id, {})[field] = float(value) if field in ['start', 'end'] else value
+
+      new_segments = []
+
+      for create in creates:
+         if not is_float(create.get('start', 0)) or not is_float(create.get('end', 0)):
+            return JsonResponse({'message': 'start and end values must be numeric'}, status=400)
+
+         new_segments.append(Segment(
+            transcription_id=int(create['transcription']),
+            start=float(create.get('start', 0)),
+            end=float(create.get('end', 0)),
+            text=create.get('text') or ' ',
+            speaker=create.get('speaker') or '',
+         ))
+   except (ValueError, TypeError, KeyError, AttributeError):
+      return JsonResponse({'message': 'bad request'}, status=400)
+
+   # The transcriptions of all new segments are checked in one query
+   create_ids = {segment.transcription_id for segment in new_segments}
+
+   if create_ids and Transcription.objects.filter(pk__in=create_ids).count() != len(create_ids):
+      return JsonResponse({'message': 'bad request'}, status=400)
+
+   segments = Segment.objects.in_bulk(list(updates) + list(deletes))
+   missing = (set(updates) | deletes) - set(segments)
+
+   if missing:
+      return JsonResponse({'message': f'segment {min(missing)} not found', 'missing': sorted(missing)}, status=404)
+
+   for segment_id, fields in updates.items():
+      for field, value in fields.items():
+         setattr(segments[segment_id], field, value)
+
+   updated_fields = sorted({field for fields in updates.values() for field in fields})
+
+   with transaction.atomic():
+      Segment.objects.filter(pk__in=deletes).delete()
+
+      if updates:
+         Segment.objects.bulk_update([segments[segment_id] for segment_id in updates], updated_fields)
+
+      Segment.objects.bulk_create(new_segments)
+      changed = {segment.transcription_id for segment in segments.values()} | {segment.transcription_id for segment in new_segments}
+      Transcription.objects.filter(pk__in=changed).bump_version()
+
+   data = {
+      'message': 'success',
+      'updated': len(updates),
+      'deleted': len(deletes),
+      'created': [render_to_string('webui/_segment.html', {'segment': segment}) for segment in new_segments],
+   }
+
+   return JsonResponse(data, status=200)
+
+
 def api_segments_id(request, segment_id):
    """
    Handles API POST requests to update segments.
@@ -141,7 +362,10 @@ def api_segments_id(request, segment_id):
          value = value.strip()
 
       if method == 'DELETE':
-         segment.delete()
+         with transaction.atomic():
+            segment.delete()
+            Transcription.objects.filter(pk=segment.transcription_id).bump_version()
+
          return HttpResponse(status=204)
 
       # Allow value of speaker to be an empty string
@@ -150,7 +374,11 @@ def api_segments_id(request, segment_id):
             return JsonResponse({'message': f'{field} value is not numeric'}, status=400)
 
          setattr(segment, field, value)
-         segment.save(update_fields=[field])
+
+         with transaction.atomic():
+            segment.save(update_fields=[field])
+            Transcription.objects.filter(pk=segment.transcription_id).bump_version()
+
          return JsonResponse({'message': 'sucess'}, status=200)
 
    return JsonResponse({'message': 'bad request'}, status=400)
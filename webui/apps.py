@@ -1,6 +1,20 @@
 from django.apps import AppConfig
 
 
+def fail_stale_statuses(sender, **kwargs):
+    """
+    Fails statuses left processing by workers that stopped, when a Django Q worker starts.
+    """
+    from .utils import fail_stale_statuses
+
+    fail_stale_statuses(check_workers=True)
+
+
 class WebuiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'webui'
+
+    def ready(self):
+        from django_q.signals import post_spawn
+
+        post_spawn.connect(fail_stale_statuses, dispatch_uid='webui_fail_stale_statuses')
@@ -0,0 +1,201 @@
+from django.conf import settings
+
+from pathlib import Path
+import hashlib
+import numpy as np
+import os
+import struct
+import subprocess
+import time
+import uuid
+
+
+SAMPLE_RATE = 16000
+
+
+def get_file_hash(file):
+   """
+   Calculates the SHA-256 hash of a file's contents.
+
+   Args:
+      file (str|Path): The path to the file.
+
+   Returns:
+      str: The hex digest of the file.
+   """
+   CHUNK_SIZE = 1024 * 1024
+   hasher = hashlib.sha256()
+
+   with open(file, 'rb') as f:
+      while chunk := f.read(CHUNK_SIZE):
+         hasher.update(chunk)
+
+   return hasher.hexdigest()
+
+
+def decode_audio(file, content_hash=None):
+   """
+   Decodes a media file once into a 16 kHz mono 16-bit PCM WAV file that is shared by
+   every processing stage. The decoded file is cached on disk and keyed by the content
+   of the media file, so decoding the same media again is skipped.
+
+   Args:
+      file (str|Path): The path to the media file.
+      content_hash (str): The SHA-256 hash of the media file. Calculated if not given.
+
+   Returns:
+      Path: The path to the decoded WAV file.
+
+   Raises:
+      Exception: If ffmpeg fails to decode the media file.
+   """
+   if not content_hash:
+      content_hash = get_file_hash(file)
+
+   cache_dir = Path(settings.AUDIO_CACHE_PATH)
+   cache_dir.mkdir(parents=True, exist_ok=True)
+   output_file = cache_dir.joinpath(f'{content_hash}.wav')
+
+   if output_file.exists():
+      # Mark the file as recently used so it is not pruned
+      output_file.touch()
+      return output_file
+
+   prune_audio_cache()
+   temp_file = cache_dir.joinpath(f'{uuid.uuid4().hex}.tmp')
+
+   cmd = [
+      'ffmpeg',
+      '-nostdin',
+      '-v', 'error',
+      '-i', str(file),
+      '-vn',
+      '-map_metadata', '-1',
+      '-ac', '1',
+      '-ar', str(SAMPLE_RATE),
+      '-acodec', 'pcm_s16le',
+      '-f', 'wav',
+      str(temp_file),
+   ]
+
+   try:
+      result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+
+      if result.returncode != 0:
+         raise Exception(f'Error decoding audio: {result.stderr}')
+
+      # Rename is atomic so other processes never read a partially written file
+      os.replace(temp_file, output_file)
+   finally:
+      temp_file.unlink(True)
+
+   return output_file
+
+
+def prune_audio_cache():
+   """
+   Deletes decoded audio files that have not been used within AUDIO_CACHE_MAX_AGE days.
+   """
+   if not settings.AUDIO_CACHE_MAX_AGE: return
+
+   cutoff = time.time() - settings.AUDIO_CACHE_MAX_AGE * 24 * 60 * 60
+
+   for audio_file in Path(settings.AUDIO_CACHE_PATH).glob('*.wav'):
+      try:
+         if audio_file.stat().st_mtime < cutoff:
+            audio_file.unlink()
+      except FileNotFoundError:
+         pass
+
+
+def find_data_chunk(file):
+   """
+   Locates the sample data of a WAV file.
+
+   Args:
+      file (str|Path): The path to the WAV file.
+
+   Returns:
+      tuple: The byte offset and byte length of the data chunk.
+
+   Raises:
+      Exception: If the file is not a WAV file or has no data chunk.
+   """
+   with open(file, 'rb') as f:
+      riff, _, wave = struct.unpack('<4sI4s', f.read(12))
+
+      if riff != b'RIFF' or wave != b'WAVE':
+         raise Exception(f'{file} is not a WAV file.')
+
+      while header := f.read(8):
+         chunk_id, chunk_size = struct.unpack('<4sI', header)
+
+         if chunk_id == b'data':
+            return f.tell(), chunk_size
+
+         # Chunks are padded to an even number of bytes
+         f.seek(chunk_size + (chunk_size % 2), os.SEEK_CUR)
+
+   raise Exception(f'{file} has no data chunk.')
+
+
+def load_audio(file):
+   """
+   Memory maps the samples of a decoded WAV file without reading them into memory.
+
+   Args:
+      file (str|Path): The path to a WAV file created by decode_audio.
+
+   Returns:
+      numpy.memmap: A read-only array of int16 samples.
+   """
+   offset, size = find_data_chunk(file)
+   return np.memmap(file, dtype=np.int16, mode='r', offset=offset, shape=(size // 2,))
+
+
+def get_audio_duration(file):
+   """
+   Gets the duration of a decoded WAV file from its header.
+
+   Args:
+      file (str|Path): The path to a WAV file created by decode_audio.
+
+   Returns:
+      float: The duration of the audio in seconds.
+   """
+   _, size = find_data_chunk(file)
+   return size / 2 / SAMPLE_RATE
+
+
+def to_float32(samples):
+   """
+   Converts int16 samples to float32 samples in the range [-1.0, 1.0).
+
+   Args:
+      samples (numpy.ndarray): The int16 samples.
+
+   Returns:
+      numpy.ndarray: The float32 samples.
+   """
+   audio = samples.astype(np.float32)
+   audio /= 32768.0
+   return audio
+
+
+def load_waveform(file):
+   """
+   Loads a decoded WAV file as an in-memory waveform that Pyannote.Audio pipelines accept
+   in place of a file path, so the audio is not decoded again.
+
+   Args:
+      file (str|Path): The path to a WAV file created by decode_audio.
+
+   Returns:
+      dict: The (channel, time) float32 waveform tensor and its sample rate.
+   """
+   import torch
+
+   return {
+      'waveform': torch.from_numpy(to_float32(load_audio(file))).unsqueeze(0),
+      'sample_rate': SAMPLE_RATE,
+   }
@@ -0,0 +1,433 @@
+import abc
+import io
+import numpy as np
+
+
+def decode_seconds(times):
+   """
+   Converts times to Python floats.
+
+   Args:
+      times (numpy.ndarray): The float64 times.
+
+   Returns:
+      list of float: The times in seconds.
+   """
+   return times.astype(np.float64, copy=False).tolist()
+
+
+def encode_speakers(speakers):
+   """
+   Dictionary encodes a sequence of speaker labels.
+
+   Args:
+      speakers (list of str): The speaker label of each row.
+
+   Returns:
+      tuple: The sorted list of distinct labels and the int32 code of each row.
+   """
+   labels, codes = np.unique(np.array(speakers, dtype=str), return_inverse=True)
+   return labels.tolist(), codes.astype(np.int32)
+
+
+class Columns(abc.ABC):
+   """
+   Base class for columnar tables stored as compressed NumPy archives. Columns are
+   decoded from the archive the first time any of them is used.
+
+   Attributes:
+      COLUMNS (list of str): The names of the columns saved in the archive.
+   """
+   COLUMNS = []
+
+   def __init__(self, **columns):
+      self._blob = None
+      self._columns = columns
+
+   @classmethod
+   def from_bytes(cls, data):
+      """
+      Creates a table from bytes made by to_bytes without decoding it.
+
+      Args:
+         data (bytes): The compressed archive.
+
+      Returns:
+         Columns: The table.
+      """
+      table = cls()
+      table._blob = bytes(data)
+      table._columns = None
+      return table
+
+   def to_bytes(self):
+      """
+      Returns the table as a compressed NumPy archive.
+      """
+      if self._columns is None:
+         return self._blob
+
+      buffer = io.BytesIO()
+      np.savez_compressed(buffer, **{name: self.column(name) for name in self.COLUMNS})
+      return buffer.getvalue()
+
+   def column(self, name):
+      """
+      Returns a column, decoding the archive on first use.
+
+      Args:
+         name (str): The name of the column.
+
+      Returns:
+         numpy.ndarray: The column.
+      """
+      if self._columns is None:
+         with np.load(io.BytesIO(self._blob), allow_pickle=False) as archive:
+            self._columns = {key: archive[key] for key in self.COLUMNS}
+
+      return self._columns[name]
+
+   @property
+   def start(self):
+      return self.column('start')
+
+   @property
+   def end(self):
+      return self.column('end')
+
+   @property
+   def speaker_codes(self):
+      return self.column('speaker_codes')
+
+   @property
+   def speakers(self):
+      return self.column('speakers').tolist()
+
+   def __len__(self):
+      return len(self.start)
+
+   def __iter__(self):
+      return iter(self.to_dicts())
+
+   def __getitem__(self, index):
+      if isinstance(index, slice):
+         return self.take(np.arange(len(self))[index])
+
+      if index < 0:
+         index += len(self)
+
+      if not 0 <= index < len(self):
+         raise IndexError(f'{type(self).__name__} index out of range')
+
+      return self.take([index]).to_dicts()[0]
+
+   def __eq__(self, other):
+      if isinstance(other, Columns):
+         return type(self) is type(other) and self.to_dicts() == other.to_dicts()
+
+      return NotImplemented
+
+   def speaker_labels(self):
+      """
+      Returns the speaker label of each row.
+      """
+      speakers = self.speakers
+      return [speakers[code] for code in self.speaker_codes.tolist()]
+
+   def sorted(self):
+      """
+      Returns the table sorted by start time. The sort is stable.
+      """
+      order = np.argsort(self.start, kind='stable')
+
+      if np.all(order[:-1] < order[1:]):
+         return self
+
+      return self.take(order)
+
+   @abc.abstractmethod
+   def take(self, indices):
+      """
+      Returns a table with the given rows.
+
+      Args:
+         indices (numpy.ndarray): The row indices.
+      """
+
+   @abc.abstractmethod
+   def to_dicts(self):
+      """
+      Returns the rows as a list of dictionaries.
+      """
+
+
+class WordList(Columns):
+   """
+   A columnar list of transcribed words. Times and probabilities are float64 arrays, so
+   they round trip exactly however long the recording is, speakers are dictionary
+   encoded, and the text of all words is packed into a single UTF-8 buffer with an
+   offsets array. It can be used wherever a list of word dictionaries was used:
+   iterating and indexing it return dictionaries.
+
+   Columns:
+      start (float64): The start time of each word in seconds.
+      end (float64): The end time of each word in seconds.
+      probability (float64): The probability of each word, NaN if unknown.
+      speaker_codes (int32): The index of each word's speaker in speakers.
+      speakers (str): The distinct speaker labels.
+      text (uint8): The UTF-8 text of all words.
+      offsets (int64): Where the text of each word starts in text, with the end of the
+         buffer as the last value.
+   """
+   COLUMNS = ['start', 'end', 'probability', 'speaker_codes', 'speakers', 'text', 'offsets']
+
+   def __init__(self, **columns):
+      super().__init__(**columns)
+      self._words = None
+
+   @classmethod
+   def from_dicts(cls, words):
+      """
+      Creates a word list from a list of word dictionaries.
+
+      Args:
+         words (list of dict): Words with start, end, word, probability, and speaker keys.
+
+      Returns:
+         WordList: The word list.
+      """
+      encoded = [word['word'].encode('utf-8') for word in words]
+      offsets = np.zeros(len(words) + 1, dtype=np.int64)
+      np.cumsum([len(text) for text in encoded], out=offsets[1:])
+      speakers, speaker_codes = encode_speakers([word.get('speaker') or '' for word in words])
+      word_list = cls(
+         start=np.array([word['start'] for word in words], dtype=np.float64),
+         end=np.array([word['end'] for word in words], dtype=np.float64),
+         probability=np.array([np.nan if word.get('probability') is None else word['probability'] for word in words], dtype=np.float64),
+         speaker_codes=speaker_codes,
+         speakers=np.array(speakers, dtype=str),
+         text=np.frombuffer(b''.join(encoded), dtype=np.uint8),
+         offsets=offsets,
+      )
+      word_list._words = [word['word'] for word in words]
+      return word_list
+
+   @classmethod
+   def concatenate(cls, word_lists):
+      """
+      Joins word lists end to end.
+
+      Args:
+         word_lists (list of WordList): The word lists to join.
+
+      Returns:
+         WordList: The words of every word list in order.
+      """
+      word_lists = [word_list for word_list in word_lists if len(word_list)]
+
+      if not word_lists:
+         return cls.from_dicts([])
+
+      if len(word_lists) == 1:
+         return word_lists[0]
+
+      # Speakers are encoded again because each word list has its own labels
+      speakers, speaker_codes = encode_speakers(np.concatenate([word_list.column('speakers')[word_list.speaker_codes] for word_list in word_lists]))
+      text_lengths = np.cumsum([0] + [len(word_list.column('text')) for word_list in word_lists[:-1]])
+      word_list = cls(
+         start=np.concatenate([word_list.start for word_list in word_lists]),
+         end=np.concatenate([word_list.end for word_list in word_lists]),
+         probability=np.concatenate([word_list.probability for word_list in word_lists]),
+         speaker_codes=speaker_codes,
+         speakers=np.array(speakers, dtype=str),
+         text=np.concatenate([word_list.column('text') for word_list in word_lists]),
+         offsets=np.concatenate([[0]] + [word_list.column('offsets')[1:] + length for word_list, length in zip(word_lists, text_lengths.tolist())]).astype(np.int64),
+      )
+
+      if all(word_list._words is not None for word_list in word_lists):
+         word_list._words = [word for word_list in word_lists for word in word_list._words]
+
+      return word_list
+
+   @property
+   def probability(self):
+      return self.column('probability')
+
+   @property
+   def words(self):
+      """
+      The text of each word, decoded from the text buffer on first use.
+      """
+      if self._words is None:
+         text = self.column('text').tobytes()
+         offsets = self.column('offsets').tolist()
+         self._words = [text[start:end].decode('utf-8') for start, end in zip(offsets, offsets[1:])]
+
+      return self._words
+
+   def lengths(self):
+      """
+      Returns the number of characters of each word, counted in the UTF-8 text buffer
+      without decoding it.
+      """
+      # Every byte except the continuation bytes (0b10xxxxxx) starts a character
+      characters = np.zeros(len(self.column('text')) + 1, dtype=np.int64)
+      np.cumsum((self.column('text') & 0xC0) != 0x80, out=characters[1:])
+      offsets = self.column('offsets')
+      return characters[offsets[1:]] - characters[offsets[:-1]]
+
+   def join(self, starts, ends):
+      """
+      Joins the text of consecutive runs of words, decoding each run once.
+
+      Args:
+         starts (numpy.ndarray): The index of the first word of each run.
+         ends (numpy.ndarray): The index after the last word of each run.
+
+      Returns:
+         list of str: The text of each run.
+      """
+      text = self.column('text').tobytes()
+      offsets = self.column('offsets')
+      return [text[start:end].decode('utf-8') for start, end in zip(offsets[starts].tolist(), offsets[ends].tolist())]
+
+   def take(self, indices):
+      indices = np.asarray(indices, dtype=np.intp)
+      words = self.words
+      selected = [words[index] for index in indices.tolist()]
+      encoded = [word.encode('utf-8') for word in selected]
+      offsets = np.zeros(len(selected) + 1, dtype=np.int64)
+      np.cumsum([len(text) for text in encoded], out=offsets[1:])
+
+      word_list = WordList(
+         start=self.start[indices],
+         end=self.end[indices],
+         probability=self.probability[indices],
+         speaker_codes=self.speaker_codes[indices],
+         speakers=self.column('speakers'),
+         text=np.frombuffer(b''.join(encoded), dtype=np.uint8),
+         offsets=offsets,
+      )
+      word_list._words = selected
+      return word_list
+
+   def with_speakers(self, codes, speakers):
+      """
+      Returns a copy of the word list with new speakers.
+
+      Args:
+         codes (numpy.ndarray): The index of each word's speaker in speakers, -1 for no
+            speaker.
+         speakers (list of str): The speaker labels.
+
+      Returns:
+         WordList: The word list with the new speakers.
+      """
+      speakers = list(speakers) + ['']
+      codes = np.where(np.asarray(codes) >= 0, codes, len(speakers) - 1).astype(np.int32)
+      word_list = WordList(**{name: self.column(name) for name in self.COLUMNS})
+      word_list._columns.update(speaker_codes=codes, speakers=np.array(speakers, dtype=str))
+      word_list._words = self._words
+      return word_list
+
+   def to_dicts(self):
+      probabilities = self.probability.tolist()
+
+      return [
+         {
+            'start': start,
+            'end': end,
+            'word': word,
+            'probability': None if probability != probability else probability,
+            'speaker': speaker,
+         }
+         for start, end, word, probability, speaker in zip(
+            decode_seconds(self.start),
+            decode_seconds(self.end),
+            self.words,
+            probabilities,
+            self.speaker_labels(),
+         )
+      ]
+
+
+class SpeakerTurns(Columns):
+   """
+   A columnar list of diarized speaker turns. Iterating and indexing it return
+   dictionaries with start, end, and speaker keys.
+
+   Columns:
+      start (float64): The start time of each turn in seconds.
+      end (float64): The end time of each turn in seconds.
+      speaker_codes (int32): The index of each turn's speaker in speakers.
+      speakers (str): The distinct speaker labels.
+   """
+   COLUMNS = ['start', 'end', 'speaker_codes', 'speakers']
+
+   @classmethod
+   def from_dicts(cls, turns):
+      """
+      Creates speaker turns from a list of turn dictionaries.
+
+      Args:
+         turns (list of dict): Turns with start, end, and speaker keys.
+
+      Returns:
+         SpeakerTurns: The speaker turns.
+      """
+      speakers, speaker_codes = encode_speakers([turn['speaker'] for turn in turns])
+
+      return cls(
+         start=np.array([turn['start'] for turn in turns], dtype=np.float64),
+         end=np.array([turn['end'] for turn in turns], dtype=np.float64),
+         speaker_codes=speaker_codes,
+         speakers=np.array(speakers, dtype=str),
+      )
+
+   def take(self, indices):
+      indices = np.asarray(indices, dtype=np.intp)
+
+      return SpeakerTurns(
+         start=self.start[indices],
+         end=self.end[indices],
+         speaker_codes=self.speaker_codes[indices],
+         speakers=self.column('speakers'),
+      )
+
+   def to_dicts(self):
+      return [
+         {'start': start, 'end': end, 'speaker': speaker}
+         for start, end, speaker in zip(decode_seconds(self.start), decode_seconds(self.end), self.speaker_labels())
+      ]
+
+
+def as_word_list(words):
+   """
+   Returns words as a WordList.
+
+   Args:
+      words (WordList|list of dict): The words. None is treated as an empty list.
+
+   Returns:
+      WordList: The words.
+   """
+   if isinstance(words, WordList):
+      return words
+
+   return WordList.from_dicts(words or [])
+
+
+def as_speaker_turns(turns):
+   """
+   Returns speaker turns as SpeakerTurns.
+
+   Args:
+      turns (SpeakerTurns|list of dict): The turns. None is treated as an empty list.
+
+   Returns:
+      SpeakerTurns: The speaker turns.
+   """
+   if isinstance(turns, SpeakerTurns):
+      return turns
+
+   return SpeakerTurns.from_dicts(turns or [])
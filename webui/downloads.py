@@ -1,11 +1,20 @@
 from django.shortcuts import get_object_or_404
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.conf import settings
+from django.core.cache import cache
+from django.utils.dateparse import parse_date
+from django.utils.timezone import localtime
+from django.views.decorators.http import condition
 
-from .models import Transcription
-from .utils import format_seconds
+from .models import Segment, Transcription
+from .utils import format_timestamp
 
-import json, re
+import json, re, zipfile
+
+
+# Segments read from the database at a time and size of the streamed chunks in characters
+SEGMENT_CHUNK_SIZE = 2_000
+STREAM_CHUNK_SIZE = 65_536
 
 
 def format_filename(name):
@@ -25,139 +34,464 @@ def format_filename(name):
    return remove_pattern.sub('', name)
 
 
-def download_text(request, transcription_id):
+def format_speaker(speaker):
    """
-   Downloads a formatted text file of the requested transcription, including speaker
-   names if available.
+   Formats a speaker name for exports, uppercased if UPPERCASE_SPEAKER_NAMES is set.
 
    Args:
-      transcription_id (int): ID of the transcription to download.
+      speaker (str): The speaker name.
 
    Returns:
-      HttpResponse: A formatted text file of the transcription.
+      str: The formatted speaker name.
    """
-   transcription = get_object_or_404(Transcription, pk=transcription_id)
-   segments = transcription.segments.all()
-   output = ''
+   return speaker.upper() if settings.UPPERCASE_SPEAKER_NAMES else speaker
+
+
+def iterate_segments(transcription, *fields):
+   """
+   Iterates over the values of a transcription's segments in order without loading
+   them all into memory.
+
+   Args:
+      transcription (Transcription): The transcription whose segments are exported.
+      *fields (str): The segment fields to return.
 
-   for segment in segments:
-      if segment.speaker:
-         if settings.UPPERCASE_SPEAKER_NAMES:
-            output += segment.speaker.upper()
-         else:
-            output += segment.speaker
+   Returns:
+      iterator: Tuples of the field values of each segment.
+   """
+   return Segment.objects.filter(transcription=transcription).values_list(*fields).iterator(chunk_size=SEGMENT_CHUNK_SIZE)
 
-         output += ':\t'
 
-      output += segment.text + '\n\n'
+def rstrip_chunks(chunks, characters):
+   """
+   Strips characters from the end of streamed text like str.rstrip would strip them
+   from the whole text. Only trailing characters are held back.
 
-   output = output.rstrip('\n') + '\n'
+   Args:
+      chunks (iterable of str): The text.
+      characters (str): The characters to strip.
 
-   return HttpResponse(output, headers = {
-      'Content-Type': 'text/plain',
-      'Content-Disposition': f'attachment; filename="{format_filename(transcription.title)}.txt"',
-   })
+   Yields:
+      str: The text without the trailing characters.
+   """
+   held = ''
 
+   for chunk in chunks:
+      stripped = chunk.rstrip(characters)
 
-def download_text_blob(request, transcription_id):
+      if stripped:
+         yield held + stripped
+         held = chunk[len(stripped):]
+      else:
+         held += chunk
+
+
+def buffer_chunks(chunks, size=STREAM_CHUNK_SIZE):
    """
-   Downloads a text blob of the requested transcription.
+   Joins small pieces of streamed text into chunks of about the given size, so the
+   response is not sent one segment at a time.
 
    Args:
-      transcription_id (int): ID of the transcription to download.
+      chunks (iterable of str): The text.
+      size (int): The number of characters to buffer before yielding.
+
+   Yields:
+      str: The joined chunks.
+   """
+   buffer = []
+   length = 0
+
+   for chunk in chunks:
+      buffer.append(chunk)
+      length += len(chunk)
+
+      if length >= size:
+         yield ''.join(buffer)
+         buffer = []
+         length = 0
+
+   if buffer:
+      yield ''.join(buffer)
+
+
+def cache_chunks(chunks, key):
+   """
+   Passes streamed text through and caches the whole text once it has been streamed,
+   unless it is longer than EXPORT_CACHE_MAX_SIZE characters.
+
+   Args:
+      chunks (iterable of str): The text.
+      key (str): The cache key.
+
+   Yields:
+      str: The text.
+   """
+   cached = []
+   length = 0
+
+   for chunk in chunks:
+      if cached is not None:
+         length += len(chunk)
+         cached.append(chunk)
+
+         if length > settings.EXPORT_CACHE_MAX_SIZE:
+            cached = None
+
+      yield chunk
+
+   if cached is not None:
+      cache.set(key, ''.join(cached), settings.EXPORT_CACHE_TIMEOUT)
+
+
+def format_export_version(version):
+   """
+   Formats the version of a transcription's exports. Exports change with the segments
+   and with UPPERCASE_SPEAKER_NAMES.
+
+   Args:
+      version (int): The version of the transcription.
 
    Returns:
-      HttpResponse: A text blob of the transcription.
+      str: The export version.
    """
-   transcription = get_object_or_404(Transcription, pk=transcription_id)
-   segments = transcription.segments.all()
-   output = ''
+   return f'{version}-upper' if settings.UPPERCASE_SPEAKER_NAMES else f'{version}'
 
-   for segment in segments:
-      output += segment.text + ' '
 
-   output = output.rstrip(' ')
+def get_export_version(request, transcription_id):
+   """
+   Returns the export version of a transcription and when its segments last changed.
+   The version is read once per request and kept on the request.
 
-   return HttpResponse(output, headers = {
-      'Content-Type': 'text/plain',
-      'Content-Disposition': f'attachment; filename="{format_filename(transcription.title)}.txt"',
-   })
+   Args:
+      request (HttpRequest): The export request.
+      transcription_id (int): ID of the transcription.
 
+   Returns:
+      tuple: The export version and the time the segments last changed, or None if the
+      transcription does not exist.
+   """
+   if not hasattr(request, 'export_version'):
+      version = Transcription.objects.filter(pk=transcription_id).values_list('version', 'modified').first()
+      request.export_version = version and (format_export_version(version[0]), version[1])
 
-def download_srt(request, transcription_id):
+   return request.export_version
+
+
+def export_condition(export_format):
    """
-   Downloads an SRT of the requested transcription, including speaker names if
+   Creates a decorator that answers conditional GET requests for an export with the
+   version of the transcription as ETag and the last segment change as Last-Modified.
+
+   Args:
+      export_format (str): The name of the export format.
+
+   Returns:
+      callable: The decorator.
+   """
+   def etag(request, transcription_id):
+      version = get_export_version(request, transcription_id)
+      return version and f'{transcription_id}-{export_format}-{version[0]}'
+
+   def last_modified(request, transcription_id):
+      version = get_export_version(request, transcription_id)
+      return version and version[1]
+
+   return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def stream_download(chunks, transcription, export_format, extension, content_type):
+   """
+   Creates an attachment response from the export cache, or streams the export and
+   caches it for the current version of the transcription.
+
+   Args:
+      chunks (callable): Called with the transcription and yields the file contents.
+      transcription (Transcription): The exported transcription.
+      export_format (str): The name of the export format.
+      extension (str): The file extension.
+      content_type (str): The content type of the file.
+
+   Returns:
+      HttpResponse|StreamingHttpResponse: The file download.
+   """
+   key = f'export:{transcription.id}:{export_format}:{format_export_version(transcription.version)}'
+   headers = {
+      'Content-Type': content_type,
+      'Content-Disposition': f'attachment; filename="{format_filename(transcription.title)}.{extension}"',
+   }
+   cached = cache.get(key)
+
+   if cached is not None:
+      return HttpResponse(cached, headers=headers)
+
+   return StreamingHttpResponse(cache_chunks(buffer_chunks(chunks(transcription)), key), headers=headers)
+
+
+def text_chunks(transcription):
+   """
+   Yields a formatted text file of a transcription, including speaker names if
    available.
+   """
+   def segments():
+      for speaker, text in iterate_segments(transcription, 'speaker', 'text'):
+         yield f'{format_speaker(speaker)}:\t{text}\n\n' if speaker else f'{text}\n\n'
+
+   yield from rstrip_chunks(segments(), '\n')
+   yield '\n'
+
+
+def text_blob_chunks(transcription):
+   """
+   Yields a text blob of a transcription.
+   """
+   yield from rstrip_chunks((f'{text} ' for (text,) in iterate_segments(transcription, 'text')), ' ')
+
+
+def srt_chunks(transcription):
+   """
+   Yields an SRT file of a transcription, including speaker names if available.
+   """
+   def segments():
+      for count, (start, end, speaker, text) in enumerate(iterate_segments(transcription, 'start', 'end', 'speaker', 'text'), 1):
+         speaker = f'{format_speaker(speaker)}: ' if speaker else ''
+         yield f'{count!s}\n{format_timestamp(start, True, ",")} --> {format_timestamp(end, True, ",")}\n{speaker}{text}\n\n'
+
+   yield from rstrip_chunks(segments(), '\n')
+   yield '\n'
+
+
+def vtt_chunks(transcription):
+   """
+   Yields a VTT file of a transcription, including speaker names if available.
+   """
+   def segments():
+      yield 'WEBVTT\n\n'
+
+      for start, end, speaker, text in iterate_segments(transcription, 'start', 'end', 'speaker', 'text'):
+         speaker = f'{format_speaker(speaker)}: ' if speaker else ''
+         yield f'{format_timestamp(start)} --> {format_timestamp(end)}\n{speaker}{text}\n\n'
+
+   yield from rstrip_chunks(segments(), '\n')
+   yield '\n'
+
+
+def json_chunks(transcription):
+   """
+   Yields a JSON array of the segments of a transcription.
+   """
+   FIELDS = ['id', 'transcription_id', 'start', 'end', 'text', 'speaker', 'probability']
+   separator = '['
+
+   for values in iterate_segments(transcription, *FIELDS):
+      yield separator + json.dumps(dict(zip(FIELDS, values)))
+      separator = ', '
+
+   yield ']' if separator == ', ' else '[]'
+
+
+# The exporters of each format and their file extensions
+EXPORT_FORMATS = {
+   'text': (text_chunks, 'txt'),
+   'text_blob': (text_blob_chunks, 'txt'),
+   'srt': (srt_chunks, 'srt'),
+   'vtt': (vtt_chunks, 'vtt'),
+   'json': (json_chunks, 'json'),
+}
+
+
+class ZipStream:
+   """
+   A write only file that holds what ZipFile writes to it until it is read, so an
+   archive can be streamed while it is written. ZipFile writes data descriptors instead
+   of seeking back because the stream cannot tell or seek.
+   """
+   def __init__(self):
+      self._chunks = []
+
+   def write(self, data):
+      self._chunks.append(bytes(data))
+      return len(data)
+
+   def flush(self):
+      pass
+
+   def read(self):
+      """
+      Returns and clears everything written since the last read.
+      """
+      data = b''.join(self._chunks)
+      self._chunks = []
+      return data
+
+
+def zip_chunks(transcriptions, export_formats):
+   """
+   Yields a ZIP archive of exports of transcriptions as it is written. Each export is
+   streamed into the archive by the exporter used for single downloads, and saved in a
+   folder named after its format.
 
    Args:
-      transcription_id (int): ID of the transcription to download.
+      transcriptions (QuerySet): The transcriptions to export.
+      export_formats (list of str): The names of the export formats in EXPORT_FORMATS.
+
+   Yields:
+      bytes: The archive.
+   """
+   stream = ZipStream()
+
+   with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+      for transcription in transcriptions.only('id', 'title', 'modified').iterator():
+         for export_format in export_formats:
+            chunks, extension = EXPORT_FORMATS[export_format]
+            filename = f'{export_format}/{transcription.id}_{format_filename(transcription.title)}.{extension}'
+            info = zipfile.ZipInfo(filename, date_time=localtime(transcription.modified).timetuple()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+
+            with archive.open(info, 'w') as entry:
+               for chunk in buffer_chunks(chunks(transcription)):
+                  entry.write(chunk.encode('utf-8'))
+                  yield stream.read()
+
+            yield stream.read()
+
+   # The central directory is written when the archive is closed
+   yield stream.read()
+
+
+def select_transcriptions(ids=None, search=None, after=None, before=None):
+   """
+   Selects completed or failed transcriptions to export, ordered by submitted time.
+
+   Args:
+      ids (list of int): Only export these transcriptions if given.
+      search (str): Only export transcriptions whose title, description, or notes
+         contain this text if given.
+      after (date): Only export transcriptions submitted on or after this date if given.
+      before (date): Only export transcriptions submitted before this date if given.
 
    Returns:
-      HttpResponse: An SRT file of the transcription.
+      QuerySet: The selected transcriptions.
    """
-   transcription = get_object_or_404(Transcription, pk=transcription_id)
-   segments = transcription.segments.all()
-   output = ''
-   count = 1
+   transcriptions = Transcription.objects.finished()
+
+   if ids:
+      transcriptions = transcriptions.filter(pk__in=ids)
+
+   if search:
+      transcriptions = transcriptions.search(search)
+
+   if after:
+      transcriptions = transcriptions.filter(submitted__date__gte=after)
+
+   if before:
+      transcriptions = transcriptions.filter(submitted__date__lt=before)
+
+   return transcriptions.order_by('submitted', 'id')
+
+
+def download_zip(request):
+   """
+   Downloads a ZIP archive of exports of several transcriptions. The transcriptions are
+   selected by id, search, after, and before query parameters (see
+   select_transcriptions) and the formats by format parameters, SRT and VTT by default.
+   At least one selection parameter is required and at most
+   BULK_EXPORT_MAX_TRANSCRIPTIONS transcriptions can be selected.
 
-   for segment in segments:
-      output += f'{count!s}\n'
-      output += f'{format_seconds(segment.start, True, ",")} --> {format_seconds(segment.end, True, ",")}\n'
+   Returns:
+      StreamingHttpResponse: A ZIP archive of the exports.
+   """
+   export_formats = request.GET.getlist('format') or ['srt', 'vtt']
+
+   if any(export_format not in EXPORT_FORMATS for export_format in export_formats):
+      return JsonResponse({'message': f'formats must be in {", ".join(EXPORT_FORMATS)}'}, status=400)
 
-      if segment.speaker:
-         if settings.UPPERCASE_SPEAKER_NAMES:
-            output += segment.speaker.upper()
-         else:
-            output += segment.speaker
+   try:
+      selection = {
+         'ids': [int(transcription_id) for transcription_id in request.GET.getlist('id')],
+         'search': request.GET.get('search', '').strip(),
+         'after': parse_date(request.GET.get('after', '')),
+         'before': parse_date(request.GET.get('before', '')),
+      }
+   except ValueError:
+      return JsonResponse({'message': 'bad request'}, status=400)
 
-         output += ': '
+   if not any(selection.values()):
+      return JsonResponse({'message': 'select transcriptions with id, search, after, or before'}, status=400)
 
-      output += f'{segment.text}\n\n'
-      count += 1
+   transcriptions = select_transcriptions(**selection)
 
-   output = output.rstrip('\n') + '\n'
+   if transcriptions.count() > settings.BULK_EXPORT_MAX_TRANSCRIPTIONS:
+      return JsonResponse({'message': f'at most {settings.BULK_EXPORT_MAX_TRANSCRIPTIONS} transcriptions can be exported at once'}, status=400)
 
-   return HttpResponse(output, headers = {
-      'Content-Type': 'text/plain',
-      'Content-Disposition': f'attachment; filename="{format_filename(transcription.title)}.srt"',
+   return StreamingHttpResponse(zip_chunks(transcriptions, export_formats), headers = {
+      'Content-Type': 'application/zip',
+      'Content-Disposition': 'attachment; filename="transcriptions.zip"',
    })
 
 
-def download_vtt(request, transcription_id):
+@export_condition('text')
+def download_text(request, transcription_id):
    """
-   Downloads a VTT of the requested transcription, including speaker names if available.
+   Downloads a formatted text file of the requested transcription, including speaker
+   names if available.
 
    Args:
       transcription_id (int): ID of the transcription to download.
 
    Returns:
-      HttpResponse: A VTT file of the transcription.
+      StreamingHttpResponse: A formatted text file of the transcription.
    """
    transcription = get_object_or_404(Transcription, pk=transcription_id)
-   segments = transcription.segments.all()
-   output = 'WEBVTT\n\n'
+   return stream_download(text_chunks, transcription, 'text', 'txt', 'text/plain')
 
-   for segment in segments:
-      output += f'{format_seconds(segment.start)} --> {format_seconds(segment.end)}\n'
 
-      if segment.speaker:
-         if settings.UPPERCASE_SPEAKER_NAMES:
-            output += segment.speaker.upper()
-         else:
-            output += segment.speaker
+@export_condition('text_blob')
+def download_text_blob(request, transcription_id):
+   """
+   Downloads a text blob of the requested transcription.
 
-         output += ': '
+   Args:
+      transcription_id (int): ID of the transcription to download.
 
-      output += f'{segment.text}\n\n'
+   Returns:
+      StreamingHttpResponse: A text blob of the transcription.
+   """
+   transcription = get_object_or_404(Transcription, pk=transcription_id)
+   return stream_download(text_blob_chunks, transcription, 'text_blob', 'txt', 'text/plain')
 
-   output = output.rstrip('\n') + '\n'
 
-   return HttpResponse(output, headers = {
-      'Content-Type': 'text/vtt',
-      'Content-Disposition': f'attachment; filename="{format_filename(transcription.title)}.vtt"',
-   })
+@export_condition('srt')
+def download_srt(request, transcription_id):
+   """
+   Downloads an SRT of the requested transcription, including speaker names if
+   available.
+
+   Args:
+      transcription_id (int): ID of the transcription to download.
+
+   Returns:
+      StreamingHttpResponse: An SRT file of the transcription.
+   """
+   transcription = get_object_or_404(Transcription, pk=transcription_id)
+   return stream_download(srt_chunks, transcription, 'srt', 'srt', 'text/plain')
 
 
+@export_condition('vtt')
+def download_vtt(request, transcription_id):
+   """
+   Downloads a VTT of the requested transcription, including speaker names if available.
+
+   Args:
+      transcription_id (int): ID of the transcription to download.
+
+   Returns:
+      StreamingHttpResponse: A VTT file of the transcription.
+   """
+   transcription = get_object_or_404(Transcription, pk=transcription_id)
+   return stream_download(vtt_chunks, transcription, 'vtt', 'vtt', 'text/vtt')
+
+
+@export_condition('json')
 def download_json(request, transcription_id):
    """
    Downloads a JSON representation of the requested transcription, including speaker
@@ -167,18 +501,7 @@ def download_json(request, transcription_id):
       transcription_id (int): ID of the transcription to download.
 
    Returns:
-      HttpResponse: A JSON representation of the transcription.
+      StreamingHttpResponse: A JSON representation of the transcription.
    """
    transcription = get_object_or_404(Transcription, pk=transcription_id)
-   segments = transcription.segments.all()
-   output = []
-
-   for segment in segments:
-      segment_dict = segment.__dict__
-      del segment_dict['_state']
-      output.append(segment_dict)
-
-   return HttpResponse(json.dumps(output), headers = {
-      'Content-Type': 'application/json',
-      'Content-Disposition': f'attachment; filename="{format_filename(transcription.title)}.json"',
-   })
+   return stream_download(json_chunks, transcription, 'json', 'json', 'application/json')
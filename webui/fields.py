@@ -0,0 +1,59 @@
+from django.db import models
+
+from .columns import SpeakerTurns, WordList
+
+import base64
+
+
+class ColumnarField(models.BinaryField):
+   """
+   Stores a columnar table as a compressed binary blob. Values are loaded as instances
+   of column_class without being decoded, and lists of dictionaries are encoded when
+   saved.
+
+   Attributes:
+      column_class (type): The Columns subclass stored in the field.
+   """
+   column_class = None
+
+   def from_db_value(self, value, expression, connection):
+      if value is None:
+         return None
+
+      return self.column_class.from_bytes(value)
+
+   def to_python(self, value):
+      if value is None or isinstance(value, self.column_class):
+         return value
+
+      if isinstance(value, list):
+         return self.column_class.from_dicts(value)
+
+      return self.column_class.from_bytes(super().to_python(value))
+
+   def get_prep_value(self, value):
+      if value is None or isinstance(value, (bytes, memoryview)):
+         return value
+
+      if isinstance(value, list):
+         value = self.column_class.from_dicts(value)
+
+      return value.to_bytes()
+
+   def value_to_string(self, obj):
+      value = self.get_prep_value(self.value_from_object(obj))
+      return None if value is None else base64.b64encode(value).decode('ascii')
+
+
+class WordListField(ColumnarField):
+   """
+   Stores a transcription's words as a WordList.
+   """
+   column_class = WordList
+
+
+class SpeakerTurnsField(ColumnarField):
+   """
+   Stores a transcription's diarization as SpeakerTurns.
+   """
+   column_class = SpeakerTurns
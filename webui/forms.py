@@ -2,6 +2,13 @@ from django import forms
 from django.conf import settings
 
 
+MODE_CHOICES = (
+   ('sequential', 'Sequential'),
+   ('batched', 'Batched'),
+   ('parallel', 'Parallel (CPU)'),
+)
+
+
 def create_model_choices():
    """
    Helper function that returns tuples of model choices defined in the settings.
@@ -31,6 +38,8 @@ class TranscriptionForm(forms.Form):
       vad_filter: Optional boolean field to enable voice activity detection.
       max_segment_length: Optional field for specifying the maximum segment length.
       max_segment_time: Optional field for specifying the maximum segment time.
+      mode: Choice field for selecting how the audio is transcribed.
+      batch_size: Optional field for specifying the batch size of the batched mode.
 
    Validation:
       Ensures that at least one of 'upload_file' or 'upload_url' is provided.
@@ -54,6 +63,17 @@ class TranscriptionForm(forms.Form):
    )
    max_segment_length = forms.IntegerField(required=False, initial=settings.MAX_SEGMENT_LENGTH)
    max_segment_time = forms.IntegerField(required=False, initial=settings.MAX_SEGMENT_TIME)
+   mode = forms.ChoiceField(
+      choices=MODE_CHOICES,
+      initial=settings.TRANSCRIPTION_MODE,
+      help_text='Batched decodes several speech chunks at once and always uses the VAD filter. Parallel splits the audio across processes when running on the CPU.',
+   )
+   batch_size = forms.IntegerField(
+      required=False,
+      min_value=1,
+      initial=settings.WHISPER_BATCH_SIZE,
+      help_text='Number of speech chunks decoded at once in batched mode.',
+   )
 
 
    # Add form-control class to form fields.
@@ -87,3 +107,33 @@ class TranscriptionForm(forms.Form):
          msg = 'You must either upload a file or provide an upload URL.'
          self.add_error('upload_file', msg)
          self.add_error('upload_url', msg)
+
+
+class RediarizeForm(forms.Form):
+   """
+   A Django form for rerunning diarization with new speaker counts.
+
+   Fields:
+      num_speakers: Optional field for the exact number of speakers.
+      min_speakers: Optional field for the minimum number of speakers.
+      max_speakers: Optional field for the maximum number of speakers.
+
+   Validation:
+      Ensures that min_speakers is not greater than max_speakers.
+   """
+   num_speakers = forms.IntegerField(required=False, min_value=1)
+   min_speakers = forms.IntegerField(required=False, min_value=1)
+   max_speakers = forms.IntegerField(required=False, min_value=1)
+
+
+   def clean(self):
+      """
+      Perform custom validation to ensure that min_speakers is not greater than
+      max_speakers.
+      """
+      cleaned_data = super().clean()
+      min_speakers = cleaned_data.get('min_speakers')
+      max_speakers = cleaned_data.get('max_speakers')
+
+      if min_speakers and max_speakers and min_speakers > max_speakers:
+         self.add_error('min_speakers', 'The minimum number of speakers cannot be greater than the maximum.')
@@ -0,0 +1,118 @@
+import numpy as np
+
+
+def sweep_intervals(starts, ends, labels, num_labels):
+   """
+   Splits labeled intervals into elementary intervals between consecutive boundaries in
+   a single sweep. Every elementary interval is either fully covered by a label or not
+   covered at all, so any number of overlapping labels is handled.
+
+   Args:
+      starts (numpy.ndarray): The start times of the intervals.
+      ends (numpy.ndarray): The end times of the intervals.
+      labels (numpy.ndarray): The label index (0 to num_labels - 1) of each interval.
+      num_labels (int): The number of distinct labels.
+
+   Returns:
+      tuple: The sorted boundaries (k + 1 values) and a (k, num_labels) bool array that
+         is True where a label covers the elementary interval between boundaries i and
+         i + 1.
+   """
+   starts = np.asarray(starts, dtype=np.float64)
+   ends = np.asarray(ends, dtype=np.float64)
+   labels = np.asarray(labels, dtype=np.intp)
+   boundaries = np.unique(np.concatenate([starts, ends]))
+
+   # +1 where a label starts and -1 where it ends, the running sum is the active count
+   deltas = np.zeros((len(boundaries), num_labels), dtype=np.int32)
+   np.add.at(deltas, (np.searchsorted(boundaries, starts), labels), 1)
+   np.add.at(deltas, (np.searchsorted(boundaries, ends), labels), -1)
+   coverage = np.cumsum(deltas, axis=0)[:-1] > 0
+
+   return boundaries, coverage
+
+
+def covered_time(boundaries, coverage, times):
+   """
+   Calculates for each label how long it is active between the first boundary and each
+   of the given times.
+
+   Args:
+      boundaries (numpy.ndarray): The boundaries returned by sweep_intervals.
+      coverage (numpy.ndarray): The coverage returned by sweep_intervals.
+      times (numpy.ndarray): The times to measure up to.
+
+   Returns:
+      numpy.ndarray: A (len(times), num_labels) array of covered seconds.
+   """
+   times = np.asarray(times, dtype=np.float64)
+   widths = np.diff(boundaries)
+   cumulative = np.zeros((len(boundaries), coverage.shape[1]))
+   np.cumsum(coverage * widths[:, None], axis=0, out=cumulative[1:])
+
+   # Coverage is constant inside an elementary interval so the cumulative time is linear
+   return np.stack([np.interp(times, boundaries, cumulative[:, label]) for label in range(coverage.shape[1])], axis=1)
+
+
+def assign_labels(boundaries, coverage, starts, ends):
+   """
+   Assigns each query interval the label that overlaps it the longest. Intervals that
+   no label overlaps get the label of the next covered elementary interval, or of the
+   last one if there is none after them.
+
+   Args:
+      boundaries (numpy.ndarray): The boundaries returned by sweep_intervals.
+      coverage (numpy.ndarray): The coverage returned by sweep_intervals.
+      starts (numpy.ndarray): The start times of the query intervals.
+      ends (numpy.ndarray): The end times of the query intervals.
+
+   Returns:
+      numpy.ndarray: The label index of each query interval, or -1 if there are no
+         labeled intervals.
+   """
+   starts = np.asarray(starts, dtype=np.float64)
+   ends = np.asarray(ends, dtype=np.float64)
+   covered = np.flatnonzero(coverage.any(axis=1))
+
+   if not len(covered):
+      return np.full(len(starts), -1, dtype=np.intp)
+
+   overlap = covered_time(boundaries, coverage, ends) - covered_time(boundaries, coverage, starts)
+   assigned = np.argmax(overlap, axis=1)
+   unassigned = np.flatnonzero(overlap[np.arange(len(starts)), assigned] <= 0)
+
+   if len(unassigned):
+      # The first covered interval that ends after the start, like a forward pointer would find
+      following = np.searchsorted(boundaries[covered + 1], starts[unassigned], side='right')
+      nearest = covered[np.minimum(following, len(covered) - 1)]
+      assigned[unassigned] = np.argmax(coverage[nearest], axis=1)
+
+   return assigned
+
+
+def separate_overlaps(boundaries, coverage):
+   """
+   Merges elementary intervals into non-overlapping runs that are each covered by a
+   single label or by more than one label.
+
+   Args:
+      boundaries (numpy.ndarray): The boundaries returned by sweep_intervals.
+      coverage (numpy.ndarray): The coverage returned by sweep_intervals.
+
+   Returns:
+      tuple: The start times, end times, and label index of each run. The label is -2
+         where more than one label is active. Runs without any label are left out.
+   """
+   if not len(coverage):
+      return boundaries[:0], boundaries[:0], np.zeros(0, dtype=np.intp)
+
+   active = coverage.sum(axis=1)
+   labels = np.where(active > 1, -2, np.argmax(coverage, axis=1))
+   labels[active == 0] = -1
+
+   # A run starts wherever the label differs from the previous elementary interval
+   run_starts = np.flatnonzero(np.concatenate([[True], labels[1:] != labels[:-1]]))
+   run_ends = np.append(run_starts[1:], len(labels))
+   keep = labels[run_starts] != -1
+
+   return boundaries[run_starts[keep]], boundaries[run_ends[keep]], labels[run_starts[keep]]
@@ -0,0 +1,249 @@
+from django.core.management.base import BaseCommand
+
+from webui.columns import WordList
+from webui.models import Segment, Transcription
+from webui.media import assign_speakers, diarize_separate_overlaps, resegment_word_list
+
+from functools import partial
+import copy
+import random
+import time
+
+
+class Command(BaseCommand):
+   """
+   Benchmarks transcript processing on synthetic transcripts, comparing the current
+   implementation against a reference copy of the implementation it replaced.
+   """
+   help = 'Benchmarks transcript processing on synthetic transcripts.'
+
+   def add_arguments(self, parser):
+      parser.add_argument('benchmark', choices=list(BENCHMARKS), help='The benchmark to run.')
+      parser.add_argument('--words', type=int, nargs='+', default=[100_000], help='The number of words in the synthetic transcripts.')
+      parser.add_argument('--speakers', type=int, default=4, help='The number of speakers in the synthetic transcripts.')
+      parser.add_argument('--repeat', type=int, default=3, help='The number of runs, the fastest run is reported.')
+      parser.add_argument('--seed', type=int, default=0, help='The random seed used to generate the transcripts.')
+      parser.add_argument('--max-characters', type=int, default=42, help='The max segment length used by the resegment benchmark.')
+      parser.add_argument('--max-time', type=float, default=7, help='The max segment time used by the resegment benchmark.')
+
+   def handle(self, *args, **options):
+      self.stdout.write(f'{"words":>10} {"implementation":>16} {"seconds":>10} {"words/s":>14}')
+
+      for num_words in options['words']:
+         word_list, diarization = make_transcript(num_words, options['speakers'], options['seed'])
+
+         for name, setup in BENCHMARKS[options['benchmark']].items():
+            seconds = min(time_function(setup, word_list, diarization, options) for _ in range(options['repeat']))
+            self.stdout.write(f'{num_words:>10} {name:>16} {seconds:>10.3f} {num_words / seconds:>14,.0f}')
+
+
+def make_transcript(num_words, num_speakers, seed=0):
+   """
+   Generates a synthetic word list and diarization. Word times are rounded to 10 ms like
+   Whisper's. Speaker turns are a few seconds to a minute long and about a fifth of them
+   overlap the previous turn, with some turns overlapping two others.
+
+   Args:
+      num_words (int): The number of words.
+      num_speakers (int): The number of speakers.
+      seed (int): The random seed.
+
+   Returns:
+      tuple: The word list and the diarization.
+   """
+   rng = random.Random(seed)
+   word_list = []
+   diarization = []
+   current = 0.0
+
+   for _ in range(num_words):
+      start = round(current + rng.uniform(0.0, 0.3), 2)
+      end = round(start + rng.uniform(0.1, 0.8), 2)
+      text = ' ' + 'w' * rng.randint(1, 10)
+      word_list.append({'start': start, 'end': end, 'word': text, 'probability': rng.random(), 'speaker': f'SPEAKER_{rng.randrange(num_speakers):02}' if rng.random() < 0.01 else ''})
+      current = end
+
+   current = 0.0
+
+   while current < word_list[-1]['end']:
+      start = current - rng.uniform(0.5, 3.0) if diarization and rng.random() < 0.2 else current + rng.uniform(0.0, 1.0)
+      end = max(start, 0.0) + rng.uniform(2.0, 60.0)
+      diarization.append({'start': max(start, 0.0), 'end': end, 'speaker': f'SPEAKER_{rng.randrange(num_speakers):02}'})
+      current = end
+
+   return word_list, diarization
+
+
+def time_function(setup, word_list, diarization, options):
+   """
+   Times a single run of a benchmark on copies of the inputs.
+
+   Args:
+      setup (callable): Called with the word list, diarization, and command options and
+         returns the function to time, or a tuple of it and a cleanup function that is
+         called after the run. Preparing the inputs in setup is not timed.
+      word_list (list of dict): The word list.
+      diarization (list of dict): The diarization.
+      options (dict): The command options.
+
+   Returns:
+      float: The number of seconds the run took.
+   """
+   function = setup(copy.deepcopy(word_list), copy.deepcopy(diarization), options)
+   function, cleanup = function if isinstance(function, tuple) else (function, None)
+
+   try:
+      start = time.perf_counter()
+      function()
+      return time.perf_counter() - start
+   finally:
+      if cleanup: cleanup()
+
+
+def setup_insert(save, word_list, options):
+   """
+   Prepares an insert benchmark. The segments of the word list are saved to a temporary
+   transcription in the database, which is deleted after the run.
+
+   Args:
+      save (callable): Called with the transcription and the segments.
+      word_list (list of dict): The word list.
+      options (dict): The command options.
+
+   Returns:
+      tuple: The function to time and the cleanup function.
+   """
+   segments = resegment_word_list(word_list, options['max_characters'], options['max_time'])
+   transcription = Transcription.objects.create(title='Benchmark')
+   return partial(save, transcription, segments), transcription.delete
+
+
+def reference_separate_overlaps(diarization):
+   """
+   The diarize_separate_overlaps implementation replaced by the interval sweep. Only
+   compares each turn with the last emitted segment.
+   """
+   if not diarization:
+      return []
+
+   sorted_diarization = sorted(diarization, key=lambda x: x['start'])
+   separated_segments = []
+
+   for current_segment in sorted_diarization:
+      if not separated_segments:
+         separated_segments.append(current_segment)
+         continue
+
+      last_segment = separated_segments[-1]
+
+      if current_segment['start'] >= last_segment['end'] or current_segment['speaker'] == last_segment['speaker']:
+         separated_segments.append(current_segment)
+      else:
+         original_end_time = last_segment['end']
+         last_segment['end'] = current_segment['start']
+         separated_segments.append({
+            'speaker': 'OVERLAP',
+            'start': current_segment['start'],
+            'end': min(current_segment['end'], original_end_time),
+         })
+
+         if current_segment['end'] > original_end_time:
+            separated_segments.append({'speaker': current_segment['speaker'], 'start': original_end_time, 'end': current_segment['end']})
+         else:
+            separated_segments.append({'speaker': last_segment['speaker'], 'start': current_segment['end'], 'end': original_end_time})
+
+   return separated_segments
+
+
+def reference_assign_speakers(word_list, diarization):
+   """
+   The diarize_assign_speakers implementation replaced by the interval sweep. Assigns
+   speakers with a single forward pointer on the word start times.
+   """
+   speaker_buckets = reference_separate_overlaps(diarization)
+   word_list = sorted(word_list, key=lambda x: x['start'])
+   bucket_index = 0
+   last_speaker = ''
+
+   for word in word_list:
+      while bucket_index < len(speaker_buckets) and word['start'] >= speaker_buckets[bucket_index]['end']:
+         last_speaker = speaker_buckets[bucket_index]['speaker']
+         bucket_index += 1
+
+      if bucket_index < len(speaker_buckets):
+         word['speaker'] = speaker_buckets[bucket_index]['speaker']
+      else:
+         word['speaker'] = last_speaker
+
+   return word_list
+
+
+def reference_resegment_word_list(word_list, max_characters, max_time):
+   """
+   The resegment_word_list implementation replaced by the vectorized one. Walks the
+   word dictionaries one at a time.
+   """
+   segments = []
+
+   if not word_list: return segments
+   word_list = sorted(word_list, key=lambda x: x['start'])
+   breaks = []
+   segment_start = None
+   segment_length = 0
+
+   for index, word in enumerate(word_list):
+      if segment_start is not None and \
+         word['speaker'] == segment_start['speaker'] and \
+         len(word['word']) + segment_length <= max_characters and \
+         word['end'] - segment_start['start'] <= max_time:
+         segment_length += len(word['word'])
+      else:
+         breaks.append(index)
+         segment_start = word
+         segment_length = len(word['word'])
+
+   for start, end in zip(breaks, breaks[1:] + [len(word_list)]):
+      words = word_list[start:end]
+      segments.append({
+         'start': words[0]['start'],
+         'end': words[-1]['end'],
+         'text': ''.join(word['word'] for word in words).strip(),
+         'speaker': words[0]['speaker'],
+         'probability': min(word['probability'] for word in words),
+      })
+
+   return segments
+
+
+def reference_save_segments(transcription, segments):
+   """
+   The segment saving replaced by Transcription.replace_segments. Deletes the segments
+   and saves each new one in its own transaction.
+   """
+   transcription.segments.all().delete()
+
+   for segment in segments:
+      Segment(transcription=transcription, **segment).save()
+
+
+# Each benchmark maps implementation names to setup functions, see time_function
+BENCHMARKS = {
+   'speakers': {
+      'reference': lambda word_list, diarization, options: partial(reference_assign_speakers, word_list, diarization),
+      'sweep': lambda word_list, diarization, options: partial(assign_speakers, word_list, diarization),
+   },
+   'overlaps': {
+      'reference': lambda word_list, diarization, options: partial(reference_separate_overlaps, diarization),
+      'sweep': lambda word_list, diarization, options: partial(diarize_separate_overlaps, diarization),
+   },
+   'resegment': {
+      'reference': lambda word_list, diarization, options: partial(reference_resegment_word_list, word_list, options['max_characters'], options['max_time']),
+      'dicts': lambda word_list, diarization, options: partial(resegment_word_list, word_list, options['max_characters'], options['max_time']),
+      # Word lists are loaded from the database as WordLists
+      'columns': lambda word_list, diarization, options: partial(resegment_word_list, WordList.from_dicts(word_list), options['max_characters'], options['max_time']),
+   },
+   'insert': {
+      'reference': lambda word_list, diarization, options: setup_insert(reference_save_segments, word_list, options),
+      'bulk': lambda word_list, diarization, options: setup_insert(Transcription.replace_segments, word_list, options),
+   },
+}
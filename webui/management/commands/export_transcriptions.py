@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import dateparse
+
+from webui.downloads import EXPORT_FORMATS, select_transcriptions, zip_chunks
+
+import argparse
+import sys
+
+
+class Command(BaseCommand):
+   """
+   Exports completed transcriptions to a ZIP archive. The archive is written as it is
+   generated, so it is never held in memory.
+   """
+   help = 'Exports transcriptions to a ZIP archive.'
+
+   def add_arguments(self, parser):
+      parser.add_argument('output', help='The path of the ZIP archive, - for standard output.')
+      parser.add_argument('--ids', type=int, nargs='+', help='The ids of the transcriptions to export.')
+      parser.add_argument('--search', help='Only export transcriptions whose title, description, or notes contain this text.')
+      parser.add_argument('--after', type=parse_date, help='Only export transcriptions submitted on or after this date (YYYY-MM-DD).')
+      parser.add_argument('--before', type=parse_date, help='Only export transcriptions submitted before this date (YYYY-MM-DD).')
+      parser.add_argument('--formats', nargs='+', choices=list(EXPORT_FORMATS), default=['srt', 'vtt'], help='The export formats (default: srt vtt).')
+
+   def handle(self, *args, **options):
+      transcriptions = select_transcriptions(options['ids'], options['search'], options['after'], options['before'])
+
+      if not transcriptions.exists():
+         raise CommandError('No transcriptions match.')
+
+      if options['output'] == '-':
+         write_chunks(zip_chunks(transcriptions, options['formats']), sys.stdout.buffer)
+      else:
+         with open(options['output'], 'wb') as file:
+            write_chunks(zip_chunks(transcriptions, options['formats']), file)
+
+         self.stderr.write(f'Exported {transcriptions.count()} transcriptions to {options["output"]}')
+
+
+def parse_date(value):
+   """
+   Parses a YYYY-MM-DD date argument.
+   """
+   try:
+      parsed = dateparse.parse_date(value)
+   except ValueError:
+      parsed = None
+
+   if parsed is None:
+      raise argparse.ArgumentTypeError(f'{value} is not a YYYY-MM-DD date')
+
+   return parsed
+
+
+def write_chunks(chunks, file):
+   """
+   Writes streamed chunks of bytes to a file.
+   """
+   for chunk in chunks:
+      file.write(chunk)
+
+   file.flush()
@@ -0,0 +1,81 @@
+from django.core.management.base import BaseCommand, CommandError
+
+import os
+import subprocess
+import sys
+
+
+# Modules that should only ever be loaded by the queue worker
+WORKER_ONLY_MODULES = ['torch', 'pyannote', 'faster_whisper', 'ctranslate2', 'yt_dlp']
+
+
+class Command(BaseCommand):
+   """
+   Reports the per-module import cost of a module using Python's -X importtime flag.
+   Fails if the module pulls in any worker only modules, so regressions in the web
+   process import chain can be caught.
+   """
+   help = 'Reports per-module import time and checks that the web process does not load the ML stack.'
+
+   def add_arguments(self, parser):
+      parser.add_argument('module', nargs='?', default='webui.urls', help='The module to import (default: webui.urls).')
+      parser.add_argument('--limit', type=int, default=20, help='The number of modules to show.')
+      parser.add_argument('--sort', choices=['self', 'cumulative'], default='cumulative', help='The import time to sort by.')
+      parser.add_argument('--allow', nargs='*', default=[], help='Worker only modules that are allowed to be imported.')
+
+   def handle(self, *args, **options):
+      code = f'import django; django.setup(); import {options["module"]}'
+      result = subprocess.run(
+         [sys.executable, '-X', 'importtime', '-c', code],
+         stdout=subprocess.PIPE,
+         stderr=subprocess.PIPE,
+         text=True,
+         env=os.environ.copy(),
+      )
+
+      if result.returncode != 0:
+         raise CommandError(f'Importing {options["module"]} failed:\n{result.stderr}')
+
+      imports = parse_importtime(result.stderr)
+      sort_index = 0 if options['sort'] == 'self' else 1
+      total = sum(item[0] for item in imports)
+
+      self.stdout.write(f'{"self (ms)":>10} {"cumulative (ms)":>16}  module')
+      for self_time, cumulative_time, name in sorted(imports, key=lambda x: x[sort_index], reverse=True)[:options['limit']]:
+         self.stdout.write(f'{self_time / 1000:>10.1f} {cumulative_time / 1000:>16.1f}  {name}')
+
+      self.stdout.write(f'\n{len(imports)} modules imported in {total / 1000:.1f} ms.')
+
+      forbidden = [module for module in WORKER_ONLY_MODULES if module not in options['allow']]
+      loaded = sorted({name.split('.')[0] for _, _, name in imports if name.split('.')[0] in forbidden})
+
+      if loaded:
+         raise CommandError(f'Worker only modules imported by {options["module"]}: {", ".join(loaded)}')
+
+      self.stdout.write(self.style.SUCCESS('No worker only modules were imported.'))
+
+
+def parse_importtime(output):
+   """
+   Parses the stderr output of python -X importtime.
+
+   Args:
+      output (str): The importtime output.
+
+   Returns:
+      list of tuple: A list of (self microseconds, cumulative microseconds, module name).
+   """
+   imports = []
+
+   for line in output.splitlines():
+      if not line.startswith('import time:'):
+         continue
+
+      parts = line[len('import time:'):].split('|')
+
+      if len(parts) != 3 or not parts[0].strip().isdigit():
+         continue
+
+      imports.append((int(parts[0]), int(parts[1]), parts[2].strip()))
+
+   return imports
@@ -1,18 +1,46 @@
-from django.core.files import File
 from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
 
 from .models import *
 from .utils import *
-
+from .registry import get_diarization_pipeline, get_whisper_model, registry
+from .audio import SAMPLE_RATE, decode_audio, get_audio_duration, get_file_hash, load_audio, load_waveform, to_float32
+from .columns import WordList, as_speaker_turns, as_word_list, decode_seconds
+from .intervals import assign_labels, separate_overlaps, sweep_intervals
+from .parallel import transcribe_parallel
+from .uploadhandlers import HashingFile
+
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
 from pathlib import Path
-from yt_dlp import YoutubeDL
-from faster_whisper import WhisperModel
-from pyannote.audio import Pipeline
-import torch
+import copy
+import io
+import logging
+import numpy as np
+import time
 import uuid
 
 
+logger = logging.getLogger(__name__)
+
+
+def get_device():
+   """
+   Returns the device models should run on. Torch is imported here so that it is only
+   loaded by the queue worker.
+
+   Returns:
+      str: 'cuda' if CUDA is available, otherwise 'cpu'.
+   """
+   import torch
+
+   if torch.cuda.is_available():
+      return 'cuda'
+
+   return 'cpu'
+
+
 def process_submission(transcription_id, upload_url, diarize):
    """
    Processes a transcription submission by downloading media, transcribing it, and
@@ -28,14 +56,21 @@ def process_submission(transcription_id, upload_url, diarize):
    except Transcription.DoesNotExist:
       return
 
-   # Download media
-   if upload_url:
+   # Download media, a resumed submission may already have it
+   if upload_url and not transcription.upload_file:
       try:
          download_media(transcription_id, upload_url)
       except:
          transcription.fail_incomplete_statuses('Downloading media failed.')
          return
 
+   diarize = diarize and settings.HUGGING_FACE_TOKEN
+
+   # Diarization only needs the audio, so it can run while the media is transcribed
+   if diarize and settings.CONCURRENT_DIARIZATION:
+      process_concurrently(transcription)
+      return
+
    # Transcribe file
    try:
       transcribe_file(transcription_id)
@@ -44,7 +79,7 @@ def process_submission(transcription_id, upload_url, diarize):
       return
 
    # Diarize transcription
-   if diarize and settings.HUGGING_FACE_TOKEN:
+   if diarize:
       try:
          diarize_file(transcription_id)
       except:
@@ -52,6 +87,117 @@ def process_submission(transcription_id, upload_url, diarize):
          return
 
 
+def process_concurrently(transcription):
+   """
+   Transcribes and diarizes a transcription at the same time. Diarization runs in a
+   thread while the media is transcribed, then speakers are assigned to the words and
+   the segments are recreated once both have finished.
+
+   Args:
+      transcription (Transcription): The transcription to process.
+   """
+   # Decode before starting the thread so both stages share a single decode
+   try:
+      get_audio(transcription)
+   except:
+      transcription.fail_incomplete_statuses('Transcribing media failed.')
+      return
+
+   with ThreadPoolExecutor(max_workers=1) as executor:
+      diarization = executor.submit(diarize_audio_in_thread, transcription.id)
+
+      try:
+         transcribe_file(transcription.id)
+      except:
+         # Wait so the diarization thread does not update its status after it is failed
+         wait([diarization])
+         transcription.fail_incomplete_statuses('Transcribing media failed.')
+         return
+
+      try:
+         result = diarization.result()
+
+         if result is not None:
+            apply_diarization(transcription.id, *result)
+      except:
+         transcription.fail_incomplete_statuses('Diarizing media failed.')
+         return
+
+
+def get_content_hash(transcription):
+   """
+   Returns the content hash of a transcription's media. Uploads and downloads are hashed
+   while they are saved, the hash is only calculated here for older submissions.
+
+   Args:
+      transcription (Transcription): The transcription to get the content hash of.
+
+   Returns:
+      str: The SHA-256 hex digest of the media.
+   """
+   if not transcription.content_hash and transcription.upload_file:
+      transcription.content_hash = get_file_hash(transcription.upload_file.path)
+      transcription.save(update_fields=['content_hash'])
+
+   return transcription.content_hash
+
+
+def get_audio(transcription):
+   """
+   Returns the decoded 16 kHz mono audio of a transcription's media, decoding it only if
+   it is not already cached.
+
+   Args:
+      transcription (Transcription): The transcription to get the audio of.
+
+   Returns:
+      Path: The path to the decoded WAV file.
+   """
+   return decode_audio(transcription.upload_file.path, get_content_hash(transcription))
+
+
+def find_duplicate(transcription, process):
+   """
+   Finds an earlier transcription of identical media where the given process completed
+   with the same options, so its results can be copied instead of running the models
+   again. Transcription results are matched on the model, language, VAD filter, and
+   hotwords, diarization results only depend on the media.
+
+   Args:
+      transcription (Transcription): The transcription to find a duplicate of.
+      process (int): The TranscriptionStatus process whose results should be reused.
+
+   Returns:
+      Transcription: The duplicate transcription, or None if there is no duplicate.
+   """
+   DEDUPLICATION_KEYS = ['model', 'language', 'vad_filter', 'hotwords']
+
+   if not get_content_hash(transcription): return None
+
+   candidates = Transcription.objects.filter(
+      content_hash=transcription.content_hash,
+      statuses__process=process,
+      statuses__status=TranscriptionStatus.COMPLETED,
+   ).exclude(pk=transcription.pk).order_by('-submitted')
+
+   # The deferred results are not loaded until a candidate's options match
+   if process == TranscriptionStatus.TRANSCRIBING:
+      candidates = candidates.filter(word_list__isnull=False)
+   elif process == TranscriptionStatus.DIARIZING:
+      candidates = candidates.filter(diarization__isnull=False)
+   else:
+      return None
+
+   for candidate in candidates:
+      if process == TranscriptionStatus.TRANSCRIBING:
+         if all(((candidate.meta or {}).get(key) or None) == (transcription.meta.get(key) or None) for key in DEDUPLICATION_KEYS):
+            return candidate
+      elif not (candidate.meta or {}).get('diarization_speakers'):
+         return candidate
+
+   return None
+
+
 def download_media(transcription_id, upload_url):
    """
    This function retrieves a transcription object by its ID, downloads the media file
@@ -69,10 +215,10 @@ def download_media(transcription_id, upload_url):
       return
 
    download_status = transcription.statuses.get(process=TranscriptionStatus.DOWNLOADING)
-   if download_status.status == TranscriptionStatus.FAILED: return
-   download_status.status = TranscriptionStatus.PROCESSING
-   download_status.start_time = datetime.now()
-   download_status.save()
+   if download_status.status in [TranscriptionStatus.FAILED, TranscriptionStatus.COMPLETED]: return
+   download_status.start_processing()
+
+   from yt_dlp import YoutubeDL
 
    # Can the opts for yt-dlp use a function to generate hex codes on the fly?
    hex = '_' + uuid.uuid4().hex[:7]
@@ -84,6 +230,12 @@ def download_media(transcription_id, upload_url):
       'outtmpl': '%(title)s' + hex,
       # This should force playlists to only download one item right now
       'playlist_items': '1',
+      'progress_hooks': [
+         lambda d: download_status.update_progress(
+            d.get('downloaded_bytes') or 0,
+            d.get('total_bytes') or d.get('total_bytes_estimate'),
+         ) if d['status'] == 'downloading' else None,
+      ],
    }
 
    with YoutubeDL(ydl_opts) as ydl:
@@ -100,73 +252,302 @@ def download_media(transcription_id, upload_url):
 
    file_path = Path(single_info['requested_downloads'][0]['filepath'])
 
-   transcription.title = single_info['title']
-   transcription.upload_file = File(open(str(file_path), 'rb'), name=file_path.name)
-   transcription.save(update_fields=['title', 'upload_file'])
+   # The file is hashed while storage copies it
+   with open(str(file_path), 'rb') as f:
+      downloaded_file = HashingFile(f, name=file_path.name)
+      transcription.title = single_info['title']
+      transcription.upload_file = downloaded_file
+      transcription.save(update_fields=['title', 'upload_file'])
+
+   transcription.content_hash = downloaded_file.content_hash
+   transcription.save(update_fields=['content_hash'])
 
    # Delete temp file
    Path(file_path).unlink(True)
 
    download_status.status = TranscriptionStatus.COMPLETED
    download_status.end_time = datetime.now()
+   download_status.progress = 100
+   download_status.estimated_end_time = None
    download_status.save()
 
 
+def get_segment_breaks(word_list, max_characters, max_time):
+   """
+   Finds where segments start in a list of words based on character length, time
+   duration, and speaker consistency. A segment always gets its first word, so there is
+   no need to check for a minimum length or time.
+
+   For every word the index of the word that would end a segment starting at it is
+   calculated at once with NumPy, then the segments are followed from the first word.
+
+   Args:
+      word_list (WordList|list of dict): A list of words sorted by start time with word,
+         speaker, start, and end attributes.
+      max_characters (int): The maximum number of characters allowed in a segment.
+      max_time (float): The maximum time duration (in seconds) allowed for a segment.
+
+   Returns:
+      list of int: The index of the first word of each segment.
+   """
+   # Better than param defaults as checks for ''
+   if not max_characters: max_characters = settings.MAX_SEGMENT_LENGTH
+   if not max_time: max_time = settings.MAX_SEGMENT_TIME
+   word_list = as_word_list(word_list)
+   count = len(word_list)
+
+   if not count: return []
+
+   indices = np.arange(count)
+   starts = word_list.start
+   ends = word_list.end
+   codes = word_list.speaker_codes
+   lengths = word_list.lengths()
+
+   # A segment cannot continue past the last word of its first word's speaker run
+   changes = np.flatnonzero(codes[1:] != codes[:-1]) + 1
+   run_ends = np.append(changes, count)[np.searchsorted(changes, indices, side='right')]
+
+   # Or past the first word that does not fit in the character limit
+   cumulative = np.cumsum(lengths)
+   length_ends = np.searchsorted(cumulative, cumulative - lengths + max_characters, side='right')
+   limits = np.maximum(np.minimum(run_ends, length_ends), indices + 1)
+
+   # Or past the first word that ends too late. Ends are not sorted, but no word before
+   # the first running maximum over the threshold can end too late. The threshold is
+   # lowered slightly so rounding never skips a word, which the exact check below handles.
+   running_ends = np.maximum.accumulate(ends)
+   time_ends = np.maximum(np.searchsorted(running_ends, starts + max_time - 1e-6, side='right'), indices + 1)
+   time_ends = np.minimum(time_ends, limits)
+   checked = np.minimum(time_ends, count - 1)
+   exact = (time_ends == limits) | (ends[checked] - starts > max_time)
+   next_starts = np.where(exact, time_ends, -1).tolist()
+   breaks = []
+   index = 0
+
+   while index < count:
+      breaks.append(index)
+      next_start = next_starts[index]
+
+      # Rare: the running maximum came from an earlier word or rounding put a word on the threshold
+      if next_start < 0:
+         next_start = next((i for i in range(time_ends[index], limits[index]) if ends[i] - starts[index] > max_time), int(limits[index]))
+
+      index = next_start
+
+   return breaks
+
+
 def resegment_word_list(word_list, max_characters, max_time):
    """
    Resegments a list of words into segments based on character length, time duration,
    and speaker consistency.
 
    Args:
-      word_list (list of dict): A list of words to resegment with word, speaker, start,
-         and end attributes.
+      word_list (WordList|list of dict): A list of words to resegment with word, speaker,
+         start, and end attributes.
       max_characters (int): The maximum number of characters allowed in a segment.
       max_time (float): The maximum time duration (in seconds) allowed for a segment.
 
    Returns:
       list of dict: A list of segments, where each segment is represented as a dictionary.
    """
-
-   # Better than param defaults as checks for ''
-   # Segments will get the first word, do not need to check for minimum length or time
-   if not max_characters: max_characters = settings.MAX_SEGMENT_LENGTH
-   if not max_time: max_time = settings.MAX_SEGMENT_TIME
    segments = []
-   segment = None
 
    if not word_list: return segments
-   word_list = sorted(word_list, key=lambda x: x['start'])
-   word_list_index = 0
-
-   # Process word list
-   while word_list_index < len(word_list):
-      word = word_list[word_list_index]
-
-      if not segment:
-         segment = {
-            'start': word['start'],
-            'end': word['end'],
-            'text': word['word'],
-            'speaker': word['speaker'],
-            'probability': word['probability']
-         }
-      elif word['speaker'] == segment['speaker'] and \
-         len(word['word']) + len(segment['text']) <= max_characters and \
-         word['end'] - segment['start'] <= max_time:
-         segment['text'] += word['word']
-         segment['end'] = word['end']
-         segment['probability'] = min(segment['probability'], word['probability'])
+   word_list = as_word_list(word_list).sorted()
+   breaks = np.array(get_segment_breaks(word_list, max_characters, max_time))
+   segment_ends = np.append(breaks[1:], len(word_list))
+
+   # Only the first and last word of each segment are converted to Python values
+   starts = decode_seconds(word_list.start[breaks])
+   ends = decode_seconds(word_list.end[segment_ends - 1])
+   speakers = word_list.speakers
+   first_speakers = word_list.speaker_codes[breaks].tolist()
+   texts = word_list.join(breaks, segment_ends)
+   # NaN marks an unknown probability, fmin ignores it unless every word is unknown
+   probabilities = np.fmin.reduceat(word_list.probability, breaks).tolist()
+
+   for start, end, text, speaker, probability in zip(starts, ends, texts, first_speakers, probabilities):
+      segments.append({
+         'start': start,
+         'end': end,
+         'text': text.strip(),
+         'speaker': speakers[speaker],
+         'probability': None if probability != probability else probability,
+      })
+
+   return segments
+
+
+class SegmentStream:
+   """
+   Turns words into segments while they are being transcribed. Finished segments are
+   saved to the database in periodic batches so the transcript can be viewed while the
+   transcription is still running. Only the words added since the last batch and the
+   words of the segment that is still growing are kept as dictionaries, the rest are
+   kept in columns. The first batch replaces any existing segments of the
+   transcription. Every word so far is checkpointed periodically so an interrupted
+   transcription can be resumed.
+
+   Attributes:
+      transcription (Transcription): The transcription the segments belong to.
+      description (str): The start of the transcript text.
+   """
+   DESCRIPTION_MAX_LENGTH = 100
+
+   def __init__(self, transcription, max_characters, max_time, word_list=None):
+      self.transcription = transcription
+      self.max_characters = max_characters
+      self.max_time = max_time
+      self.description = ''
+      self._saved = []
+      self._pending = as_word_list(word_list)
+      self._added = []
+      self._replace = True
+      self._last_flush = time.monotonic()
+      self._last_checkpoint = time.monotonic()
+
+   @property
+   def word_list(self):
+      """
+      Every word added so far as a WordList.
+      """
+      # The saved words are joined once here instead of at every flush
+      self._saved = [WordList.concatenate(self._saved)]
+      return WordList.concatenate(self._saved + [self._pending, as_word_list(self._added)])
+
+   def add(self, word):
+      """
+      Adds a word and saves finished segments if the flush interval has passed.
+
+      Args:
+         word (dict): A word with start, end, word, probability, and speaker keys.
+      """
+      self._added.append(word)
+
+      if time.monotonic() - self._last_flush >= settings.SEGMENT_FLUSH_INTERVAL:
+         self.flush()
+
+      if time.monotonic() - self._last_checkpoint >= settings.CHECKPOINT_INTERVAL:
+         self.checkpoint()
+
+   def checkpoint(self):
+      """
+      Saves every word transcribed so far and the time transcription can resume from.
+      The whole word list is encoded again each time.
+      """
+      self._last_checkpoint = time.monotonic()
+      word_list = self.word_list
+
+      if not len(word_list): return
+
+      self.transcription.word_list = word_list
+      self.transcription.meta['checkpoint'] = float(word_list.end.max())
+      self.transcription.save(update_fields=['word_list', 'meta'])
+
+   def flush(self, final=False):
+      """
+      Saves the finished segments of the pending words. The last segment is held back
+      because later words may still be added to it, unless this is the final flush.
+
+      Args:
+         final (bool): Whether every pending word should be saved.
+      """
+      self._last_flush = time.monotonic()
+      pending = WordList.concatenate([self._pending, as_word_list(self._added)]).sorted()
+      self._added = []
+
+      if final or not pending:
+         self._pending = as_word_list(None)
       else:
-         segment['text'] = segment['text'].strip()
-         segments.append(segment)
-         segment = None
-         continue
+         # Segmenting is greedy from the first word, so every segment before the last is final
+         last_break = get_segment_breaks(pending, self.max_characters, self.max_time)[-1]
+         self._pending = pending[last_break:]
+         pending = pending[:last_break]
 
-      word_list_index += 1
+      self._saved.append(pending)
+      segments = resegment_word_list(pending, self.max_characters, self.max_time)
 
-   segment['text'] = segment['text'].strip()
-   segments.append(segment)
-   return segments
+      if not segments and not final: return
+
+      if self._replace:
+         # Segments of an interrupted run are swapped for the first batch in one transaction
+         self.transcription.replace_segments(segments)
+         self._replace = False
+      else:
+         with transaction.atomic():
+            Segment.objects.bulk_create([Segment(transcription=self.transcription, **segment) for segment in segments])
+            Transcription.objects.filter(pk=self.transcription.pk).bump_version()
+
+      for segment in segments:
+         if len(self.description) >= self.DESCRIPTION_MAX_LENGTH: break
+         self.description += segment['text'] + ' '
+
+
+def transcribe_words(transcription, audio_path, offset=0):
+   """
+   Transcribes decoded audio with the options saved in the transcription's meta and
+   yields the words as they are decoded. Model caching and parallel transcription stats
+   are saved to the meta.
+
+   Args:
+      transcription (Transcription): The transcription being processed.
+      audio_path (Path): The path to the decoded audio of the transcription.
+      offset (float): The time (in seconds) to start transcribing from.
+
+   Yields:
+      dict: A word with start, end, word, probability, and speaker keys.
+   """
+   meta = transcription.meta
+   model = 'base' if not meta['model'] else meta['model']
+   mode = meta.get('mode') or settings.TRANSCRIPTION_MODE
+   device = get_device()
+   options = {
+      'language': None if not meta['language'] else meta['language'],
+      'beam_size': 5,
+      'word_timestamps': True,
+      'vad_filter': meta['vad_filter'],
+      'hotwords': meta['hotwords'],
+   }
+
+   # Chunked parallel transcription only helps on the CPU
+   if mode == 'parallel' and device == 'cpu' and settings.PARALLEL_PROCESSES > 1:
+      parallel_stats = {}
+      yield from transcribe_parallel(audio_path, model, options, parallel_stats, int(offset * SAMPLE_RATE))
+
+      transcription.meta['parallel_chunks'] = parallel_stats['chunks']
+      transcription.meta['parallelism'] = parallel_stats['parallelism']
+      transcription.save(update_fields=['meta'])
+      return
+
+   load_start = datetime.now()
+   model, cached = get_whisper_model(model, device=device, compute_type='auto', cpu_threads=settings.WHISPER_CPU_THREADS)
+   transcription.meta['model_cached'] = cached
+   transcription.meta['model_load_time'] = round((datetime.now() - load_start).total_seconds(), 3)
+   transcription.save(update_fields=['meta'])
+   logger.info('Model cache: %s', registry.stats())
+
+   # Batched inference decodes several VAD chunks at once and requires the VAD filter
+   if mode == 'batched':
+      from faster_whisper import BatchedInferencePipeline
+
+      options['vad_filter'] = True
+      options['batch_size'] = meta.get('batch_size') or settings.WHISPER_BATCH_SIZE
+      model = BatchedInferencePipeline(model)
+
+   audio = to_float32(load_audio(audio_path)[int(offset * SAMPLE_RATE):])
+   transcription_segments, info = model.transcribe(audio, **options)
+
+   for transcription_segment in transcription_segments:
+      for word in transcription_segment.words:
+         yield {
+            'start': word.start + offset,
+            'end': word.end + offset,
+            'word': word.word,
+            'probability': word.probability,
+            'speaker': '',
+         }
 
 
 def transcribe_file(transcription_id):
@@ -179,75 +560,59 @@ def transcribe_file(transcription_id):
       transcription_id (int): The ID of the transcription object to process.
    """
    try:
-      transcription = Transcription.objects.get(pk=transcription_id)
+      transcription = Transcription.objects.with_transcript().get(pk=transcription_id)
    except Transcription.DoesNotExist:
       return
 
    transcription_status = transcription.statuses.get(process=TranscriptionStatus.TRANSCRIBING)
-   if transcription_status.status == TranscriptionStatus.FAILED: return
-   transcription_status.status = TranscriptionStatus.PROCESSING
-   transcription_status.start_time = datetime.now()
-   transcription_status.save()
+   if transcription_status.status in [TranscriptionStatus.FAILED, TranscriptionStatus.COMPLETED]: return
+   transcription_status.start_processing()
 
-   DESCRIPTION_MAX_LENGTH = 100
-   word_list = []
    meta = transcription.meta
-   model = 'base' if not meta['model'] else meta['model']
-   language = None if not meta['language'] else meta['language']
+   # Reuse the words of an identical earlier submission instead of running the model
+   duplicate = find_duplicate(transcription, TranscriptionStatus.TRANSCRIBING)
+
+   if duplicate:
+      offset = 0
+      word_list = [{**word, 'speaker': ''} for word in duplicate.word_list]
+      transcription.meta['duration'] = duplicate.meta.get('duration')
+      transcription.meta['deduplicated_from'] = duplicate.id
+   else:
+      # Decode once, duration and all later stages read from the decoded audio
+      audio_path = get_audio(transcription)
+      duration = get_audio_duration(audio_path)
+      transcription.meta['duration'] = format_seconds(duration, include_mill=False)
+
+      # Resume from the last checkpoint if a previous run was interrupted
+      offset = meta.get('checkpoint') or 0
+      word_list = transcription.word_list if offset and transcription.word_list else []
 
-   # Save audio duration and file size
-   transcription.meta['duration'] = format_seconds(get_file_duration(transcription.upload_file.path), include_mill=False)
+   # Save file size
    transcription.meta['size'] = transcription.upload_file.size
    transcription.save(update_fields=['meta'])
 
-   # Check for CUDA
-   device = 'cpu'
-   if torch.cuda.is_available():
-      device = 'cuda'
-
-   model = WhisperModel(meta['model'], device=device, compute_type='auto', download_root=str(settings.MODEL_CACHE_PATH))
-   transcription_segments, info = model.transcribe(
-      transcription.upload_file.path,
-      language=language,
-      beam_size=5,
-      word_timestamps=True,
-      vad_filter=meta['vad_filter'],
-      hotwords=meta['hotwords'],
-   )
-
-   for transcription_segment in transcription_segments:
-      for word in transcription_segment.words:
-         word_list.append({
-            'start': word.start,
-            'end': word.end,
-            'word': word.word,
-            'probability': word.probability,
-            'speaker': '',
-         })
-
-
-   transcription.word_list = word_list
-   transcription.save(update_fields=['word_list'])
+   # Segments are saved while transcribing so the transcript can be viewed early. Segments
+   # from an interrupted run are replaced by the first batch, recreated from the checkpoint.
+   stream = SegmentStream(transcription, meta['max_segment_length'], meta['max_segment_time'], word_list)
 
-   segments = resegment_word_list(word_list, meta['max_segment_length'], meta['max_segment_time'])
+   if not duplicate:
+      for word in transcribe_words(transcription, audio_path, offset):
+         stream.add(word)
+         transcription_status.update_progress(word['end'], duration, baseline=offset)
 
-   # Save segments to database and generate a description.
-   description = ''
-
-   for segment in segments:
-      segment['transcription'] = transcription
-      segment_to_save = Segment(**segment)
-      segment_to_save.save()
-
-      if len(description) < DESCRIPTION_MAX_LENGTH:
-         description += segment['text'] + ' '
+   stream.flush(final=True)
+   transcription.word_list = stream.word_list
+   transcription.meta.pop('checkpoint', None)
+   transcription.save(update_fields=['word_list', 'meta'])
 
    transcription.refresh_from_db()
-   transcription.description = description[:DESCRIPTION_MAX_LENGTH].strip() + '...'
+   transcription.description = stream.description[:SegmentStream.DESCRIPTION_MAX_LENGTH].strip() + '...'
    transcription.save(update_fields=['description'])
 
    transcription_status.status = TranscriptionStatus.COMPLETED
    transcription_status.end_time = datetime.now()
+   transcription_status.progress = 100
+   transcription_status.estimated_end_time = None
    transcription_status.save()
 
 
@@ -255,10 +620,10 @@ def diarize_separate_overlaps(diarization):
    """
    Adjusts a list of speaker diarization segments to handle overlapping ranges by
    splitting them into non-overlapping segments. Overlapping portions are marked with a
-   special 'OVERLAP' speaker.
+   special 'OVERLAP' speaker. Any number of overlapping speakers is handled.
 
    Args:
-      diarization (list of dict): A list of dictionaries representing speaker segments.
+      diarization (SpeakerTurns|list of dict): The speaker segments.
 
    Returns:
       list of dict: A list of dictionaries representing the adjusted speaker segments.
@@ -266,50 +631,60 @@ def diarize_separate_overlaps(diarization):
    if not diarization:
       return []
 
-   # Sort the speaker ranges by their start time
-   sorted_diarization = sorted(diarization, key=lambda x: x['start'])
-   separated_segments = []
+   turns = as_speaker_turns(diarization)
+   speakers = turns.speakers
+   boundaries, coverage = sweep_intervals(turns.start, turns.end, turns.speaker_codes, len(speakers))
+   starts, ends, run_labels = separate_overlaps(boundaries, coverage)
 
-   for current_segment in sorted_diarization:
-      if not separated_segments:
-         separated_segments.append(current_segment)
-         continue
+   return [
+      {'speaker': 'OVERLAP' if label == -2 else speakers[label], 'start': start, 'end': end}
+      for start, end, label in zip(decode_seconds(starts), decode_seconds(ends), run_labels.tolist())
+   ]
 
-      last_segment = separated_segments[-1]
 
-       # No overlap or same speaker
-      if current_segment['start'] >= last_segment['end'] or current_segment['speaker'] == last_segment['speaker']:
-         separated_segments.append(current_segment)
-      else:
-         # There's an overlap, split the segments
-         # Add the non-overlapping part of the last segment
-         original_end_time = last_segment['end']
-         last_segment['end'] = current_segment['start']
-
-         # Add the overlapping segment
-         overlap_segment = {
-            'speaker': 'OVERLAP',
-            'start': current_segment['start'],
-            'end': min(current_segment['end'], original_end_time)
-         }
-         separated_segments.append(overlap_segment)
-
-         # Add the remaining part of the segment that doesn't overlap
-         if current_segment['end'] > original_end_time:
-            remaining_segment = {
-                  'speaker': current_segment['speaker'],
-                  'start': original_end_time,
-                  'end': current_segment['end']
-            }
-         else:
-            remaining_segment = {
-                  'speaker': last_segment['speaker'],
-                  'start': current_segment['end'],
-                  'end': original_end_time
-            }
-         separated_segments.append(remaining_segment)
-
-   return separated_segments
+def diarization_progress_hook(status):
+   """
+   Creates a pyannote pipeline hook that reports diarization progress. The segmentation
+   and embedding steps report how many batches they have completed and each is counted
+   as an equal share of the work.
+
+   Args:
+      status (TranscriptionStatus): The diarization status to update.
+
+   Returns:
+      callable: The hook to pass to the pipeline.
+   """
+   STEPS = ['segmentation', 'embeddings']
+
+   def hook(step_name, step_artifact, file=None, total=None, completed=None):
+      if step_name in STEPS and total:
+         status.update_progress(STEPS.index(step_name) + completed / total, len(STEPS))
+
+   return hook
+
+
+def assign_speakers(word_list, diarization):
+   """
+   Assigns each word the speaker whose diarization turns overlap it the longest. Words
+   that no turn overlaps get the speaker of the next turn, or of the last turn if there
+   is none after them.
+
+   Args:
+      word_list (WordList|list of dict): The words to assign speakers to.
+      diarization (SpeakerTurns|list of dict): The speaker turns.
+
+   Returns:
+      WordList: The words sorted by start time with their speakers updated.
+   """
+   words = as_word_list(word_list).sorted()
+   turns = as_speaker_turns(diarization)
+
+   if not words:
+      return words
+
+   boundaries, coverage = sweep_intervals(turns.start, turns.end, turns.speaker_codes, len(turns.speakers))
+   assigned = assign_labels(boundaries, coverage, words.start, words.end)
+   return words.with_speakers(assigned, turns.speakers)
 
 
 def diarize_assign_speakers(transcription_id):
@@ -322,86 +697,263 @@ def diarize_assign_speakers(transcription_id):
       transcription_id (int): The ID of the transcription to be diarized.
 
    Returns:
-      list: A list of words with updated dictionaries, where each word dictionary
-         includes a 'speaker' key indicating the assigned speaker label.
+      WordList: The words sorted by start time, where each word has a speaker
+         indicating the assigned speaker label.
    """
    try:
-      transcription = Transcription.objects.get(pk=transcription_id)
+      transcription = Transcription.objects.with_transcript().get(pk=transcription_id)
    except Transcription.DoesNotExist:
       return
 
-   speaker_buckets = diarize_separate_overlaps(transcription.diarization)
-   word_list = sorted(transcription.word_list, key=lambda x: x['start'])
-   bucket_index = 0
-   last_speaker = ''
+   return assign_speakers(transcription.word_list, transcription.diarization)
 
-   for word in word_list:
-      # Move to the next speaker bucket if the current word's start time exceeds the bucket's end time.
-      while bucket_index < len(speaker_buckets) and word['start'] >= speaker_buckets[bucket_index]['end']:
-         last_speaker = speaker_buckets[bucket_index]['speaker']
-         bucket_index += 1
 
-      # Assign the speaker from the current bucket.
-      if bucket_index < len(speaker_buckets):
-         word['speaker'] = speaker_buckets[bucket_index]['speaker']
-      else:
-         word['speaker'] = last_speaker
+def save_diarization_cache(transcription, artifacts):
+   """
+   Saves the segmentations and speaker embeddings of a diarization so it can be
+   reclustered with different speaker counts without running the models again.
 
-   return word_list
+   Args:
+      transcription (Transcription): The diarized transcription.
+      artifacts (dict): The segmentation and embeddings artifacts captured from the
+         pipeline hook.
+   """
+   if 'segmentation' not in artifacts or 'embeddings' not in artifacts: return
+
+   segmentations = artifacts['segmentation']
+   window = segmentations.sliding_window
+   buffer = io.BytesIO()
+   np.savez_compressed(
+      buffer,
+      segmentations=segmentations.data,
+      window=np.array([window.start, window.duration, window.step]),
+      embeddings=artifacts['embeddings'],
+   )
 
+   transcription.diarization_cache.save(f'{transcription.id}.npz', ContentFile(buffer.getvalue()), save=False)
+   transcription.save(update_fields=['diarization_cache'])
 
-def diarize_file(transcription_id):
+
+def load_diarization_cache(transcription):
    """
-   This function retrieves a transcription object, processes the associated audio file
-   to perform speaker diarization, and updates the transcription with the diarization
-   results. It also handles the segmentation of the diarized audio and updates the
-   transcription's segments accordingly.
+   Loads the cached segmentations and speaker embeddings of a transcription.
+
+   Args:
+      transcription (Transcription): The transcription to load the cache of.
+
+   Returns:
+      tuple: The segmentations as a SlidingWindowFeature and the embeddings array, or
+         None if nothing is cached.
+   """
+   if not transcription.diarization_cache or not transcription.diarization_cache.storage.exists(transcription.diarization_cache.name):
+      return None
+
+   from pyannote.core import SlidingWindow, SlidingWindowFeature
+
+   with transcription.diarization_cache.open('rb') as f, np.load(f) as cache:
+      start, duration, step = cache['window']
+      segmentations = SlidingWindowFeature(cache['segmentations'], SlidingWindow(start=start, duration=duration, step=step))
+      return segmentations, cache['embeddings']
+
+
+def diarization_cache_hook(hook, artifacts):
+   """
+   Wraps a pipeline hook to capture the segmentations and speaker embeddings.
+
+   Args:
+      hook (callable): The hook to wrap.
+      artifacts (dict): Filled with the segmentation and embeddings artifacts.
+
+   Returns:
+      callable: The wrapped hook.
+   """
+   def cache_hook(step_name, step_artifact, file=None, total=None, completed=None):
+      # The finished artifacts are passed without progress counts
+      if step_name in ['segmentation', 'embeddings'] and step_artifact is not None and completed is None:
+         artifacts[step_name] = step_artifact
+
+      hook(step_name, step_artifact, file=file, total=total, completed=completed)
+
+   return cache_hook
+
+
+def recluster(pipeline, segmentations, embeddings, hook=None, **speakers):
+   """
+   Runs a diarization pipeline with cached segmentations and speaker embeddings so only
+   the clustering step and the reconstruction of the speaker turns are computed.
+
+   The steps are replaced on a shallow copy of the pipeline. The copy shares the loaded
+   models but the pipeline in the model registry is never changed, even if this fails.
+
+   Args:
+      pipeline (Pipeline): The diarization pipeline.
+      segmentations (SlidingWindowFeature): The cached segmentations.
+      embeddings (numpy.ndarray): The cached speaker embeddings.
+      hook (callable): The pipeline hook.
+      **speakers: The num_speakers, min_speakers, and max_speakers pipeline arguments.
+
+   Returns:
+      Annotation: The diarization.
+   """
+   import torch
+
+   reclustering = copy.copy(pipeline)
+   reclustering.get_segmentations = lambda file, *args, **kwargs: segmentations
+   reclustering.get_embeddings = lambda file, *args, **kwargs: embeddings
+
+   # The audio is not read, but the pipeline requires a valid file
+   return reclustering({'waveform': torch.zeros(1, 1), 'sample_rate': SAMPLE_RATE}, hook=hook, **speakers)
+
+
+def diarize_audio(transcription_id, speakers=None):
+   """
+   Runs speaker diarization on the audio of a transcription. The transcription itself is
+   not changed so this can run while the media is being transcribed, the results are
+   saved by apply_diarization. If the segmentations and speaker embeddings of a previous
+   diarization are cached only the clustering step is rerun.
 
    Args:
       transcription_id (int): The ID of the transcription to be diarized.
+      speakers (dict): The num_speakers, min_speakers, and max_speakers to pass to the
+         pipeline. Speaker counts that are not set are estimated.
+
+   Returns:
+      tuple: The list of speaker turns and a dictionary of stats for the transcription's
+         meta. None if the transcription does not exist or was already diarized.
    """
    try:
       transcription = Transcription.objects.get(pk=transcription_id)
    except Transcription.DoesNotExist:
-      return
+      return None
 
    diarize_status = transcription.statuses.get(process=TranscriptionStatus.DIARIZING)
-   if diarize_status.status == TranscriptionStatus.FAILED: return
-   diarize_status.status = TranscriptionStatus.PROCESSING
-   diarize_status.start_time = datetime.now()
-   diarize_status.save()
+   if diarize_status.status in [TranscriptionStatus.FAILED, TranscriptionStatus.COMPLETED]: return None
+   diarize_status.start_processing()
 
    result = []
-   meta = transcription.meta
-   pipeline = Pipeline.from_pretrained('pyannote/speaker-diarization-3.1', use_auth_token=settings.HUGGING_FACE_TOKEN, cache_dir=settings.MODEL_CACHE_PATH)
+   speakers = {key: value for key, value in (speakers or {}).items() if value}
+   stats = {'diarization_speakers': speakers}
+   # Reuse the diarization of identical media instead of running the pipeline
+   duplicate = None if speakers else find_duplicate(transcription, TranscriptionStatus.DIARIZING)
+
+   if duplicate:
+      result = duplicate.diarization
+      stats['diarization_deduplicated_from'] = duplicate.id
+   else:
+      load_start = datetime.now()
+      pipeline, cached = get_diarization_pipeline('pyannote/speaker-diarization-3.1', device=get_device())
+      stats['diarization_model_cached'] = cached
+      stats['diarization_load_time'] = round((datetime.now() - load_start).total_seconds(), 3)
+      logger.info('Model cache: %s', registry.stats())
+
+      hook = diarization_progress_hook(diarize_status)
+      diarization_cache = load_diarization_cache(transcription)
+      stats['diarization_reclustered'] = diarization_cache is not None
+      inference_start = datetime.now()
+
+      if diarization_cache:
+         diarization = recluster(pipeline, *diarization_cache, hook=hook, **speakers)
+      else:
+         artifacts = {}
+         diarization = pipeline(load_waveform(get_audio(transcription)), hook=diarization_cache_hook(hook, artifacts), **speakers)
+         save_diarization_cache(transcription, artifacts)
 
-   if torch.cuda.is_available():
-      pipeline.to(torch.device('cuda'))
+      stats['diarization_time'] = round((datetime.now() - inference_start).total_seconds(), 3)
 
-   # Convert media to .wav
-   temp_audio = extract_audio_to_wav(transcription.upload_file.path)
+      for turn, _, speaker in diarization.itertracks(yield_label=True):
+         # print(f"start={turn.start:.1f}s stop={turn.end:.1f}s speaker_{speaker}")
+         result.append({'start': turn.start, 'end': turn.end, 'speaker': speaker})
 
-   diarization = pipeline(temp_audio)
+   return result, stats
 
-   for turn, _, speaker in diarization.itertracks(yield_label=True):
-      # print(f"start={turn.start:.1f}s stop={turn.end:.1f}s speaker_{speaker}")
-      result.append({'start': turn.start, 'end': turn.end, 'speaker': speaker})
+
+def diarize_audio_in_thread(transcription_id):
+   """
+   Runs diarize_audio in a worker thread and closes the thread's database connection
+   when it is done.
+
+   Args:
+      transcription_id (int): The ID of the transcription to be diarized.
+
+   Returns:
+      tuple: The return value of diarize_audio.
+   """
+   try:
+      return diarize_audio(transcription_id)
+   finally:
+      connections.close_all()
+
+
+def apply_diarization(transcription_id, result, stats):
+   """
+   Saves diarization results to a transcription, assigns speakers to its words, and
+   recreates its segments.
+
+   Args:
+      transcription_id (int): The ID of the diarized transcription.
+      result (list): The speaker turns returned by diarize_audio.
+      stats (dict): The stats returned by diarize_audio.
+   """
+   transcription = Transcription.objects.get(pk=transcription_id)
+   diarize_status = transcription.statuses.get(process=TranscriptionStatus.DIARIZING)
+   meta = transcription.meta
 
    transcription.diarization = result
-   transcription.save(update_fields=['diarization'])
-   # Delete temp audio file
-   temp_audio.unlink()
+   transcription.meta.update(stats)
+   transcription.save(update_fields=['diarization', 'meta'])
 
    word_list = diarize_assign_speakers(transcription_id)
    diarized_segments = resegment_word_list(word_list, meta['max_segment_length'], meta['max_segment_time'])
-   # Remove existing segments
-   transcription.segments.all().delete()
-
-   for diarized_segment in diarized_segments:
-      diarized_segment['transcription'] = transcription
-      segment = Segment(**diarized_segment)
-      segment.save()
+   transcription.replace_segments(diarized_segments)
 
    diarize_status.status = TranscriptionStatus.COMPLETED
    diarize_status.end_time = datetime.now()
+   diarize_status.progress = 100
+   diarize_status.estimated_end_time = None
    diarize_status.save()
+
+
+def diarize_file(transcription_id, speakers=None):
+   """
+   This function retrieves a transcription object, processes the associated audio file
+   to perform speaker diarization, and updates the transcription with the diarization
+   results. It also handles the segmentation of the diarized audio and updates the
+   transcription's segments accordingly.
+
+   Args:
+      transcription_id (int): The ID of the transcription to be diarized.
+      speakers (dict): The num_speakers, min_speakers, and max_speakers to pass to the
+         pipeline (optional).
+   """
+   result = diarize_audio(transcription_id, speakers)
+
+   if result is not None:
+      apply_diarization(transcription_id, *result)
+
+
+def rediarize_file(transcription_id, num_speakers=None, min_speakers=None, max_speakers=None):
+   """
+   Diarizes a transcription again with new speaker counts. Queued by the re-diarize
+   action on the edit page.
+
+   Args:
+      transcription_id (int): The ID of the transcription to diarize.
+      num_speakers (int): The exact number of speakers (optional).
+      min_speakers (int): The minimum number of speakers (optional).
+      max_speakers (int): The maximum number of speakers (optional).
+   """
+   try:
+      transcription = Transcription.objects.get(pk=transcription_id)
+   except Transcription.DoesNotExist:
+      return
+
+   speakers = {
+      'num_speakers': num_speakers,
+      'min_speakers': min_speakers,
+      'max_speakers': max_speakers,
+   }
+
+   try:
+      diarize_file(transcription_id, speakers)
+   except:
+      transcription.fail_incomplete_statuses('Diarizing media failed.')
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webui', '0012_alter_transcriptionstatus_start_time'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transcriptionstatus',
+            name='estimated_end_time',
+            field=models.DateTimeField(default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name='transcriptionstatus',
+            name='progress',
+            field=models.FloatField(default=0),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:17
+
+from django.db import migrations, models
+
+
+def move_content_hash(apps, schema_editor):
+    """
+    Moves content hashes saved in the meta to the content_hash field.
+    """
+    Transcription = apps.get_model('webui', 'Transcription')
+
+    for transcription in Transcription.objects.filter(meta__has_key='content_hash'):
+        transcription.content_hash = transcription.meta.pop('content_hash')
+        transcription.save(update_fields=['content_hash', 'meta'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webui', '0013_transcriptionstatus_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transcription',
+            name='content_hash',
+            field=models.CharField(db_index=True, default='', max_length=64),
+        ),
+        migrations.RunPython(move_content_hash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webui', '0014_transcription_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transcription',
+            name='diarization_cache',
+            field=models.FileField(blank=True, max_length=255, upload_to='diarization'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:02
+
+from django.db import migrations, models
+import webui.fields
+
+
+def to_columns(apps, schema_editor):
+    """
+    Converts JSON word lists and diarizations to columnar binary fields.
+    """
+    Transcription = apps.get_model('webui', 'Transcription')
+
+    for transcription in Transcription.objects.only('id', 'word_list', 'diarization').iterator(chunk_size=100):
+        transcription.word_columns = transcription.word_list
+        transcription.diarization_columns = transcription.diarization
+        transcription.save(update_fields=['word_columns', 'diarization_columns'])
+
+
+def to_json(apps, schema_editor):
+    """
+    Converts columnar word lists and diarizations back to JSON fields.
+    """
+    Transcription = apps.get_model('webui', 'Transcription')
+
+    for transcription in Transcription.objects.only('id', 'word_columns', 'diarization_columns').iterator(chunk_size=100):
+        transcription.word_list = None if transcription.word_columns is None else transcription.word_columns.to_dicts()
+        transcription.diarization = None if transcription.diarization_columns is None else transcription.diarization_columns.to_dicts()
+        transcription.save(update_fields=['word_list', 'diarization'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webui', '0015_transcription_diarization_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transcription',
+            name='word_columns',
+            field=webui.fields.WordListField(default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name='transcription',
+            name='diarization_columns',
+            field=webui.fields.SpeakerTurnsField(default=None, null=True),
+        ),
+        migrations.RunPython(to_columns, to_json),
+        migrations.RemoveField(
+            model_name='transcription',
+            name='word_list',
+        ),
+        migrations.RemoveField(
+            model_name='transcription',
+            name='diarization',
+        ),
+        migrations.RenameField(
+            model_name='transcription',
+            old_name='word_columns',
+            new_name='word_list',
+        ),
+        migrations.RenameField(
+            model_name='transcription',
+            old_name='diarization_columns',
+            new_name='diarization',
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webui', '0016_columnar_word_list'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transcription',
+            name='submitted',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='transcription',
+            name='title',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+    ]
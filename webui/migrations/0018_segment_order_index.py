@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webui', '0017_transcription_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='segment',
+            index=models.Index(fields=['transcription', 'start', 'end'], name='webui_segme_transcr_3817ea_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:41
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webui', '0018_segment_order_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transcription',
+            name='modified',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='transcription',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webui', '0019_transcription_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transcriptionstatus',
+            name='worker',
+            field=models.CharField(default=None, max_length=255, null=True),
+        ),
+    ]
@@ -1,6 +1,80 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.conf import settings
+from django.utils import timezone
+
+from .fields import SpeakerTurnsField, WordListField
 
 from datetime import datetime
+import os
+import socket
+
+
+class TranscriptionQuerySet(models.QuerySet):
+   """
+   QuerySet of transcriptions that filters on the current status in the database.
+   """
+   def _in_progress(self):
+      # The current status is pending or processing when something is pending or
+      # processing and no process that started has failed
+      return Exists(TranscriptionStatus.objects.filter(
+         transcription=OuterRef('pk'),
+         status__in=[TranscriptionStatus.PENDING, TranscriptionStatus.PROCESSING],
+      )) & ~Exists(TranscriptionStatus.objects.filter(
+         transcription=OuterRef('pk'),
+         status=TranscriptionStatus.FAILED,
+         start_time__isnull=False,
+      ))
+
+   def in_progress(self):
+      """
+      Returns the transcriptions whose current status is pending or processing.
+      """
+      return self.filter(self._in_progress())
+
+   def finished(self):
+      """
+      Returns the transcriptions whose current status is completed or failed, or that
+      have no statuses.
+      """
+      return self.exclude(self._in_progress())
+
+   def with_statuses(self):
+      """
+      Prefetches the statuses so current_status and get_status_of do not query them.
+      """
+      return self.prefetch_related('statuses')
+
+   def search(self, text):
+      """
+      Returns the transcriptions whose title, description, or notes contain the text.
+      """
+      return self.filter(Q(title__icontains=text) | Q(description__icontains=text) | Q(notes__icontains=text))
+
+   def bump_version(self):
+      """
+      Marks the segments of the transcriptions as changed so cached exports are not
+      reused. Call it in the same transaction as the change.
+      """
+      return self.update(version=F('version') + 1, modified=timezone.now())
+
+   def with_transcript(self):
+      """
+      Loads the word list and diarization, which are deferred by default.
+      """
+      return self.defer(None)
+
+
+class TranscriptionManager(models.Manager.from_queryset(TranscriptionQuerySet)):
+   """
+   Manager of transcriptions that defers the word list and diarization, which can be
+   megabytes per transcription. Deferred fields are loaded on first access, or up front
+   with with_transcript().
+   """
+   DEFERRED_FIELDS = ['word_list', 'diarization']
+
+   def get_queryset(self):
+      return super().get_queryset().defer(*self.DEFERRED_FIELDS)
 
 
 class Transcription(models.Model):
@@ -13,49 +87,63 @@ class Transcription(models.Model):
       description (str): A brief description of the transcription. Defaults to an empty string.
       notes (str): Additional notes related to the transcription. Defaults to an empty string.
       upload_file (FileField): The file associated with the transcription.
-      word_list (JSONField): A JSON field to store a list of words related to the transcription. Can be null.
-      diarization (JSONField): A JSON field to store diarization data. Can be null.
+      word_list (WordListField): The words of the transcription stored as a compressed columnar WordList. Can be null.
+      diarization (SpeakerTurnsField): The diarized speaker turns stored as compressed columnar SpeakerTurns. Can be null.
       meta (JSONField): A JSON field to store additional metadata. Can be null.
+      content_hash (str): The SHA-256 hash of the uploaded file. Defaults to an empty string.
+      diarization_cache (FileField): The segmentations and speaker embeddings of the last diarization. Can be blank.
       submitted (DateTimeField): The timestamp when the transcription was submitted. Automatically set to the current time.
+      version (int): The version of the segments, increased whenever they change.
+      modified (DateTimeField): When the segments last changed.
    """
-   title = models.CharField(max_length=255)
+   title = models.CharField(max_length=255, db_index=True)
    description = models.TextField(default='')
    notes = models.TextField(default='')
    upload_file = models.FileField(max_length=255)
-   word_list = models.JSONField(null=True, default=None)
-   diarization = models.JSONField(null=True, default=None)
+   word_list = WordListField(null=True, default=None)
+   diarization = SpeakerTurnsField(null=True, default=None)
    meta = models.JSONField(null=True, default=None)
-   submitted = models.DateTimeField(auto_now=True)
+   content_hash = models.CharField(max_length=64, default='', db_index=True)
+   diarization_cache = models.FileField(max_length=255, upload_to='diarization', blank=True)
+   submitted = models.DateTimeField(auto_now=True, db_index=True)
+   version = models.PositiveIntegerField(default=0)
+   modified = models.DateTimeField(default=timezone.now)
+
+   objects = TranscriptionManager()
 
    def __str__(self):
       return f'{self.title}'
 
    def current_status(self):
       """
-      Returns the most relevant status for the transcription.
+      Returns the most relevant status for the transcription. Uses prefetched statuses if
+      there are any, otherwise the statuses are loaded in a single query.
 
       The hierarchy of status importance is FAILED (not cancelled), PROCESSING, PENDING,
       COMPLETED, and FAILED (cancelled).
       """
+      statuses = list(self.statuses.all())
+      # Nulls sort first like they do in the database
+      start_time = lambda status: (status.start_time is not None, status.start_time)
       # If failed, exclude processes that never started
-      status = self.statuses.filter(status=TranscriptionStatus.FAILED, start_time__isnull=False).order_by('start_time').first()
-      if status: return status
+      failed = [status for status in statuses if status.status == TranscriptionStatus.FAILED and status.start_time is not None]
+      if failed: return min(failed, key=start_time)
       # If processing, start time should be present if process statis is processing
-      status = self.statuses.filter(status=TranscriptionStatus.PROCESSING).order_by('start_time').first()
-      if status: return status
+      processing = [status for status in statuses if status.status == TranscriptionStatus.PROCESSING]
+      if processing: return min(processing, key=start_time)
       # If pending, must order by process number
-      status = self.statuses.filter(status=TranscriptionStatus.PENDING).order_by('process').first()
-      if status: return status
+      pending = [status for status in statuses if status.status == TranscriptionStatus.PENDING]
+      if pending: return min(pending, key=lambda status: status.process)
       # If completed, get last completed
-      status = self.statuses.filter(status=TranscriptionStatus.COMPLETED).order_by('-start_time').first()
-      if status: return status
+      completed = [status for status in statuses if status.status == TranscriptionStatus.COMPLETED]
+      if completed: return max(completed, key=start_time)
       # If a process was cancelled
-      status = self.statuses.filter(status=TranscriptionStatus.FAILED, start_time__isnull=True).order_by('start_time').first()
-      if status: return status
+      cancelled = [status for status in statuses if status.status == TranscriptionStatus.FAILED]
+      if cancelled: return cancelled[0]
 
    def get_status_of(self, process):
       """
-      Retrieve the status of a given process.
+      Retrieve the status of a given process. Uses prefetched statuses if there are any.
 
       Args:
           process: The process whose status is to be retrieved.
@@ -63,10 +151,7 @@ class Transcription(models.Model):
       Returns:
           The status of the specified process if it exists, otherwise None.
       """
-      try:
-         return self.statuses.get(process=process)
-      except TranscriptionStatus.DoesNotExist:
-         return None
+      return next((status for status in self.statuses.all() if status.process == process), None)
 
    def fail_incomplete_statuses(self, error_message='Transcription processing failed.', processes_to_fail=None):
       """
@@ -84,6 +169,38 @@ class Transcription(models.Model):
 
       incomplete_statuses.update(status=TranscriptionStatus.FAILED, error_message=error_message, end_time=datetime.now())
 
+   def is_resumable(self):
+      """
+      Returns True if the transcription has a failed status and nothing is pending or
+      processing.
+      """
+      return self.statuses.filter(status=TranscriptionStatus.FAILED).exists() and \
+         not self.statuses.filter(status__in=[TranscriptionStatus.PENDING, TranscriptionStatus.PROCESSING]).exists()
+
+   def reset_failed_statuses(self):
+      """
+      Marks failed transcription statuses as pending so they can be processed again.
+      """
+      self.statuses.filter(status=TranscriptionStatus.FAILED).update(
+         status=TranscriptionStatus.PENDING,
+         error_message=None,
+         start_time=None,
+         end_time=None)
+
+   def replace_segments(self, segments):
+      """
+      Replaces the segments of the transcription in a single transaction, so readers see
+      either the old or the new segments and never a partly written transcript.
+
+      Args:
+         segments (list of dict): The new segments with start, end, text, speaker, and
+            probability keys.
+      """
+      with transaction.atomic():
+         self.segments.all().delete()
+         Segment.objects.bulk_create([Segment(transcription=self, **segment) for segment in segments])
+         Transcription.objects.filter(pk=self.pk).bump_version()
+
    def fail_pending_statuses(self, error_message='Transcription processing failed.'):
       """
       Marks pending transcription statuses as failed.
@@ -121,6 +238,7 @@ class Segment(models.Model):
 
    class Meta:
       ordering = ['start', 'end']
+      indexes = [models.Index(fields=['transcription', 'start', 'end'])]
 
 
 class TranscriptionStatus(models.Model):
@@ -137,6 +255,9 @@ class TranscriptionStatus(models.Model):
       start_time (DateTimeField): When the process started. Can be null.
       end_time (DateTimeField): When the process completed. Can be null.
       error_message (str): An error message associated with this status. Can be null.
+      progress (float): How much of the process is done as a percentage.
+      estimated_end_time (DateTimeField): When the process is expected to complete. Can be null.
+      worker (str): The host and process ID of the queue worker processing it. Can be null.
    """
    DOWNLOADING = 10
    TRANSCRIBING = 20
@@ -164,6 +285,9 @@ class TranscriptionStatus(models.Model):
    start_time = models.DateTimeField(null=True, default=None)
    end_time = models.DateTimeField(null=True, default=None)
    error_message = models.TextField(null=True, default=None)
+   progress = models.FloatField(default=0)
+   estimated_end_time = models.DateTimeField(null=True, default=None)
+   worker = models.CharField(max_length=255, null=True, default=None)
 
    def __str__(self):
       """
@@ -173,6 +297,46 @@ class TranscriptionStatus(models.Model):
       status = dict(TranscriptionStatus.STATUS_CHOICES).get(self.status, 'unknown status')
       return f'{process} - {status}'
 
+   def start_processing(self):
+      """
+      Marks the process as processing and records the worker running it, so the status
+      can be failed if the worker stops without finishing it.
+      """
+      self.status = TranscriptionStatus.PROCESSING
+      self.start_time = datetime.now()
+      self.worker = get_worker_id()
+      self.save()
+
+   def update_progress(self, completed, total, baseline=0, force=False):
+      """
+      Updates the progress and estimated end time of the process. The end time is
+      estimated from the rate of work observed since the process started. Saves are
+      throttled to once every PROGRESS_UPDATE_INTERVAL seconds.
+
+      Args:
+         completed (float): The amount of work done, e.g. seconds of media processed.
+         total (float): The total amount of work.
+         baseline (float): The amount of work that was already done when the process
+            started, e.g. when resuming from a checkpoint.
+         force (bool): Whether to save even if the throttle interval has not passed.
+      """
+      now = datetime.now()
+      last_update = getattr(self, '_last_progress_update', None)
+
+      if not total or (not force and last_update and (now - last_update).total_seconds() < settings.PROGRESS_UPDATE_INTERVAL):
+         return
+
+      self._last_progress_update = now
+      self.progress = round(min(100.0, max(0.0, completed / total * 100)), 1)
+
+      # Real-time factor of the work done so far in this run
+      if self.start_time and completed > baseline:
+         start_time = timezone.make_naive(self.start_time) if timezone.is_aware(self.start_time) else self.start_time
+         elapsed = now - start_time
+         self.estimated_end_time = now + elapsed * ((total - completed) / (completed - baseline))
+
+      self.save(update_fields=['progress', 'estimated_end_time'])
+
    def print_process(self):
       """
       Returns the string representation of the process.
@@ -189,3 +353,11 @@ class TranscriptionStatus(models.Model):
 
    class Meta:
       verbose_name_plural = 'transcription statuses'
+
+
+def get_worker_id():
+   """
+   Returns the host and process ID of the current process, as saved in
+   TranscriptionStatus.worker.
+   """
+   return f'{socket.gethostname()}:{os.getpid()}'
@@ -0,0 +1,148 @@
+from django.conf import settings
+
+from .audio import SAMPLE_RATE, load_audio, to_float32
+from .registry import get_whisper_model
+
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+import time
+
+
+_pool = None
+_pool_size = 0
+
+
+def get_pool(processes):
+   """
+   Returns the process pool used for parallel transcription. The pool is kept between
+   jobs so each process keeps its Whisper model loaded in its own model registry.
+
+   Args:
+      processes (int): The number of processes in the pool.
+
+   Returns:
+      ProcessPoolExecutor: The process pool.
+   """
+   global _pool, _pool_size
+
+   if _pool is None or _pool_size != processes:
+      if _pool is not None:
+         _pool.shutdown()
+
+      # Spawn instead of fork so pool processes do not inherit the worker's threads
+      _pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'))
+      _pool_size = processes
+
+   return _pool
+
+
+def split_on_silence(audio, chunk_length):
+   """
+   Splits audio into chunks of roughly chunk_length seconds. Chunk boundaries are placed
+   in the middle of silences found by voice activity detection so no words are cut.
+
+   Args:
+      audio (numpy.ndarray): The 16 kHz float32 samples.
+      chunk_length (float): The target length of each chunk in seconds.
+
+   Returns:
+      list of tuple: A list of (start sample, end sample) pairs that cover the audio.
+   """
+   from faster_whisper.vad import get_speech_timestamps
+
+   target = int(chunk_length * SAMPLE_RATE)
+   speech = get_speech_timestamps(audio, sampling_rate=SAMPLE_RATE)
+   chunks = []
+   chunk_start = 0
+
+   for index in range(1, len(speech)):
+      # Cut in the middle of the silence before a speech region that would overflow the chunk
+      if speech[index]['end'] - chunk_start > target:
+         cut = (speech[index - 1]['end'] + speech[index]['start']) // 2
+         chunks.append((chunk_start, cut))
+         chunk_start = cut
+
+   chunks.append((chunk_start, len(audio)))
+   return chunks
+
+
+def transcribe_chunk(audio_path, start, end, model_name, cpu_threads, options):
+   """
+   Transcribes one chunk of decoded audio. This runs inside a pool process.
+
+   Args:
+      audio_path (str): The path to the decoded WAV file.
+      start (int): The first sample of the chunk.
+      end (int): The sample after the last sample of the chunk.
+      model_name (str): The Whisper model to use.
+      cpu_threads (int): The number of CPU threads the model may use.
+      options (dict): Keyword arguments passed to WhisperModel.transcribe.
+
+   Returns:
+      tuple: The list of words with offsets relative to the whole file and the number
+         of seconds spent transcribing the chunk.
+   """
+   model, _ = get_whisper_model(model_name, device='cpu', compute_type='auto', cpu_threads=cpu_threads)
+   chunk_start_time = time.monotonic()
+   offset = start / SAMPLE_RATE
+   words = []
+
+   segments, _ = model.transcribe(to_float32(load_audio(audio_path)[start:end]), **options)
+
+   for segment in segments:
+      for word in segment.words:
+         words.append({
+            'start': word.start + offset,
+            'end': word.end + offset,
+            'word': word.word,
+            'probability': word.probability,
+            'speaker': '',
+         })
+
+   return words, time.monotonic() - chunk_start_time
+
+
+def transcribe_parallel(audio_path, model_name, options, stats, start_sample=0):
+   """
+   Transcribes decoded audio by splitting it into chunks at silences and transcribing
+   the chunks in parallel across a process pool. Words are yielded in order with their
+   times corrected for the chunk offsets.
+
+   Args:
+      audio_path (str|Path): The path to the decoded WAV file.
+      model_name (str): The Whisper model to use.
+      options (dict): Keyword arguments passed to WhisperModel.transcribe.
+      stats (dict): Filled with the number of chunks, the wall-clock time, the summed
+         per-chunk transcription time, and the parallelism, the average number of
+         chunks transcribed at once.
+      start_sample (int): The sample to start transcribing from.
+
+   Yields:
+      dict: A word with start, end, word, probability, and speaker keys.
+   """
+   processes = settings.PARALLEL_PROCESSES
+   cpu_threads = settings.WHISPER_CPU_THREADS or max(1, (os.cpu_count() or 1) // processes)
+   wall_start = time.monotonic()
+
+   chunks = split_on_silence(to_float32(load_audio(audio_path)[start_sample:]), settings.PARALLEL_CHUNK_LENGTH)
+   pool = get_pool(processes)
+   futures = [pool.submit(transcribe_chunk, str(audio_path), start_sample + start, start_sample + end, model_name, cpu_threads, options) for start, end in chunks]
+   chunk_time = 0.0
+
+   try:
+      for future in futures:
+         words, seconds = future.result()
+         chunk_time += seconds
+         yield from words
+   finally:
+      # Do not leave queued chunks running if transcription fails or is stopped early
+      for future in futures:
+         future.cancel()
+
+   wall_time = time.monotonic() - wall_start
+   stats['chunks'] = len(chunks)
+   stats['wall_time'] = round(wall_time, 3)
+   stats['chunk_time'] = round(chunk_time, 3)
+   # How busy the pool was, not a speedup, as a single call was never timed
+   stats['parallelism'] = round(chunk_time / wall_time, 2) if wall_time else 0.0
@@ -0,0 +1,276 @@
+from django.conf import settings
+
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+import gc
+import threading
+import time
+
+
+class ModelRegistry:
+   """
+   A process-wide cache that keeps loaded models resident between queue tasks.
+
+   Entries are keyed by a hashable tuple and evicted least recently used first when the
+   memory budget is exceeded, or when they have not been used for longer than the idle
+   timeout. Hit and miss counts are kept so the time saved by caching can be seen.
+
+   Attributes:
+      max_memory (int): The memory budget in bytes. A budget of 0 disables caching.
+      idle_timeout (float): Seconds an entry may go unused before it is evicted. A
+         timeout of 0 disables idle eviction.
+   """
+   def __init__(self, max_memory=0, idle_timeout=0):
+      self.max_memory = max_memory
+      self.idle_timeout = idle_timeout
+      self._entries = OrderedDict()
+      self._loading = {}
+      self._lock = threading.RLock()
+      self._hits = 0
+      self._misses = 0
+      self._evictions = 0
+      self._load_time = 0.0
+      self._saved_time = 0.0
+
+   def get(self, key, loader):
+      """
+      Returns the model stored under key, loading it with loader on a miss. Models are
+      loaded outside the lock so a slow load does not block hits on other keys. Callers
+      that ask for a key that is already loading wait for that load instead of loading
+      the model again.
+
+      Args:
+         key (tuple): The cache key of the model.
+         loader (callable): A function with no arguments that returns a tuple of the
+            loaded model and its estimated size in bytes.
+
+      Returns:
+         tuple: The model and a bool that is True if the model came from the cache.
+      """
+      with self._lock:
+         self.evict_idle()
+         entry = self._entries.get(key)
+
+         if entry:
+            self._entries.move_to_end(key)
+            entry['last_used'] = time.monotonic()
+            self._hits += 1
+            self._saved_time += entry['load_time']
+            return entry['model'], True
+
+         loading = self._loading.get(key)
+         owner = loading is None
+
+         if owner:
+            loading = self._loading[key] = Future()
+            self._misses += 1
+         else:
+            self._hits += 1
+
+      if owner:
+         return self._load(key, loader, loading), False
+
+      # Another thread is loading the model
+      return loading.result(), True
+
+   def _load(self, key, loader, loading):
+      """
+      Loads a model, caches it if it fits in the memory budget, and passes it or the
+      error to the threads waiting for it.
+
+      Args:
+         key (tuple): The cache key of the model.
+         loader (callable): The loader passed to get.
+         loading (Future): The future of the load.
+
+      Returns:
+         The loaded model.
+      """
+      try:
+         start = time.monotonic()
+         model, size = loader()
+         load_time = time.monotonic() - start
+      except BaseException as error:
+         with self._lock:
+            del self._loading[key]
+
+         loading.set_exception(error)
+         raise
+
+      with self._lock:
+         del self._loading[key]
+         self._load_time += load_time
+
+         if size <= self.max_memory:
+            self._entries[key] = {
+               'model': model,
+               'size': size,
+               'load_time': load_time,
+               'last_used': time.monotonic(),
+            }
+            self._evict_to_budget()
+
+      loading.set_result(model)
+      return model
+
+   def evict(self, key):
+      """
+      Removes a single entry from the cache if it exists.
+
+      Args:
+         key (tuple): The cache key of the model to remove.
+      """
+      with self._lock:
+         if self._entries.pop(key, None) is not None:
+            self._evictions += 1
+            gc.collect()
+
+   def evict_idle(self):
+      """
+      Removes all entries that have not been used within the idle timeout.
+      """
+      if not self.idle_timeout: return
+
+      with self._lock:
+         now = time.monotonic()
+         idle_keys = [key for key, entry in self._entries.items() if now - entry['last_used'] > self.idle_timeout]
+
+         for key in idle_keys:
+            self.evict(key)
+
+   def clear(self):
+      """
+      Removes all entries from the cache.
+      """
+      with self._lock:
+         self._evictions += len(self._entries)
+         self._entries.clear()
+         gc.collect()
+
+   def memory_used(self):
+      """
+      Returns the estimated number of bytes held by cached models.
+      """
+      with self._lock:
+         return sum(entry['size'] for entry in self._entries.values())
+
+   def stats(self):
+      """
+      Returns a dictionary of cache counters.
+
+      Returns:
+         dict: Hits, misses, evictions, total load time, estimated load time saved by
+            hits, memory used, and the keys of the cached models.
+      """
+      with self._lock:
+         return {
+            'hits': self._hits,
+            'misses': self._misses,
+            'evictions': self._evictions,
+            'load_time': round(self._load_time, 3),
+            'saved_time': round(self._saved_time, 3),
+            'memory_used': self.memory_used(),
+            'models': [list(key) for key in self._entries],
+         }
+
+   def _evict_to_budget(self):
+      """
+      Evicts least recently used entries until the cache fits in the memory budget.
+      """
+      while self._entries and self.memory_used() > self.max_memory:
+         key = next(iter(self._entries))
+         self.evict(key)
+
+
+def get_module_size(modules):
+   """
+   Sums the size of the parameters and buffers of Torch modules.
+
+   Args:
+      modules (list of torch.nn.Module): The modules to measure.
+
+   Returns:
+      int: The total size in bytes.
+   """
+   size = 0
+
+   for module in modules:
+      for tensor in list(module.parameters()) + list(module.buffers()):
+         size += tensor.numel() * tensor.element_size()
+
+   return size
+
+
+def get_directory_size(path):
+   """
+   Sums the size of all files under a directory.
+
+   Args:
+      path (str|Path): The directory to measure.
+
+   Returns:
+      int: The total size in bytes.
+   """
+   return sum(file.stat().st_size for file in Path(path).rglob('*') if file.is_file())
+
+
+registry = ModelRegistry(
+   max_memory=settings.MODEL_CACHE_MAX_MEMORY * 1024 * 1024,
+   idle_timeout=settings.MODEL_CACHE_IDLE_TIMEOUT,
+)
+
+
+def get_whisper_model(model_name, device='cpu', compute_type='auto', cpu_threads=0):
+   """
+   Returns a Whisper model from the process-wide registry, loading it on a miss.
+
+   Args:
+      model_name (str): The Whisper model size or ID.
+      device (str): The device to run the model on.
+      compute_type (str): The CTranslate2 compute type.
+      cpu_threads (int): The number of CPU threads to use. 0 uses the default.
+
+   Returns:
+      tuple: The WhisperModel and a bool that is True if it came from the cache.
+   """
+   from faster_whisper import WhisperModel
+   from faster_whisper.utils import download_model
+
+   def loader():
+      model_path = download_model(model_name, cache_dir=str(settings.MODEL_CACHE_PATH))
+      model = WhisperModel(model_path, device=device, compute_type=compute_type, cpu_threads=cpu_threads)
+      return model, get_directory_size(model_path)
+
+   return registry.get(('whisper', model_name, device, compute_type, cpu_threads), loader)
+
+
+def get_diarization_pipeline(pipeline_name, device='cpu'):
+   """
+   Returns a Pyannote.Audio pipeline from the process-wide registry, loading it on a miss.
+
+   Args:
+      pipeline_name (str): The Hugging Face ID of the pipeline.
+      device (str): The device to run the pipeline on.
+
+   Returns:
+      tuple: The Pipeline and a bool that is True if it came from the cache.
+   """
+   import torch
+   from pyannote.audio import Pipeline
+
+   def loader():
+      pipeline = Pipeline.from_pretrained(pipeline_name, use_auth_token=settings.HUGGING_FACE_TOKEN, cache_dir=settings.MODEL_CACHE_PATH)
+      pipeline.to(torch.device(device))
+
+      # The segmentation and embedding models are held by the pipeline's inferences
+      modules = []
+      for inference in pipeline._inferences.values():
+         module = getattr(inference, 'model', None) or getattr(inference, 'model_', None)
+
+         if isinstance(module, torch.nn.Module):
+            modules.append(module)
+
+      return pipeline, get_module_size(modules)
+
+   return registry.get(('pyannote', pipeline_name, device), loader)
@@ -54,146 +54,335 @@
    });
 
 
-   // Setup all segment events
-   let segments = document.querySelectorAll('.segment');
-   segments.forEach(setupSegment);
-
-
-   // Function: setupSegment
-   // Adds events to segments
-   function setupSegment(segment) {
-      const segmentId = segment.dataset.index;
-      let inputs = segment.querySelectorAll('input');
-      let textareas =  segment.querySelectorAll('textarea');
-      let buttons = segment.querySelectorAll('button');
-      let startTime = document.querySelector('#start-' + segmentId);
+   // Segments are loaded in pages as they are scrolled near and pages far from the
+   // viewport are emptied, so only the segments near the viewport are in the DOM
+   const segmentContainer = document.querySelector('#segments');
+   const PAGE_SIZE = 50;
+   const ESTIMATED_SEGMENT_HEIGHT = 200;
+   const LOAD_MARGIN = '1500px 0px';
+   const UNLOAD_MARGIN = '6000px 0px';
+   let pageObserver;
+   let unloadObserver;
+
+   // Segment edits are coalesced and saved in batches
+   const FLUSH_INTERVAL = 2000;
+   let pendingEdits = new Map();
+   let pendingDeletes = new Set();
+   let flushQueue = Promise.resolve();
+
+   if(segmentContainer) {
+      setupSegmentPages();
+      setupSegmentEvents();
+   }
 
-      // Enable tooltips
-      const tooltipTriggerList = segment.querySelectorAll('[data-bs-toggle="tooltip"]');
-      const tooltipList = [...tooltipTriggerList].map(tooltipTriggerEl => new bootstrap.Tooltip(tooltipTriggerEl, {trigger : 'hover'}));
 
-      // Update input fields on change
-      inputs.forEach(input => {
-         input.addEventListener('change', async event => {
-            const data = { field: event.target.dataset.field }
+   // Function: setupSegmentPages
+   // Creates a placeholder for each page of segments and observes when they near the viewport
+   function setupSegmentPages() {
+      const count = parseInt(segmentContainer.dataset.count, 10);
 
-            if(data.field === 'start' || data.field === 'end') {
-               data['value'] = segmentTimeToSeconds(event.target.value);
-            }
-            else {
-               data['value'] = event.target.value;
+      pageObserver = new IntersectionObserver(entries => {
+         entries.forEach(entry => {
+            if(entry.isIntersecting) {
+               loadPage(entry.target);
             }
+         });
+      }, { rootMargin: LOAD_MARGIN });
 
-            const result = await callApi('/api/segments/' + segmentId, data, 'POST');
-
-            if(result.status === 200) {
-               input.classList.remove('error');
-               input.classList.add('success');
-            }
-            else {
-               input.classList.remove('success');
-               input.classList.add('error');
+      unloadObserver = new IntersectionObserver(entries => {
+         entries.forEach(entry => {
+            if(!entry.isIntersecting) {
+               unloadPage(entry.target);
             }
          });
-      });
+      }, { rootMargin: UNLOAD_MARGIN });
+
+      for(let offset = 0; offset < count; offset += PAGE_SIZE) {
+         const page = document.createElement('div');
+         page.className = 'segment-page';
+         page.dataset.offset = offset;
+         page.dataset.limit = Math.min(PAGE_SIZE, count - offset);
+         page.style.minHeight = (page.dataset.limit * ESTIMATED_SEGMENT_HEIGHT) + 'px';
+         segmentContainer.append(page);
+         pageObserver.observe(page);
+      }
+
+      // Load the page of the segment at the media position
+      if(mediaPlayer) {
+         mediaPlayer.addEventListener('seeked', async () => {
+            const params = new URLSearchParams({ time: mediaPlayer.currentTime, limit: PAGE_SIZE });
+            const response = await callApi(segmentContainer.dataset.url + '?' + params.toString());
 
-      // Update textarea on change and add autoplay
-      textareas.forEach(textarea => {
-         // Autoplay
-         textarea.addEventListener('focus', () => {
-            if(autoplay.checked) {
-               let time = segmentTimeToSeconds(startTime.value);
+            if(response.status === 200) {
+               const json = await response.json();
+               const page = segmentContainer.querySelector(`.segment-page[data-offset='${json.offset}']`);
 
-               if(time) {
-                  mediaPlayer.currentTime = time;
-                  mediaPlayer.play();
+               if(page) {
+                  loadPage(page);
                }
             }
          });
+      }
+   }
 
-         textarea.addEventListener('change', async event => {
-            const data = {
-               field: event.target.dataset.field,
-               value: event.target.value
-            };
-            const result = await callApi('/api/segments/' + segmentId, data, 'POST');
 
-            if(result.status === 200) {
-               textarea.classList.remove('error');
-               textarea.classList.add('success');
-            }
-            else {
-               textarea.classList.remove('success');
-               textarea.classList.add('error');
-            }
+   // Function: loadPage
+   // Fetches and renders the segments of a page
+   async function loadPage(page) {
+      if(page.dataset.state === 'loading' || page.dataset.state === 'loaded') {
+         return;
+      }
+
+      page.dataset.state = 'loading';
+      // A page that was emptied may have edits that are not saved yet
+      await flushEdits();
+      const params = new URLSearchParams({ offset: page.dataset.offset, limit: page.dataset.limit });
+      const response = await callApi(segmentContainer.dataset.url + '?' + params.toString());
+
+      if(response.status !== 200) {
+         delete page.dataset.state;
+         return;
+      }
+
+      const json = await response.json();
+      page.innerHTML = json.segments.join('');
+      page.style.minHeight = '';
+      page.dataset.state = 'loaded';
+
+      // Disable media buttons if no media
+      if(!mediaPlayer) {
+         page.querySelectorAll('button[data-type="play"], button[data-type="pause"], button[data-type="rewind"]').forEach(button => {
+            button.disabled = true;
          });
+      }
+
+      unloadObserver.observe(page);
+   }
+
+
+   // Function: unloadPage
+   // Replaces the segments of a page far from the viewport with empty space of the same height
+   function unloadPage(page) {
+      if(page.dataset.state !== 'loaded' || page.contains(document.activeElement)) {
+         return;
+      }
+
+      page.querySelectorAll('[data-bs-toggle="tooltip"]').forEach(element => {
+         const tooltip = bootstrap.Tooltip.getInstance(element);
+
+         if(tooltip) {
+            tooltip.dispose();
+         }
       });
 
-      // Add listeners to all buttons
-      buttons.forEach(button => {
-         const buttonType = button.dataset.type;
-
-         // Disable media buttons if no media
-         if(!mediaPlayer) {
-            switch(buttonType) {
-               case 'play':
-               case 'pause':
-               case 'rewind':
-                  button.disabled = true;
-                  break;
+      page.style.minHeight = page.offsetHeight + 'px';
+      page.innerHTML = '';
+      delete page.dataset.state;
+      unloadObserver.unobserve(page);
+   }
+
+
+   // Function: shiftPages
+   // Updates page offsets after a segment is added to or removed from a page
+   function shiftPages(page, change) {
+      page.dataset.limit = parseInt(page.dataset.limit, 10) + change;
+      let next = page.nextElementSibling;
+
+      while(next) {
+         next.dataset.offset = parseInt(next.dataset.offset, 10) + change;
+         next = next.nextElementSibling;
+      }
+
+      segmentContainer.dataset.count = parseInt(segmentContainer.dataset.count, 10) + change;
+   }
+
+
+   // Function: setupSegmentEvents
+   // Adds events for every segment to the segment container
+   function setupSegmentEvents() {
+      // Enable tooltips
+      new bootstrap.Tooltip(segmentContainer, { selector: '[data-bs-toggle="tooltip"]', trigger: 'hover' });
+
+      // Update input fields and textareas on change
+      segmentContainer.addEventListener('change', event => {
+         const field = event.target;
+         const segment = field.closest('.segment');
+
+         if(!segment || !field.dataset.field) {
+            return;
+         }
+
+         let value = field.value;
+
+         if(field.dataset.field === 'start' || field.dataset.field === 'end') {
+            value = segmentTimeToSeconds(field.value);
+
+            // An invalid time would make the server reject the whole batch, so only this edit is dropped
+            if(value === null) {
+               pendingEdits.delete(segment.dataset.index + ':' + field.dataset.field);
+               field.classList.remove('success');
+               field.classList.add('error');
+               return;
             }
          }
 
-         // Add button click functions
-         button.addEventListener('click', () => {
-            switch(buttonType) {
-               case 'play':
-                  mediaPlayer.currentTime = segmentTimeToSeconds(startTime.value, false);
-                  mediaPlayer.play();
-                  break;
-               case 'pause':
-                  mediaPlayer.paused ? mediaPlayer.play() : mediaPlayer.pause();
-                  break;
-               case 'rewind':
-                  let currentTime = mediaPlayer.currentTime;
-                  let newTime = currentTime - 1.0;
-                  mediaPlayer.currentTime = (newTime < 0) ? 0 : newTime;
-                  break;
-               case 'add-before':
-                  createSegment(segmentId, -1);
-                  break;
-               case 'add-after':
-                  createSegment(segmentId, 1);
-                  break;
-               case 'delete':
-                  deleteSegment(segmentId);
-                  break;
-               default:
-                  console.log('You should never see this.');
+         queueEdit(segment.dataset.index, field.dataset.field, value, field);
+      });
+
+      // Save edits when a field loses focus, periodically, and when the page is hidden
+      segmentContainer.addEventListener('focusout', () => flushEdits());
+      setInterval(flushEdits, FLUSH_INTERVAL);
+
+      document.addEventListener('visibilitychange', () => {
+         if(document.visibilityState === 'hidden') {
+            flushEdits(true);
+         }
+      });
+
+      // Autoplay
+      segmentContainer.addEventListener('focusin', event => {
+         const segment = event.target.closest('.segment');
+
+         if(event.target.tagName === 'TEXTAREA' && segment && autoplay.checked) {
+            let time = segmentTimeToSeconds(segment.querySelector('#start-' + segment.dataset.index).value);
+
+            if(time) {
+               mediaPlayer.currentTime = time;
+               mediaPlayer.play();
             }
-         });
+         }
+      });
+
+      // Add button click functions
+      segmentContainer.addEventListener('click', event => {
+         const button = event.target.closest('button');
+         const segment = event.target.closest('.segment');
+
+         if(!button || !segment) {
+            return;
+         }
+
+         const segmentId = segment.dataset.index;
+         const startTime = segment.querySelector('#start-' + segmentId);
+
+         switch(button.dataset.type) {
+            case 'play':
+               mediaPlayer.currentTime = segmentTimeToSeconds(startTime.value, false);
+               mediaPlayer.play();
+               break;
+            case 'pause':
+               mediaPlayer.paused ? mediaPlayer.play() : mediaPlayer.pause();
+               break;
+            case 'rewind':
+               let currentTime = mediaPlayer.currentTime;
+               let newTime = currentTime - 1.0;
+               mediaPlayer.currentTime = (newTime < 0) ? 0 : newTime;
+               break;
+            case 'add-before':
+               createSegment(segmentId, -1);
+               break;
+            case 'add-after':
+               createSegment(segmentId, 1);
+               break;
+            case 'delete':
+               deleteSegment(segmentId);
+               break;
+            default:
+               console.log('You should never see this.');
+         }
+      });
+   }
+
+
+   // Function: queueEdit
+   // Adds a segment edit to the next batch, replacing an earlier edit of the same field
+   function queueEdit(segmentId, field, value, element) {
+      element.classList.remove('success', 'error');
+      pendingEdits.set(segmentId + ':' + field, { id: segmentId, field: field, value: value, element: element });
+   }
+
+
+   // Function: flushEdits
+   // Saves the pending edits and deletes in one batch after any batch that is being saved
+   function flushEdits(keepalive = false) {
+      flushQueue = flushQueue.then(() => sendEdits(keepalive));
+      return flushQueue;
+   }
+
+
+   // Function: sendEdits
+   // Sends the pending edits and deletes, returns whether they were saved. Edits that
+   // were not saved are queued again unless a newer edit of the same field replaced them.
+   async function sendEdits(keepalive) {
+      if(pendingEdits.size === 0 && pendingDeletes.size === 0) {
+         return true;
+      }
+
+      const edits = [...pendingEdits.entries()];
+      const data = {
+         updates: edits.map(([, edit]) => ({ id: edit.id, field: edit.field, value: edit.value })),
+         deletes: [...pendingDeletes]
+      };
+      pendingEdits = new Map();
+      pendingDeletes = new Set();
+
+      let saved = false;
+      let missing = [];
+
+      try {
+         const response = await callApi('/api/segments/batch', data, 'POST', keepalive);
+         saved = response.status === 200;
+
+         // Edits of segments that no longer exist can never be saved, so they are not retried
+         if(response.status === 404) {
+            missing = (await response.json()).missing.map(String);
+         }
+      }
+      catch(error) {
+         saved = false;
+      }
+
+      edits.forEach(([key, edit]) => {
+         // A newer edit of the field was made while this batch was being saved
+         if(pendingEdits.has(key)) {
+            return;
+         }
+
+         edit.element.classList.remove('success', 'error');
+         edit.element.classList.add(saved ? 'success' : 'error');
+
+         if(!saved && !missing.includes(String(edit.id))) {
+            pendingEdits.set(key, edit);
+         }
       });
+
+      return saved;
    }
 
 
    // Function: createSegment
    async function createSegment(segmentId, where) {
+      // New segment times are based on the saved times of its neighbours
+      await flushEdits();
       let otherSegment;
       let otherId = -1;
       const clickedSegment = document.querySelector(`.segment[data-index='${segmentId}']`);
+      // Neighbouring segments can be in another page
+      const loadedSegments = [...segmentContainer.querySelectorAll('.segment')];
+      const clickedIndex = loadedSegments.indexOf(clickedSegment);
 
       if(where < 0) {
-         otherSegment = clickedSegment.previousElementSibling;
+         otherSegment = loadedSegments[clickedIndex - 1];
       }
       else if(where > 0) {
-         otherSegment = clickedSegment.nextElementSibling;
+         otherSegment = loadedSegments[clickedIndex + 1];
       }
       else {
          alert('Segment creation failed due to placement issue.');
          return;
       }
 
-      if(otherSegment && otherSegment.classList.contains('segment')) {
+      if(otherSegment) {
          otherId = otherSegment.dataset.index;
       }
 
@@ -213,7 +402,7 @@
 
          if(where < 0) { clickedSegment.before(segment);  }
          else if( where > 0) { clickedSegment.after(segment); }
-         setupSegment(segment);
+         shiftPages(clickedSegment.closest('.segment-page'), 1);
       }
       else {
          alert('Segment creation failed due to server error.');
@@ -227,10 +416,11 @@
 
       // segmentId should never be 0 due to autoincrement - if it ever is this will not work on segment 0
       if(segmentId && (segment = document.querySelector(`.segment[data-index='${segmentId}']`))) {
-         const data = { method: 'DELETE' };
-         const response = await callApi('/api/segments/' + segmentId, data, 'POST');
+         // Edits of the segment are dropped and the delete is saved with the other pending edits
+         [...pendingEdits.keys()].filter(key => key.startsWith(segmentId + ':')).forEach(key => pendingEdits.delete(key));
+         pendingDeletes.add(segmentId);
 
-         if(response.status == 204) {
+         if(await flushEdits()) {
             let button = segment.querySelector('.segment-delete');
             let tooltip = bootstrap.Tooltip.getInstance(button);
 
@@ -238,6 +428,7 @@
                tooltip.dispose();
             }
 
+            shiftPages(segment.closest('.segment-page'), -1);
             segment.remove();
          }
          else {
@@ -246,9 +437,7 @@
       }
 
       // If there are no more segments reload the page to show the add segment code
-      const segments = document.querySelectorAll('.segment');
-
-      if(segments.length === 0) {
+      if(parseInt(segmentContainer.dataset.count, 10) === 0) {
          window.location.reload();
       }
    }
@@ -256,7 +445,7 @@
 
    // Function: callApi
    // Calls API to update a segment
-   async function callApi(apiPath, data, method = 'GET') {
+   async function callApi(apiPath, data, method = 'GET', keepalive = false) {
       let headers = {
          'Content-Type': 'application/json',
          'X-Requested-With': 'XMLHttpRequest',
@@ -268,9 +457,12 @@
 
       const response = await fetch(apiPath, {
          method: method.toUpperCase(),
-         body: JSON.stringify(data),
+         // GET requests cannot have a body, their parameters are in the path
+         body: method.toUpperCase() == 'GET' ? null : JSON.stringify(data),
          headers: headers,
          mode: 'same-origin',
+         // Lets a request finish after the page is closed
+         keepalive: keepalive,
       });
 
       // const responseData = await response.json();
@@ -1 +1,45 @@
-(()=>{'use strict';let a=document.querySelector('#autoplay'),b=document.querySelector('#media'),c=window.location.pathname.split('/').pop(),d=document.querySelectorAll('.transcription-part');document.addEventListener('DOMContentLoaded',()=>{let A=document.querySelector('#scrollToTop'),_=300;window.scrollY>_&&(A.style.display='block');window.addEventListener('scroll',()=>{window.scrollY>_?A.style.display='block':A.style.display='none'});A.addEventListener('click',B=>{B.preventDefault();window.scrollTo({top:0,behavior:'smooth'})})});for(const C of d)C.addEventListener('change',async _a=>{let _b=await i(`/api/transcriptions/${c}`,{field:_a.target.dataset.field, value:_a.target.value},'POST');_b.status===200?(C.classList.remove('error'),C.classList.add('success')):(C.classList.remove('success'),C.classList.add('error'))});let e=document.querySelectorAll('.segment');e.forEach(f);function f(D){let _B=D.dataset.index,_c=D.querySelectorAll('input'),_d=D.querySelectorAll('textarea'),E=D.querySelectorAll('button'),F=document.querySelector(`#start-${_B}`),G=D.querySelectorAll('[data-bs-toggle="tooltip"]'),H=[...G].map(_A=>new bootstrap.Tooltip(_A, {trigger:'hover'}));for(const aA of _c)aA.addEventListener('change',async aB=>{let aC={field:aB.target.dataset.field};aC.field==='start'||aC.field==='end'?aC['value']=j(aB.target.value):aC['value']=aB.target.value;let _C=await i(`/api/segments/${_B}`,aC,'POST');_C.status===200?(aA.classList.remove('error'),aA.classList.add('success')):(aA.classList.remove('success'),aA.classList.add('error'))});for(const aD of _d){aD.addEventListener('focus',()=>{if(a.checked){let aE=j(F.value);aE&&(b.currentTime=aE,b.play())}});aD.addEventListener('change',async aF=>{let aG=await i(`/api/segments/${_B}`,{field:aF.target.dataset.field, value:aF.target.value},'POST');aG.status===200?(aD.classList.remove('error'),aD.classList.add('success')):(aD.classList.remove('success'),aD.classList.add('error'))})}for(const aH of E){let aI=aH.dataset.type;if(!b)switch(aI) {case 'play':case 'pause':case 'rewind':aH.disabled=!0;break}aH.addEventListener('click',()=>{switch(aI) {case 'play':b.currentTime=j(F.value,!1);b.play();break;case 'pause':b.paused?b.play():b.pause();break;case 'rewind':let aJ=b.currentTime;let aK=aJ-1.0;b.currentTime=(aK<0)?0:aK;break;case 'add-before':g(_B,-1);break;case 'add-after':g(_B,1);break;case 'delete':h(_B);break;default:console.log('You should never see this.')}})}}async function g(aL,aM){let aN,_D=-1,_e=document.querySelector(`.segment[data-index='${aL}']`);if(aM<0)aN=_e.previousElementSibling;else if(aM>0)aN=_e.nextElementSibling;else{alert('Segment creation failed due to placement issue.');return}(aN&&aN.classList.contains('segment'))&&(_D=aN.dataset.index);let _f=await i('/api/segments/',{segmentId:aL, otherId:_D, where:aM},'POST');if(_f.status==200){let aO=await _f.json();let aP=document.createElement('div');aP.innerHTML=aO.segment.trim();let aQ=aP.childNodes[0];if(aM<0)_e.before(aQ);else aM>0&&_e.after(aQ);f(aQ)}else alert('Segment creation failed due to server error.')}async function h(aR){let aS;if(aR&&(aS=document.querySelector(`.segment[data-index='${aR}']`))){let aU=await i(`/api/segments/${aR}`,{method:'DELETE'},'POST');if(aU.status==204){let aV=bootstrap.Tooltip.getInstance(aS.querySelector('.segment-delete'));aV?.dispose();aS.remove()}else alert('Segment deletion failed due to server error.')}let aT=document.querySelectorAll('.segment');aT.length===0&&window.location.reload()}async function i(aW,aX,aY='GET'){let aZ={'Content-Type':'application/json','X-Requested-With':'XMLHttpRequest'};aY.toUpperCase()=='POST'&&(aZ['X-CSRFToken']=document.querySelector('[name=csrfmiddlewaretoken]').value);let _E=await fetch(aW,{method:aY.toUpperCase(),body:JSON.stringify(aX),headers:aZ,mode:'same-origin'});return _E}function j(bA,bB=!0){let bC=bA.split(':'),bD=0,bE=0,_F=0,_g=0,_h=bF=>{let bG=bF.split('.'),bI=0;bG[0]===''&&(bG[0]='0');let bH=parseInt(bG[0],10);if(bG.length>1){let bJ=bG[1];if(bJ.length===1)bI=parseInt(`${bJ}00`,10);else bJ.length===2?bI=parseInt(`${bJ}0`,10):bI=parseInt(bJ.substring(0,3),10)}return{seconds:bH,milliseconds:bI}};if(bC.length===1){const{seconds:s,milliseconds:bK}=_h(bC[0]);_F=s;_g=bK}else if(bC.length===2){bE=parseInt(bC[0],10);const{seconds:s,milliseconds:bL}=_h(bC[1]);_F=s;_g=bL}else if(bC.length===3){bD=parseInt(bC[0],10);bE=parseInt(bC[1],10);const{seconds:s,milliseconds:bM}=_h(bC[2]);_F=s;_g=bM}let I=(bD*3600)+(bE*60)+_F+(_g/1000);if(isNaN(I))return bB?null:0;return I}})();
+(()=>{'use strict';const autoplay=document.querySelector('#autoplay');const mediaPlayer=document.querySelector('#media');const transcriptionId=window.location.pathname.split('/').pop();let transcriptionParts=document.querySelectorAll('.transcription-part');document.addEventListener('DOMContentLoaded',()=>{const scrollButton=document.querySelector('#scrollToTop');const scrollYHeight=300;if(window.scrollY>scrollYHeight){scrollButton.style.display='block';}
+window.addEventListener('scroll',()=>{if(window.scrollY>scrollYHeight){scrollButton.style.display='block';}
+else{scrollButton.style.display='none';}});scrollButton.addEventListener('click',event=>{event.preventDefault();window.scrollTo({top:0,behavior:'smooth'});});});transcriptionParts.forEach(part=>{part.addEventListener('change',async event=>{const data={field:event.target.dataset.field,value:event.target.value};const result=await callApi('/api/transcriptions/'+transcriptionId,data,'POST');if(result.status===200){part.classList.remove('error');part.classList.add('success');}
+else{part.classList.remove('success');part.classList.add('error');}});});const segmentContainer=document.querySelector('#segments');const PAGE_SIZE=50;const ESTIMATED_SEGMENT_HEIGHT=200;const LOAD_MARGIN='1500px 0px';const UNLOAD_MARGIN='6000px 0px';let pageObserver;let unloadObserver;const FLUSH_INTERVAL=2000;let pendingEdits=new Map();let pendingDeletes=new Set();let flushQueue=Promise.resolve();if(segmentContainer){setupSegmentPages();setupSegmentEvents();}
+function setupSegmentPages(){const count=parseInt(segmentContainer.dataset.count,10);pageObserver=new IntersectionObserver(entries=>{entries.forEach(entry=>{if(entry.isIntersecting){loadPage(entry.target);}});},{rootMargin:LOAD_MARGIN});unloadObserver=new IntersectionObserver(entries=>{entries.forEach(entry=>{if(!entry.isIntersecting){unloadPage(entry.target);}});},{rootMargin:UNLOAD_MARGIN});for(let offset=0;offset<count;offset+=PAGE_SIZE){const page=document.createElement('div');page.className='segment-page';page.dataset.offset=offset;page.dataset.limit=Math.min(PAGE_SIZE,count-offset);page.style.minHeight=(page.dataset.limit*ESTIMATED_SEGMENT_HEIGHT)+'px';segmentContainer.append(page);pageObserver.observe(page);}
+if(mediaPlayer){mediaPlayer.addEventListener('seeked',async()=>{const params=new URLSearchParams({time:mediaPlayer.currentTime,limit:PAGE_SIZE});const response=await callApi(segmentContainer.dataset.url+'?'+params.toString());if(response.status===200){const json=await response.json();const page=segmentContainer.querySelector(`.segment-page[data-offset='${json.offset}']`);if(page){loadPage(page);}}});}}
+async function loadPage(page){if(page.dataset.state==='loading'||page.dataset.state==='loaded'){return;}
+page.dataset.state='loading';await flushEdits();const params=new URLSearchParams({offset:page.dataset.offset,limit:page.dataset.limit});const response=await callApi(segmentContainer.dataset.url+'?'+params.toString());if(response.status!==200){delete page.dataset.state;return;}
+const json=await response.json();page.innerHTML=json.segments.join('');page.style.minHeight='';page.dataset.state='loaded';if(!mediaPlayer){page.querySelectorAll('button[data-type="play"], button[data-type="pause"], button[data-type="rewind"]').forEach(button=>{button.disabled=true;});}
+unloadObserver.observe(page);}
+function unloadPage(page){if(page.dataset.state!=='loaded'||page.contains(document.activeElement)){return;}
+page.querySelectorAll('[data-bs-toggle="tooltip"]').forEach(element=>{const tooltip=bootstrap.Tooltip.getInstance(element);if(tooltip){tooltip.dispose();}});page.style.minHeight=page.offsetHeight+'px';page.innerHTML='';delete page.dataset.state;unloadObserver.unobserve(page);}
+function shiftPages(page,change){page.dataset.limit=parseInt(page.dataset.limit,10)+change;let next=page.nextElementSibling;while(next){next.dataset.offset=parseInt(next.dataset.offset,10)+change;next=next.nextElementSibling;}
+segmentContainer.dataset.count=parseInt(segmentContainer.dataset.count,10)+change;}
+function setupSegmentEvents(){new bootstrap.Tooltip(segmentContainer,{selector:'[data-bs-toggle="tooltip"]',trigger:'hover'});segmentContainer.addEventListener('change',event=>{const field=event.target;const segment=field.closest('.segment');if(!segment||!field.dataset.field){return;}
+let value=field.value;if(field.dataset.field==='start'||field.dataset.field==='end'){value=segmentTimeToSeconds(field.value);}
+queueEdit(segment.dataset.index,field.dataset.field,value,field);});segmentContainer.addEventListener('focusout',()=>flushEdits());setInterval(flushEdits,FLUSH_INTERVAL);document.addEventListener('visibilitychange',()=>{if(document.visibilityState==='hidden'){flushEdits(true);}});segmentContainer.addEventListener('focusin',event=>{const segment=event.target.closest('.segment');if(event.target.tagName==='TEXTAREA'&&segment&&autoplay.checked){let time=segmentTimeToSeconds(segment.querySelector('#start-'+segment.dataset.index).value);if(time){mediaPlayer.currentTime=time;mediaPlayer.play();}}});segmentContainer.addEventListener('click',event=>{const button=event.target.closest('button');const segment=event.target.closest('.segment');if(!button||!segment){return;}
+const segmentId=segment.dataset.index;const startTime=segment.querySelector('#start-'+segmentId);switch(button.dataset.type){case'play':mediaPlayer.currentTime=segmentTimeToSeconds(startTime.value,false);mediaPlayer.play();break;case'pause':mediaPlayer.paused?mediaPlayer.play():mediaPlayer.pause();break;case'rewind':let currentTime=mediaPlayer.currentTime;let newTime=currentTime-1.0;mediaPlayer.currentTime=(newTime<0)?0:newTime;break;case'add-before':createSegment(segmentId,-1);break;case'add-after':createSegment(segmentId,1);break;case'delete':deleteSegment(segmentId);break;default:console.log('You should never see this.');}});}
+function queueEdit(segmentId,field,value,element){element.classList.remove('success','error');pendingEdits.set(segmentId+':'+field,{id:segmentId,field:field,value:value,element:element});}
+function flushEdits(keepalive=false){flushQueue=flushQueue.then(()=>sendEdits(keepalive));return flushQueue;}
+async function sendEdits(keepalive){if(pendingEdits.size===0&&pendingDeletes.size===0){return true;}
+const edits=[...pendingEdits.values()];const data={updates:edits.map(edit=>({id:edit.id,field:edit.field,value:edit.value})),deletes:[...pendingDeletes]};pendingEdits=new Map();pendingDeletes=new Set();let saved=false;try{const response=await callApi('/api/segments/batch',data,'POST',keepalive);saved=response.status===200;}
+catch(error){saved=false;}
+edits.forEach(edit=>{edit.element.classList.add(saved?'success':'error');});return saved;}
+async function createSegment(segmentId,where){await flushEdits();let otherSegment;let otherId=-1;const clickedSegment=document.querySelector(`.segment[data-index='${segmentId}']`);const loadedSegments=[...segmentContainer.querySelectorAll('.segment')];const clickedIndex=loadedSegments.indexOf(clickedSegment);if(where<0){otherSegment=loadedSegments[clickedIndex-1];}
+else if(where>0){otherSegment=loadedSegments[clickedIndex+1];}
+else{alert('Segment creation failed due to placement issue.');return;}
+if(otherSegment){otherId=otherSegment.dataset.index;}
+const data={segmentId:segmentId,otherId:otherId,where:where};const response=await callApi('/api/segments/',data,'POST');if(response.status==200){const json=await response.json();let wrapper=document.createElement('div');wrapper.innerHTML=json.segment.trim();let segment=wrapper.childNodes[0];if(where<0){clickedSegment.before(segment);}
+else if(where>0){clickedSegment.after(segment);}
+shiftPages(clickedSegment.closest('.segment-page'),1);}
+else{alert('Segment creation failed due to server error.');}}
+async function deleteSegment(segmentId){let segment;if(segmentId&&(segment=document.querySelector(`.segment[data-index='${segmentId}']`))){[...pendingEdits.keys()].filter(key=>key.startsWith(segmentId+':')).forEach(key=>pendingEdits.delete(key));pendingDeletes.add(segmentId);if(await flushEdits()){let button=segment.querySelector('.segment-delete');let tooltip=bootstrap.Tooltip.getInstance(button);if(tooltip){tooltip.dispose();}
+shiftPages(segment.closest('.segment-page'),-1);segment.remove();}
+else{alert('Segment deletion failed due to server error.');}}
+if(parseInt(segmentContainer.dataset.count,10)===0){window.location.reload();}}
+async function callApi(apiPath,data,method='GET',keepalive=false){let headers={'Content-Type':'application/json','X-Requested-With':'XMLHttpRequest',};if(method.toUpperCase()=='POST'){headers['X-CSRFToken']=document.querySelector('[name=csrfmiddlewaretoken]').value;}
+const response=await fetch(apiPath,{method:method.toUpperCase(),body:method.toUpperCase()=='GET'?null:JSON.stringify(data),headers:headers,mode:'same-origin',keepalive:keepalive,});return response;}
+function segmentTimeToSeconds(time,returnNull=true){const parts=time.split(':');let hours=0;let minutes=0;let seconds=0;let milliseconds=0;const parseSecondsAndMills=(secondsAndMills)=>{let samParts=secondsAndMills.split('.');if(samParts[0]===''){samParts[0]='0';}
+let seconds=parseInt(samParts[0],10);let milliseconds=0;if(samParts.length>1){let msString=samParts[1];if(msString.length===1){milliseconds=parseInt(msString+'00',10);}else if(msString.length===2){milliseconds=parseInt(msString+'0',10);}else{milliseconds=parseInt(msString.substring(0,3),10);}}
+return{seconds:seconds,milliseconds:milliseconds};};if(parts.length===1){const{seconds:s,milliseconds:ms}=parseSecondsAndMills(parts[0]);seconds=s;milliseconds=ms;}
+else if(parts.length===2){minutes=parseInt(parts[0],10);const{seconds:s,milliseconds:ms}=parseSecondsAndMills(parts[1]);seconds=s;milliseconds=ms;}
+else if(parts.length===3){hours=parseInt(parts[0],10);minutes=parseInt(parts[1],10);const{seconds:s,milliseconds:ms}=parseSecondsAndMills(parts[2]);seconds=s;milliseconds=ms;}
+const totalSeconds=(hours*3600)+(minutes*60)+seconds+(milliseconds/1000);if(isNaN(totalSeconds)){return returnNull?null:0;}
+return totalSeconds;}})();
\ No newline at end of file
@@ -2,46 +2,127 @@
    'use strict';
 
 
-   // Enable tooltips
-   const tooltipTriggerList = document.querySelectorAll('[data-bs-toggle="tooltip"]');
-   const tooltipList = [...tooltipTriggerList].map(tooltipTriggerEl => new bootstrap.Tooltip(tooltipTriggerEl, {trigger : 'hover'}));
+   const table = document.querySelector('#transcriptions');
+
+   if(!table) {
+      return;
+   }
+
+
+   // Statuses from the TranscriptionStatus model
+   const COMPLETED = 30;
+   const FAILED = 40;
+
+
+   // Escape text before it is added to HTML, quotes are escaped so it can be used in attributes
+   const HTML_ESCAPES = { '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;' };
+
+   function escapeHtml(text) {
+      return String(text).replace(/[&<>"']/g, character => HTML_ESCAPES[character]);
+   }
+
+
+   // Render the status icon of a process
+   function renderStatus(status) {
+      if(status && status.status === COMPLETED) {
+         return '<i class="bi bi-check-circle text-success"></i>';
+      }
+      else if(status && status.status === FAILED) {
+         return '<i class="bi bi-x-circle text-danger" data-bs-toggle="tooltip" data-bs-title="' + escapeHtml(status.error_message || '') + '"></i>';
+      }
+
+      return '<i class="bi bi-dash"></i>';
+   }
+
+
+   // Render the menu of links
+   function renderMenu(data) {
+      let resume = '';
+
+      if(data.resumable) {
+         resume = '<li><hr class="dropdown-divider"></li>' +
+            '<li><a class="dropdown-item" href="' + data.urls.resume + '">Resume</a></li>';
+      }
+
+      return '<div class="dropdown dropdown-center">' +
+         '<a role="button" data-bs-toggle="dropdown" aria-expanded="false" href="#"><i class="bi bi-three-dots-vertical"></i></a>' +
+         '<ul class="dropdown-menu">' +
+         '<li><a class="dropdown-item" href="' + data.urls.view + '">View Text</a></li>' +
+         '<li><a class="dropdown-item" href="' + data.urls.download_text_blob + '">Download TXT Blob</a></li>' +
+         '<li><a class="dropdown-item" href="' + data.urls.download_text + '">Download TXT</a></li>' +
+         '<li><a class="dropdown-item" href="' + data.urls.download_srt + '">Download SRT</a></li>' +
+         '<li><a class="dropdown-item" href="' + data.urls.download_vtt + '">Download VTT</a></li>' +
+         '<li><a class="dropdown-item" href="' + data.urls.download_json + '">Download JSON</a></li>' +
+         resume +
+         '</ul></div>';
+   }
 
 
    // Check before deleting transcription
-   const deleteButtons = document.querySelectorAll('.delete-transcription');
-   deleteButtons.forEach(button => {
-      button.addEventListener('click', event => {
-         const titleLink = event.target.closest('tr').querySelector('.title a');
-         const confirmation = confirm('Are you sure you want to delete the transcription "' + titleLink.textContent + '"?');
-         const deleteUrl = event.target.parentElement.dataset.url;
-
-         if(confirmation && deleteUrl) {
-            window.location.href = deleteUrl;
-         }
+   table.addEventListener('click', event => {
+      const button = event.target.closest('.delete-transcription');
 
-         event.stopPropagation();
-         event.preventDefault();
-      });
+      if(!button) {
+         return;
+      }
+
+      const titleLink = button.closest('tr').querySelector('.title a');
+      const confirmation = confirm('Are you sure you want to delete the transcription "' + titleLink.textContent + '"?');
+      const deleteUrl = button.dataset.url;
+
+      if(confirmation && deleteUrl) {
+         window.location.href = deleteUrl;
+      }
+
+      event.stopPropagation();
+      event.preventDefault();
    });
 
 
-   // Initialize and configure DataTables
+   // Initialize and configure DataTables, rows are loaded a page at a time
    let transcriptionsTable = new DataTable('#transcriptions', {
+      serverSide: true,
+      processing: true,
+      ajax: table.dataset.url,
       order: [[2, 'asc']],
+      searchDelay: 400,
       columns: [
-         { searchable: false, orderable: false },
-         null,
-         null,
-         { searchable: false, orderable: false },
-         { searchable: false, orderable: false },
-         { searchable: false, orderable: false },
-         { searchable: false, orderable: false },
-         { searchable: false, orderable: false }
-      ],
-      columnDefs: [{
-         targets: 2,
-         render: DataTable.render.datetime('M/DD/YYYY h:mm a')
-      }]
+         {
+            data: null,
+            className: 'expand dt-center',
+            searchable: false,
+            orderable: false,
+            render: () => '<i class="bi bi-plus" role="button"></i>'
+         },
+         {
+            data: 'title',
+            className: 'title',
+            render: (data, type, row) => '<a href="' + row.urls.edit + '">' + escapeHtml(data) + '</a>'
+         },
+         {
+            data: 'submitted',
+            render: DataTable.render.datetime('M/DD/YYYY h:mm a')
+         },
+         { data: 'statuses.0', className: 'dt-center', searchable: false, orderable: false, render: renderStatus },
+         { data: 'statuses.1', className: 'dt-center', searchable: false, orderable: false, render: renderStatus },
+         { data: 'statuses.2', className: 'dt-center', searchable: false, orderable: false, render: renderStatus },
+         { data: null, className: 'dt-center', searchable: false, orderable: false, render: renderMenu },
+         {
+            data: null,
+            className: 'dt-center',
+            searchable: false,
+            orderable: false,
+            render: (data, type, row) => '<a class="icon-link link-danger delete-transcription" href="#" data-url="' + row.urls.delete + '"><i class="bi bi-trash"></i></a>'
+         }
+      ]
+   });
+
+
+   // Enable tooltips on each page of rows
+   transcriptionsTable.on('draw', () => {
+      table.querySelectorAll('[data-bs-toggle="tooltip"]').forEach(element => {
+         bootstrap.Tooltip.getOrCreateInstance(element, {trigger : 'hover'});
+      });
    });
 
 
@@ -54,7 +135,7 @@
          row.child.hide();
       }
       else {
-         row.child(tr.querySelector('.child').innerHTML).show();
+         row.child(row.data().details).show();
       }
    });
 })();
@@ -1 +1,12 @@
-(()=>{'use strict';let a=document.querySelectorAll('[data-bs-toggle="tooltip"]'),b=[...a].map(A=>new bootstrap.Tooltip(A, {trigger:'hover'})),c=document.querySelectorAll('.delete-transcription');for(const _ of c)_.addEventListener('click',B=>{let C=B.target.closest('tr').querySelector('.title a'),_c=confirm('Are you sure you want to delete the transcription "'+C.textContent+'"?'),D=B.target.parentElement.dataset.url;(_c&&D)&&(window.location.href=D);B.stopPropagation();B.preventDefault()});let d=new DataTable('#transcriptions', {order:[[2,'asc']],columns:[{searchable:!1,orderable:!1},null,null,{searchable:!1,orderable:!1},{searchable:!1,orderable:!1},{searchable:!1,orderable:!1},{searchable:!1,orderable:!1},{searchable:!1,orderable:!1}],columnDefs:[{targets:2,render:DataTable.render.datetime('M/DD/YYYY h:mm a')}]});d.on('click','td.expand',_a=>{let _b=_a.target.closest('tr'),_C=d.row(_b);_C.child.isShown()?_C.child.hide():_C.child(_b.querySelector('.child').innerHTML).show()})})();
+(()=>{'use strict';const table=document.querySelector('#transcriptions');if(!table){return;}
+const COMPLETED=30;const FAILED=40;function escapeHtml(text){const element=document.createElement('div');element.textContent=text;return element.innerHTML;}
+function renderStatus(status){if(status&&status.status===COMPLETED){return'<i class="bi bi-check-circle text-success"></i>';}
+else if(status&&status.status===FAILED){return'<i class="bi bi-x-circle text-danger" data-bs-toggle="tooltip" data-bs-title="'+escapeHtml(status.error_message||'')+'"></i>';}
+return'<i class="bi bi-dash"></i>';}
+function renderMenu(data){let resume='';if(data.resumable){resume='<li><hr class="dropdown-divider"></li>'+'<li><a class="dropdown-item" href="'+data.urls.resume+'">Resume</a></li>';}
+return'<div class="dropdown dropdown-center">'+'<a role="button" data-bs-toggle="dropdown" aria-expanded="false" href="#"><i class="bi bi-three-dots-vertical"></i></a>'+'<ul class="dropdown-menu">'+'<li><a class="dropdown-item" href="'+data.urls.view+'">View Text</a></li>'+'<li><a class="dropdown-item" href="'+data.urls.download_text_blob+'">Download TXT Blob</a></li>'+'<li><a class="dropdown-item" href="'+data.urls.download_text+'">Download TXT</a></li>'+'<li><a class="dropdown-item" href="'+data.urls.download_srt+'">Download SRT</a></li>'+'<li><a class="dropdown-item" href="'+data.urls.download_vtt+'">Download VTT</a></li>'+'<li><a class="dropdown-item" href="'+data.urls.download_json+'">Download JSON</a></li>'+
+resume+'</ul></div>';}
+table.addEventListener('click',event=>{const button=event.target.closest('.delete-transcription');if(!button){return;}
+const titleLink=button.closest('tr').querySelector('.title a');const confirmation=confirm('Are you sure you want to delete the transcription "'+titleLink.textContent+'"?');const deleteUrl=button.dataset.url;if(confirmation&&deleteUrl){window.location.href=deleteUrl;}
+event.stopPropagation();event.preventDefault();});let transcriptionsTable=new DataTable('#transcriptions',{serverSide:true,processing:true,ajax:table.dataset.url,order:[[2,'asc']],searchDelay:400,columns:[{data:null,className:'expand dt-center',searchable:false,orderable:false,render:()=>'<i class="bi bi-plus" role="button"></i>'},{data:'title',className:'title',render:(data,type,row)=>'<a href="'+row.urls.edit+'">'+escapeHtml(data)+'</a>'},{data:'submitted',render:DataTable.render.datetime('M/DD/YYYY h:mm a')},{data:'statuses.0',className:'dt-center',searchable:false,orderable:false,render:renderStatus},{data:'statuses.1',className:'dt-center',searchable:false,orderable:false,render:renderStatus},{data:'statuses.2',className:'dt-center',searchable:false,orderable:false,render:renderStatus},{data:null,className:'dt-center',searchable:false,orderable:false,render:renderMenu},{data:null,className:'dt-center',searchable:false,orderable:false,render:(data,type,row)=>'<a class="icon-link link-danger delete-transcription" href="#" data-url="'+row.urls.delete+'"><i class="bi bi-trash"></i></a>'}]});transcriptionsTable.on('draw',()=>{table.querySelectorAll('[data-bs-toggle="tooltip"]').forEach(element=>{bootstrap.Tooltip.getOrCreateInstance(element,{trigger:'hover'});});});transcriptionsTable.on('click','td.expand',event=>{let tr=event.target.closest('tr');let row=transcriptionsTable.row(tr);if(row.child.isShown()){row.child.hide();}
+else{row.child(row.data().details).show();}});})();
\ No newline at end of file
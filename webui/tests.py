@@ -1,3 +1,1068 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
 
-# Create your tests here.
+from .audio import SAMPLE_RATE
+from .columns import Columns, SpeakerTurns, WordList
+from .intervals import assign_labels, separate_overlaps, sweep_intervals
+from .management.commands.benchmark import reference_resegment_word_list
+from .media import SegmentStream, assign_speakers, diarize_audio, diarize_separate_overlaps, find_duplicate, load_diarization_cache, process_concurrently, resegment_word_list, save_diarization_cache, transcribe_file
+from .models import *
+from .parallel import transcribe_parallel
+from .registry import ModelRegistry
+from .uploadhandlers import HashingFile
+from .utils import fail_stale_statuses, fail_task_statuses, resume_submission
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from types import ModuleType, SimpleNamespace
+from unittest import mock
+import hashlib
+import io
+import json
+import numpy as np
+import random
+import subprocess
+import tempfile
+import threading
+import time
+import zipfile
+
+
+class ModelRegistryTests(TestCase):
+   """
+   Tests the model cache kept by queue workers between tasks.
+   """
+   def loader(self, name, size):
+      return lambda: (name, size)
+
+   def test_least_recently_used_is_evicted(self):
+      registry = ModelRegistry(max_memory=10)
+      registry.get('a', self.loader('A', 4))
+      registry.get('b', self.loader('B', 4))
+      self.assertEqual(registry.get('a', self.loader('A', 4)), ('A', True))
+
+      # Over budget, b was used least recently
+      registry.get('c', self.loader('C', 4))
+      self.assertEqual(registry.stats()['models'], [['a'], ['c']])
+      self.assertEqual(registry.memory_used(), 8)
+      self.assertEqual(registry.get('b', self.loader('B', 4)), ('B', False))
+      self.assertEqual({key: registry.stats()[key] for key in ['hits', 'misses', 'evictions']}, {'hits': 1, 'misses': 4, 'evictions': 2})
+
+   def test_models_over_budget_are_not_cached(self):
+      registry = ModelRegistry(max_memory=10)
+      self.assertEqual(registry.get('a', self.loader('A', 11)), ('A', False))
+      self.assertEqual(registry.get('a', self.loader('A', 11)), ('A', False))
+      self.assertEqual(registry.memory_used(), 0)
+
+   def test_idle_models_are_evicted(self):
+      registry = ModelRegistry(max_memory=10, idle_timeout=60)
+
+      with mock.patch('webui.registry.time.monotonic', return_value=1000):
+         registry.get('a', self.loader('A', 1))
+
+      with mock.patch('webui.registry.time.monotonic', return_value=1030):
+         registry.get('b', self.loader('B', 1))
+
+      with mock.patch('webui.registry.time.monotonic', return_value=1070):
+         registry.evict_idle()
+
+      self.assertEqual(registry.stats()['models'], [['b']])
+
+   def test_loads_do_not_block_other_keys(self):
+      registry = ModelRegistry(max_memory=10)
+      registry.get('cached', self.loader('Cached', 1))
+      loading = threading.Event()
+      release = threading.Event()
+      loads = []
+
+      def slow_loader():
+         loads.append(1)
+         loading.set()
+         release.wait(5)
+         return 'Slow', 1
+
+      with ThreadPoolExecutor(3) as pool:
+         first = pool.submit(registry.get, 'slow', slow_loader)
+         loading.wait(5)
+         second = pool.submit(registry.get, 'slow', slow_loader)
+
+         # A hit on another key is answered while the load is running
+         try:
+            self.assertEqual(pool.submit(registry.get, 'cached', self.loader('Cached', 1)).result(1), ('Cached', True))
+         finally:
+            release.set()
+
+         self.assertEqual(first.result(5), ('Slow', False))
+         self.assertEqual(second.result(5), ('Slow', True))
+
+      self.assertEqual(len(loads), 1)
+
+   def test_failed_loads_are_not_cached(self):
+      registry = ModelRegistry(max_memory=10)
+
+      def failing_loader():
+         raise OSError('download failed')
+
+      with self.assertRaises(OSError):
+         registry.get('a', failing_loader)
+
+      self.assertEqual(registry.get('a', self.loader('A', 1)), ('A', False))
+
+
+class ParallelTranscriptionTests(TestCase):
+   """
+   Tests that words of chunks transcribed in parallel are stitched back together with
+   the times of the whole file.
+   """
+   class FakeModel:
+      # Transcribes any audio as one word half a second in, and the chunk length
+      def transcribe(self, audio, **options):
+         word = SimpleNamespace(start=0.5, end=len(audio) / SAMPLE_RATE, word=f' {len(audio)}', probability=0.9)
+         return [SimpleNamespace(words=[word])], None
+
+   @override_settings(PARALLEL_PROCESSES=2, WHISPER_CPU_THREADS=1)
+   def test_chunk_offsets(self):
+      chunks = [(0, 3 * SAMPLE_RATE), (3 * SAMPLE_RATE, 8 * SAMPLE_RATE), (8 * SAMPLE_RATE, 10 * SAMPLE_RATE)]
+      start_sample = SAMPLE_RATE // 2
+      stats = {}
+
+      with ThreadPoolExecutor(2) as pool, \
+         mock.patch('webui.parallel.get_pool', return_value=pool), \
+         mock.patch('webui.parallel.split_on_silence', return_value=chunks) as split, \
+         mock.patch('webui.parallel.load_audio', return_value=np.zeros(start_sample + 10 * SAMPLE_RATE, dtype=np.int16)), \
+         mock.patch('webui.parallel.get_whisper_model', return_value=(self.FakeModel(), None)):
+         words = list(transcribe_parallel('audio.wav', 'base', {}, stats, start_sample))
+
+      # Chunks are relative to the start sample and shifted by it and their own start
+      self.assertEqual(len(split.call_args.args[0]), 10 * SAMPLE_RATE)
+      self.assertEqual([(word['start'], word['end'], word['word']) for word in words], [
+         (1.0, 3.5, f' {3 * SAMPLE_RATE}'),
+         (4.0, 8.5, f' {5 * SAMPLE_RATE}'),
+         (9.0, 10.5, f' {2 * SAMPLE_RATE}'),
+      ])
+      self.assertEqual(stats['chunks'], 3)
+      self.assertIn('parallelism', stats)
+
+
+class ResumeTests(TestCase):
+   """
+   Tests that submissions whose worker stopped can be resumed from their checkpoint.
+   """
+   class FakeModel:
+      # Transcribes any audio as one word that ends with it
+      def __init__(self):
+         self.audio_lengths = []
+
+      def transcribe(self, audio, **options):
+         self.audio_lengths.append(len(audio))
+         word = SimpleNamespace(start=0.5, end=len(audio) / SAMPLE_RATE, word=' after', probability=0.9)
+         return [SimpleNamespace(words=[word])], None
+
+   def setUp(self):
+      media_root = tempfile.TemporaryDirectory()
+      self.addCleanup(media_root.cleanup)
+      settings_override = override_settings(MEDIA_ROOT=media_root.name, USE_DJANGO_Q=True)
+      settings_override.enable()
+      self.addCleanup(settings_override.disable)
+
+      # A worker that was killed while transcribing after a checkpoint at 5 s
+      self.transcription = Transcription.objects.create(title='Interrupted', meta={
+         'model': 'base', 'language': 'en', 'vad_filter': False, 'hotwords': None,
+         'max_segment_length': 42, 'max_segment_time': 7, 'checkpoint': 5.0,
+      }, word_list=[{'start': 0.0, 'end': 5.0, 'word': ' before', 'probability': 0.9, 'speaker': ''}])
+      self.transcription.upload_file.save('media.wav', ContentFile(b'media'))
+      worker = subprocess.Popen(['true'])
+      worker.wait()
+      self.status = TranscriptionStatus.objects.create(
+         transcription=self.transcription,
+         process=TranscriptionStatus.TRANSCRIBING,
+         status=TranscriptionStatus.PROCESSING,
+         start_time=timezone.now(),
+         worker=f'{get_worker_id().rpartition(":")[0]}:{worker.pid}',
+      )
+
+   def test_stale_statuses(self):
+      # Only queue workers check if other workers are running
+      self.assertEqual(fail_stale_statuses(), 0)
+      self.assertFalse(self.transcription.is_resumable())
+
+      self.status.worker = get_worker_id()
+      self.status.save()
+      self.assertEqual(fail_stale_statuses(check_workers=True), 0)
+
+      # Statuses processing for longer than the timeout are stale wherever the worker is
+      self.status.worker = 'elsewhere:1'
+      self.status.start_time = timezone.now() - timedelta(days=2)
+      self.status.save()
+      self.assertEqual(fail_stale_statuses(), 1)
+      self.assertTrue(self.transcription.is_resumable())
+
+   def test_failed_task_hook(self):
+      fail_task_statuses(SimpleNamespace(success=False, args=[self.transcription.id]))
+      self.assertTrue(self.transcription.is_resumable())
+
+   def test_resume_from_checkpoint(self):
+      self.assertEqual(fail_stale_statuses(check_workers=True), 1)
+      self.assertTrue(self.transcription.is_resumable())
+      model = self.FakeModel()
+
+      with override_settings(USE_DJANGO_Q=False), \
+         mock.patch('webui.media.get_audio'), \
+         mock.patch('webui.media.get_audio_duration', return_value=10.0), \
+         mock.patch('webui.media.load_audio', return_value=np.zeros(10 * SAMPLE_RATE, dtype=np.int16)), \
+         mock.patch('webui.media.find_duplicate', return_value=None), \
+         mock.patch('webui.media.get_device', return_value='cpu'), \
+         mock.patch('webui.media.get_whisper_model', return_value=(model, False)):
+         self.assertTrue(resume_submission(self.transcription))
+
+      # Only the audio after the checkpoint is transcribed
+      self.assertEqual(model.audio_lengths, [5 * SAMPLE_RATE])
+      transcription = Transcription.objects.with_transcript().get(pk=self.transcription.id)
+      self.assertEqual([(word['start'], word['end'], word['word']) for word in transcription.word_list], [(0.0, 5.0, ' before'), (5.5, 10.0, ' after')])
+      self.assertNotIn('checkpoint', transcription.meta)
+      self.assertEqual(list(transcription.segments.values_list('text', flat=True)), ['before', 'after'])
+      self.assertEqual(transcription.statuses.get().status, TranscriptionStatus.COMPLETED)
+
+
+class FakeDiarizationPipeline:
+   """
+   Follows the steps of pyannote's SpeakerDiarization pipeline and records which of
+   them are computed.
+   """
+   def __init__(self):
+      self.computed = []
+      self.clustered = []
+      self.runs = []
+
+   def get_segmentations(self, file, hook=None):
+      self.computed.append('segmentation')
+      return SimpleNamespace(data=np.arange(6, dtype=np.float32).reshape(1, 2, 3), sliding_window=SimpleNamespace(start=0.0, duration=10.0, step=1.0))
+
+   def get_embeddings(self, file, binary_segmentations, exclude_overlap=False, hook=None):
+      self.computed.append('embeddings')
+      return np.ones((1, 3, 4), dtype=np.float32)
+
+   def __call__(self, file, hook=None, num_speakers=None, min_speakers=None, max_speakers=None):
+      segmentations = self.get_segmentations(file, hook=hook)
+      hook('segmentation', segmentations)
+      embeddings = self.get_embeddings(file, segmentations, exclude_overlap=True, hook=hook)
+      hook('embeddings', embeddings)
+      self.clustered.append(num_speakers)
+      self.runs.append(self)
+      turns = [(SimpleNamespace(start=float(index), end=index + 1.0), None, f'SPEAKER_{index:02}') for index in range(num_speakers or 2)]
+      return SimpleNamespace(itertracks=lambda yield_label: iter(turns))
+
+
+class DiarizationCacheTests(TestCase):
+   """
+   Tests that the segmentations and speaker embeddings of a diarization are cached and
+   that re-diarizing only reruns the clustering step.
+   """
+   def setUp(self):
+      media_root = tempfile.TemporaryDirectory()
+      self.addCleanup(media_root.cleanup)
+      settings_override = override_settings(MEDIA_ROOT=media_root.name)
+      settings_override.enable()
+      self.addCleanup(settings_override.disable)
+
+      # The ML stack is not needed to replay a diarization from the cache
+      pyannote_core = ModuleType('pyannote.core')
+      pyannote_core.SlidingWindow = lambda start, duration, step: SimpleNamespace(start=start, duration=duration, step=step)
+      pyannote_core.SlidingWindowFeature = lambda data, sliding_window: SimpleNamespace(data=data, sliding_window=sliding_window)
+      torch = ModuleType('torch')
+      torch.zeros = lambda *shape: np.zeros(shape)
+      modules = mock.patch.dict('sys.modules', {'pyannote': ModuleType('pyannote'), 'pyannote.core': pyannote_core, 'torch': torch})
+      modules.start()
+      self.addCleanup(modules.stop)
+
+      self.transcription = Transcription.objects.create(title='Diarized', meta={})
+      self.status = TranscriptionStatus.objects.create(transcription=self.transcription, process=TranscriptionStatus.DIARIZING, status=TranscriptionStatus.PENDING)
+      self.pipeline = FakeDiarizationPipeline()
+
+   def diarize(self, speakers=None):
+      self.status.status = TranscriptionStatus.PENDING
+      self.status.save()
+
+      with mock.patch('webui.media.get_diarization_pipeline', return_value=(self.pipeline, True)), \
+         mock.patch('webui.media.find_duplicate', return_value=None), \
+         mock.patch('webui.media.get_device', return_value='cpu'), \
+         mock.patch('webui.media.get_audio'), \
+         mock.patch('webui.media.load_waveform'):
+         return diarize_audio(self.transcription.id, speakers)
+
+   def test_save_and_load(self):
+      segmentations = self.pipeline.get_segmentations(None)
+      embeddings = self.pipeline.get_embeddings(None, segmentations)
+      self.assertIsNone(load_diarization_cache(self.transcription))
+
+      save_diarization_cache(self.transcription, {'segmentation': segmentations, 'embeddings': embeddings})
+      loaded_segmentations, loaded_embeddings = load_diarization_cache(Transcription.objects.get(pk=self.transcription.id))
+      self.assertTrue(np.array_equal(loaded_segmentations.data, segmentations.data))
+      self.assertEqual(vars(loaded_segmentations.sliding_window), vars(segmentations.sliding_window))
+      self.assertTrue(np.array_equal(loaded_embeddings, embeddings))
+
+   def test_rediarize_only_reclusters(self):
+      result, stats = self.diarize()
+      self.assertEqual(len(result), 2)
+      self.assertFalse(stats['diarization_reclustered'])
+      self.assertEqual(self.pipeline.computed, ['segmentation', 'embeddings'])
+
+      result, stats = self.diarize({'num_speakers': 3})
+      self.assertEqual(len(result), 3)
+      self.assertTrue(stats['diarization_reclustered'])
+      self.assertEqual(self.pipeline.computed, ['segmentation', 'embeddings'])
+      self.assertEqual(self.pipeline.clustered, [None, 3])
+
+      # Reclustering runs on a copy, the shared pipeline keeps its own steps
+      self.assertIs(self.pipeline.runs[0], self.pipeline)
+      self.assertIsNot(self.pipeline.runs[1], self.pipeline)
+      self.assertNotIn('get_segmentations', vars(self.pipeline))
+      self.assertNotIn('get_embeddings', vars(self.pipeline))
+
+
+class ConcurrentProcessingTests(TestCase):
+   """
+   Tests that transcribing and diarizing at the same time joins the diarization thread
+   and fails the right statuses when either stage fails.
+   """
+   def setUp(self):
+      self.transcription = Transcription.objects.create(title='Concurrent', meta={})
+      TranscriptionStatus.objects.create(transcription=self.transcription, process=TranscriptionStatus.TRANSCRIBING, status=TranscriptionStatus.PENDING)
+      TranscriptionStatus.objects.create(transcription=self.transcription, process=TranscriptionStatus.DIARIZING, status=TranscriptionStatus.PENDING)
+      self.events = []
+      self.threads = []
+
+   def transcribe(self, transcription_id):
+      self.events.append('transcribed')
+      self.transcription.statuses.filter(process=TranscriptionStatus.TRANSCRIBING).update(status=TranscriptionStatus.COMPLETED)
+
+   def fail_transcribing(self, transcription_id):
+      raise RuntimeError('transcribing failed')
+
+   def diarize(self, transcription_id):
+      # Slow enough that it is still running when transcribing fails
+      self.threads.append(threading.current_thread())
+      time.sleep(0.1)
+      self.events.append('diarized')
+      return [{'start': 0.0, 'end': 1.0, 'speaker': 'SPEAKER_00'}], {}
+
+   def fail_diarizing(self, transcription_id):
+      self.threads.append(threading.current_thread())
+      raise RuntimeError('diarizing failed')
+
+   def process(self, transcribe, diarize):
+      fail_incomplete_statuses = Transcription.fail_incomplete_statuses
+
+      def record_failure(transcription, *args, **kwargs):
+         self.events.append('failed')
+         fail_incomplete_statuses(transcription, *args, **kwargs)
+
+      with mock.patch('webui.media.get_audio'), \
+         mock.patch('webui.media.transcribe_file', side_effect=transcribe), \
+         mock.patch('webui.media.diarize_audio_in_thread', side_effect=diarize), \
+         mock.patch('webui.media.apply_diarization', side_effect=lambda *args: self.events.append('applied')), \
+         mock.patch.object(Transcription, 'fail_incomplete_statuses', autospec=True, side_effect=record_failure):
+         process_concurrently(self.transcription)
+
+      self.assertEqual(len(self.threads), 1)
+      self.assertFalse(self.threads[0].is_alive())
+      return {status.process: status for status in self.transcription.statuses.all()}
+
+   def test_diarization_is_applied_after_transcribing(self):
+      statuses = self.process(self.transcribe, self.diarize)
+      self.assertEqual(self.events, ['transcribed', 'diarized', 'applied'])
+      self.assertEqual(statuses[TranscriptionStatus.TRANSCRIBING].status, TranscriptionStatus.COMPLETED)
+
+   def test_diarizing_fails(self):
+      statuses = self.process(self.transcribe, self.fail_diarizing)
+      self.assertEqual(self.events, ['transcribed', 'failed'])
+      self.assertEqual(statuses[TranscriptionStatus.TRANSCRIBING].status, TranscriptionStatus.COMPLETED)
+      self.assertEqual(statuses[TranscriptionStatus.DIARIZING].status, TranscriptionStatus.FAILED)
+      self.assertEqual(statuses[TranscriptionStatus.DIARIZING].error_message, 'Diarizing media failed.')
+
+   def test_transcribing_fails_while_diarizing(self):
+      statuses = self.process(self.fail_transcribing, self.diarize)
+
+      # The statuses are only failed once the diarization thread has finished
+      self.assertEqual(self.events, ['diarized', 'failed'])
+
+      for status in statuses.values():
+         self.assertEqual(status.status, TranscriptionStatus.FAILED)
+         self.assertEqual(status.error_message, 'Transcribing media failed.')
+
+
+class DeduplicationTests(TestCase):
+   """
+   Tests that resubmitted media reuses the results of an identical earlier submission.
+   """
+   OPTIONS = {'model': 'base', 'language': 'en', 'vad_filter': True, 'hotwords': None, 'max_segment_length': 42, 'max_segment_time': 7}
+   MEDIA = b'media' * 1000
+   WORD_LIST = [{'start': 0.0, 'end': 0.5, 'word': ' Hello', 'probability': 0.9, 'speaker': ''}]
+
+   def setUp(self):
+      media_root = tempfile.TemporaryDirectory()
+      self.addCleanup(media_root.cleanup)
+      settings_override = override_settings(MEDIA_ROOT=media_root.name)
+      settings_override.enable()
+      self.addCleanup(settings_override.disable)
+
+   def upload(self, **options):
+      data = {**self.OPTIONS, 'mode': 'sequential', 'upload_file': SimpleUploadedFile('audio.mp3', self.MEDIA), **options}
+      data = {key: value for key, value in data.items() if value is not None}
+
+      # The hash must come from the upload handlers, not from reading the saved file
+      with mock.patch('webui.views.run_task'), mock.patch('webui.views.get_upload_hash', side_effect=lambda file: file.content_hash):
+         self.client.post(reverse('webui:index'), data)
+
+      return Transcription.objects.latest('pk')
+
+   def transcribe(self, transcription):
+      # Transcribes any audio as one word
+      word = {'start': 0.0, 'end': 0.5, 'word': ' Fresh', 'probability': 0.8, 'speaker': ''}
+
+      with mock.patch('webui.media.get_audio', return_value='audio.wav'), \
+         mock.patch('webui.media.get_audio_duration', return_value=1.0), \
+         mock.patch('webui.media.transcribe_words', side_effect=lambda *args: iter([word])) as transcribe_words:
+         transcribe_file(transcription.id)
+
+      return Transcription.objects.with_transcript().get(pk=transcription.pk), transcribe_words.called
+
+   def add_transcription(self, content_hash='hash', **options):
+      transcription = Transcription.objects.create(title='Transcription', content_hash=content_hash, meta={**self.OPTIONS, **options})
+      TranscriptionStatus.objects.create(transcription=transcription, process=TranscriptionStatus.TRANSCRIBING, status=TranscriptionStatus.PENDING)
+      TranscriptionStatus.objects.create(transcription=transcription, process=TranscriptionStatus.DIARIZING, status=TranscriptionStatus.PENDING)
+      return transcription
+
+   def complete(self, transcription, word_list=None, diarization=None):
+      transcription.word_list = word_list
+      transcription.diarization = diarization
+      transcription.save()
+      transcription.statuses.update(status=TranscriptionStatus.COMPLETED)
+
+   def test_results_are_loaded_after_options_match(self):
+      word_list = [{'start': 0.0, 'end': 0.5, 'word': ' Hello', 'probability': 0.9, 'speaker': ''}]
+      diarization = [{'start': 0.0, 'end': 0.5, 'speaker': 'SPEAKER_00'}]
+      self.complete(self.add_transcription(model='small'), word_list, diarization)
+      self.complete(self.add_transcription(), None, None)
+      transcription = self.add_transcription()
+
+      # Candidates with other options or without results are skipped without loading blobs
+      with CaptureQueriesContext(connection) as context:
+         self.assertIsNone(find_duplicate(transcription, TranscriptionStatus.TRANSCRIBING))
+
+      for query in context.captured_queries:
+         self.assertNotIn('"word_list"', query['sql'].split(' FROM ')[0])
+
+      duplicate = find_duplicate(transcription, TranscriptionStatus.DIARIZING)
+      self.assertEqual(duplicate.meta['model'], 'small')
+      self.assertEqual(duplicate.diarization[0]['speaker'], 'SPEAKER_00')
+
+   def test_upload_handlers_hash_uploads(self):
+      # Requests up to the limit are kept in memory, larger ones are streamed to a temporary file
+      for max_memory_size in [len(self.MEDIA) * 10, len(self.MEDIA) - 1]:
+         with self.subTest(max_memory_size=max_memory_size), override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=max_memory_size):
+            transcription = self.upload()
+            self.assertEqual(transcription.content_hash, hashlib.sha256(self.MEDIA).hexdigest())
+
+   def test_hashing_file(self):
+      file = HashingFile(io.BytesIO(self.MEDIA), name='audio.mp3')
+      name = default_storage.save('audio.mp3', file)
+      self.assertEqual(file.content_hash, hashlib.sha256(self.MEDIA).hexdigest())
+
+      with default_storage.open(name) as saved_file:
+         self.assertEqual(saved_file.read(), self.MEDIA)
+
+   def test_identical_upload_reuses_words(self):
+      earlier = self.upload()
+      self.complete(earlier, self.WORD_LIST)
+      transcription, transcribed = self.transcribe(self.upload())
+
+      self.assertFalse(transcribed)
+      self.assertEqual(transcription.meta['deduplicated_from'], earlier.id)
+      self.assertEqual([word['word'] for word in transcription.word_list], [' Hello'])
+      self.assertEqual(list(transcription.segments.values_list('text', flat=True)), ['Hello'])
+      self.assertEqual(transcription.statuses.get(process=TranscriptionStatus.TRANSCRIBING).status, TranscriptionStatus.COMPLETED)
+
+   def test_changed_options_are_transcribed(self):
+      for options in [{'model': 'small'}, {'hotwords': 'WhisperScribe'}]:
+         with self.subTest(**options):
+            self.complete(self.upload(), self.WORD_LIST)
+            transcription, transcribed = self.transcribe(self.upload(**options))
+
+            self.assertTrue(transcribed)
+            self.assertNotIn('deduplicated_from', transcription.meta)
+            self.assertEqual([word['word'] for word in transcription.word_list], [' Fresh'])
+
+
+class IntervalTests(TestCase):
+   """
+   Tests the interval sweep used to separate speaker overlaps and assign speakers.
+   """
+   def assign(self, turns, words):
+      words = [{'start': start, 'end': end, 'word': ' word', 'probability': 0.5, 'speaker': ''} for start, end in words]
+      return [word['speaker'] for word in assign_speakers(words, turns)]
+
+   def test_three_way_overlap(self):
+      turns = [
+         {'start': 0.0, 'end': 10.0, 'speaker': 'A'},
+         {'start': 2.0, 'end': 8.0, 'speaker': 'B'},
+         {'start': 4.0, 'end': 6.0, 'speaker': 'C'},
+      ]
+      boundaries, coverage = sweep_intervals([0.0, 2.0, 4.0], [10.0, 8.0, 6.0], [0, 1, 2], 3)
+      self.assertEqual(boundaries.tolist(), [0.0, 2.0, 4.0, 6.0, 8.0, 10.0])
+      self.assertEqual(coverage.sum(axis=1).tolist(), [1, 2, 3, 2, 1])
+      self.assertEqual([label for label in separate_overlaps(boundaries, coverage)[2].tolist()], [0, -2, 0])
+      self.assertEqual(diarize_separate_overlaps(turns), [
+         {'speaker': 'A', 'start': 0.0, 'end': 2.0},
+         {'speaker': 'OVERLAP', 'start': 2.0, 'end': 8.0},
+         {'speaker': 'A', 'start': 8.0, 'end': 10.0},
+      ])
+      # B overlaps the word for 5 s, A and C for less
+      turns[0]['end'] = 3.0
+      self.assertEqual(self.assign(turns, [(2.5, 7.5), (4.5, 5.5)]), ['B', 'B'])
+
+   def test_word_overlapping_two_turns(self):
+      turns = [{'start': 0.0, 'end': 5.0, 'speaker': 'A'}, {'start': 5.0, 'end': 10.0, 'speaker': 'B'}]
+      self.assertEqual(self.assign(turns, [(4.0, 5.5), (4.8, 6.0), (5.0, 5.0)]), ['A', 'B', 'B'])
+
+   def test_words_outside_turns(self):
+      turns = [{'start': 2.0, 'end': 4.0, 'speaker': 'A'}, {'start': 6.0, 'end': 8.0, 'speaker': 'B'}]
+      # Before the first turn, partly before it, between turns, and after the last turn
+      self.assertEqual(self.assign(turns, [(0.0, 1.0), (1.0, 2.5), (4.5, 5.0), (9.0, 10.0)]), ['A', 'A', 'B', 'B'])
+
+   def test_no_turns(self):
+      boundaries, coverage = sweep_intervals([], [], [], 0)
+      self.assertEqual(assign_labels(boundaries, coverage, [0.0], [1.0]).tolist(), [-1])
+      self.assertEqual(self.assign([], [(0.0, 1.0)]), [''])
+
+
+# Times past 8192 s, where float32 cannot hold every millisecond
+LONG_WORDS = [
+   {'start': 18743.69, 'end': 18743.91, 'word': ' Hello', 'probability': 0.123456789, 'speaker': 'SPEAKER_00'},
+   {'start': 18743.91, 'end': 18744.3, 'word': ' wörld', 'probability': None, 'speaker': ''},
+   {'start': 10800.001, 'end': 10800.017, 'word': ' again', 'probability': 0.5, 'speaker': 'SPEAKER_01'},
+]
+LONG_TURNS = [
+   {'start': 10800.001, 'end': 18743.69, 'speaker': 'SPEAKER_00'},
+   {'start': 18743.69, 'end': 21599.999, 'speaker': 'SPEAKER_01'},
+]
+
+
+class ColumnsTests(TestCase):
+   """
+   Tests that columnar word lists and diarizations round trip exactly.
+   """
+   def test_round_trip(self):
+      for column_class, rows in [(WordList, LONG_WORDS), (SpeakerTurns, LONG_TURNS)]:
+         table = column_class.from_dicts(rows)
+         self.assertEqual(table.to_dicts(), rows)
+         self.assertEqual(column_class.from_bytes(table.to_bytes()).to_dicts(), rows)
+         self.assertEqual(table.sorted().to_dicts(), sorted(rows, key=lambda row: row['start']))
+
+   def test_fields(self):
+      transcription = Transcription.objects.create(title='Long', meta={}, word_list=LONG_WORDS, diarization=LONG_TURNS)
+      transcription = Transcription.objects.with_transcript().get(pk=transcription.pk)
+      self.assertEqual(transcription.word_list.to_dicts(), LONG_WORDS)
+      self.assertEqual(transcription.diarization.to_dicts(), LONG_TURNS)
+
+   def test_concatenate(self):
+      other_words = [{'start': 0.0, 'end': 0.25, 'word': ' ünïcode', 'probability': 0.75, 'speaker': 'SPEAKER_02'}]
+      word_lists = [WordList.from_dicts(LONG_WORDS), WordList.from_dicts([]), WordList.from_dicts(other_words)]
+      self.assertEqual(WordList.concatenate(word_lists).to_dicts(), LONG_WORDS + other_words)
+
+      # Word lists loaded from the database have not decoded their text yet
+      word_lists = [WordList.from_bytes(word_list.to_bytes()) for word_list in word_lists]
+      self.assertEqual(WordList.concatenate(word_lists).to_dicts(), LONG_WORDS + other_words)
+      self.assertEqual(len(WordList.concatenate([])), 0)
+
+   def test_columns_is_abstract(self):
+      with self.assertRaises(TypeError):
+         Columns()
+
+
+class SegmentStreamTests(TestCase):
+   """
+   Tests that streamed words are saved as segments and checkpointed while transcribing.
+   """
+   def test_words_are_saved_and_checkpointed(self):
+      transcription = Transcription.objects.create(title='Streamed', meta={})
+      words = [{'start': index * 0.5, 'end': index * 0.5 + 0.4, 'word': f' word{index}', 'probability': 0.9, 'speaker': ''} for index in range(60)]
+
+      # A resumed transcription starts with the words of its checkpoint
+      with override_settings(SEGMENT_FLUSH_INTERVAL=0, CHECKPOINT_INTERVAL=0):
+         stream = SegmentStream(transcription, 42, 7, WordList.from_dicts(words[:10]))
+
+         for word in words[10:]:
+            stream.add(word)
+
+      # Segments are saved before the final flush, the growing segment is held back
+      saved_text = ' '.join(transcription.segments.order_by('start').values_list('text', flat=True))
+      self.assertTrue(saved_text)
+      self.assertNotIn('word59', saved_text)
+
+      transcription = Transcription.objects.with_transcript().get(pk=transcription.pk)
+      self.assertEqual(transcription.word_list.to_dicts(), words)
+      self.assertEqual(transcription.meta['checkpoint'], words[-1]['end'])
+
+      stream.flush(final=True)
+      self.assertEqual(stream.word_list.to_dicts(), words)
+      self.assertEqual(' '.join(transcription.segments.order_by('start').values_list('text', flat=True)), ''.join(word['word'] for word in words).strip())
+
+
+class ColumnsMigrationTests(TransactionTestCase):
+   """
+   Tests that migration 0016 converts JSON word lists and diarizations to columns and
+   back without changing them.
+   """
+   BEFORE = [('webui', '0015_transcription_diarization_cache')]
+   AFTER = [('webui', '0016_columnar_word_list')]
+
+   def migrate(self, targets):
+      executor = MigrationExecutor(connection)
+      executor.loader.build_graph()
+      executor.migrate(targets)
+      return executor.loader.project_state(targets).apps
+
+   def tearDown(self):
+      executor = MigrationExecutor(connection)
+      executor.migrate(executor.loader.graph.leaf_nodes())
+
+   def test_to_columns_and_back(self):
+      apps = self.migrate(self.BEFORE)
+      transcription_id = apps.get_model('webui', 'Transcription').objects.create(title='Long', meta={}, word_list=LONG_WORDS, diarization=LONG_TURNS).pk
+
+      apps = self.migrate(self.AFTER)
+      transcription = apps.get_model('webui', 'Transcription').objects.get(pk=transcription_id)
+      self.assertEqual(transcription.word_list.to_dicts(), LONG_WORDS)
+      self.assertEqual(transcription.diarization.to_dicts(), LONG_TURNS)
+
+      apps = self.migrate(self.BEFORE)
+      transcription = apps.get_model('webui', 'Transcription').objects.get(pk=transcription_id)
+      self.assertEqual(transcription.word_list, LONG_WORDS)
+      self.assertEqual(transcription.diarization, LONG_TURNS)
+
+
+class ResegmentTests(TestCase):
+   """
+   Tests that the vectorized resegmenting makes exactly the same segments as the
+   implementation it replaced.
+   """
+   def make_words(self, rng, count):
+      # Words on Whisper's 10 ms grid up to 30,000 s in. Some overlap the previous word
+      # so ends are not sorted, and word lengths and times often land exactly on limits.
+      current = round(rng.uniform(0, 30_000), 2)
+      speaker = ''
+      words = []
+
+      for _ in range(count):
+         start = round(current - rng.choice([0, 0, 0, 0.5, 2]), 2) if words else current
+         end = round(start + rng.choice([0.01, 0.5, 1, 3.5, 7, rng.uniform(0, 8)]), 2)
+         speaker = rng.choice(['', 'SPEAKER_00', 'SPEAKER_01']) if rng.random() < 0.1 else speaker
+         words.append({'start': start, 'end': end, 'word': ' ' + rng.choice(['a', 'ab', 'wörd', 'x' * 10, 'y' * 41]), 'probability': rng.random(), 'speaker': speaker})
+         current = round(max(current, end) + rng.choice([0, 0.01, 0.2]), 2)
+
+      return words
+
+   def test_matches_reference(self):
+      rng = random.Random(0)
+
+      for trial in range(300):
+         words = self.make_words(rng, rng.randint(1, 200))
+         max_characters = rng.choice([1, 2, 11, 42, 100])
+         max_time = rng.choice([0.5, 1, 3.5, 7, 7.01, 20])
+         expected = reference_resegment_word_list([dict(word) for word in words], max_characters, max_time)
+
+         with self.subTest(trial=trial):
+            self.assertEqual(resegment_word_list([dict(word) for word in words], max_characters, max_time), expected)
+            self.assertEqual(resegment_word_list(WordList.from_dicts(words), max_characters, max_time), expected)
+
+
+class StatusSummaryTests(TestCase):
+   """
+   Tests that the index and list pages summarize statuses in a constant number of
+   queries and agree with Transcription.current_status.
+   """
+   # Each case is a list of (process, status, started) for one transcription
+   CASES = [
+      [(TranscriptionStatus.TRANSCRIBING, TranscriptionStatus.PENDING, False)],
+      [(TranscriptionStatus.DOWNLOADING, TranscriptionStatus.COMPLETED, True), (TranscriptionStatus.TRANSCRIBING, TranscriptionStatus.PROCESSING, True), (TranscriptionStatus.DIARIZING, TranscriptionStatus.PENDING, False)],
+      [(TranscriptionStatus.TRANSCRIBING, TranscriptionStatus.PROCESSING, True), (TranscriptionStatus.DIARIZING, TranscriptionStatus.FAILED, False)],
+      [(TranscriptionStatus.TRANSCRIBING, TranscriptionStatus.COMPLETED, True), (TranscriptionStatus.DIARIZING, TranscriptionStatus.COMPLETED, True)],
+      [(TranscriptionStatus.TRANSCRIBING, TranscriptionStatus.FAILED, True), (TranscriptionStatus.DIARIZING, TranscriptionStatus.PENDING, False)],
+      [(TranscriptionStatus.TRANSCRIBING, TranscriptionStatus.FAILED, False)],
+      [],
+   ]
+
+   def create_transcriptions(self, count):
+      start_time = timezone.now()
+
+      for index in range(count):
+         transcription = Transcription.objects.create(title=f'Transcription {index}', meta={})
+
+         for process, status, started in self.CASES[index % len(self.CASES)]:
+            start_time += timedelta(minutes=1)
+            TranscriptionStatus.objects.create(transcription=transcription, process=process, status=status, start_time=start_time if started else None)
+
+   def count_queries(self, url):
+      # The first request fills caches, such as the README version, that may be stored
+      # in the database
+      self.client.get(url, {'length': -1}, headers={'X-Requested-With': 'XMLHttpRequest'})
+
+      with CaptureQueriesContext(connection) as context:
+         response = self.client.get(url, {'length': -1}, headers={'X-Requested-With': 'XMLHttpRequest'})
+
+      self.assertEqual(response.status_code, 200)
+      return len(context.captured_queries)
+
+   def test_index_queries_are_constant(self):
+      self.create_transcriptions(len(self.CASES))
+      expected = self.count_queries(reverse('webui:index'))
+      self.create_transcriptions(len(self.CASES) * 5)
+
+      self.assertEqual(self.count_queries(reverse('webui:index')), expected)
+
+   def test_list_queries_are_constant(self):
+      self.create_transcriptions(len(self.CASES))
+      expected = self.count_queries(reverse('webui:api_transcriptions'))
+      self.create_transcriptions(len(self.CASES) * 5)
+      self.assertEqual(self.count_queries(reverse('webui:api_transcriptions')), expected)
+
+   def test_filters_match_current_status(self):
+      self.create_transcriptions(len(self.CASES))
+      in_progress = set(Transcription.objects.in_progress().values_list('id', flat=True))
+      finished = set(Transcription.objects.finished().values_list('id', flat=True))
+
+      for transcription in Transcription.objects.all():
+         status = transcription.current_status()
+         expected = status is not None and status.status in [TranscriptionStatus.PENDING, TranscriptionStatus.PROCESSING]
+         self.assertEqual(transcription.id in in_progress, expected)
+         self.assertEqual(transcription.id in finished, not expected)
+
+   def test_prefetched_current_status(self):
+      self.create_transcriptions(len(self.CASES))
+      expected = [transcription.current_status() for transcription in Transcription.objects.order_by('id')]
+      transcriptions = list(Transcription.objects.with_statuses().order_by('id'))
+
+      with self.assertNumQueries(0):
+         self.assertEqual([transcription.current_status() for transcription in transcriptions], expected)
+
+
+class DeferredTranscriptTests(TestCase):
+   """
+   Tests that listing transcriptions does not load their word lists and diarizations.
+   """
+   def setUp(self):
+      transcription = Transcription.objects.create(title='Transcription', meta={})
+      transcription.word_list = [{'start': 0.0, 'end': 0.5, 'word': ' Hello', 'probability': 0.9, 'speaker': ''}]
+      transcription.diarization = [{'start': 0.0, 'end': 0.5, 'speaker': 'SPEAKER_00'}]
+      transcription.save()
+      TranscriptionStatus.objects.create(transcription=transcription, process=TranscriptionStatus.TRANSCRIBING, status=TranscriptionStatus.COMPLETED)
+
+   def test_pages_do_not_select_blobs(self):
+      for url in [reverse('webui:index'), reverse('webui:list'), reverse('webui:api_transcriptions')]:
+         with CaptureQueriesContext(connection) as context:
+            self.client.get(url, headers={'X-Requested-With': 'XMLHttpRequest'})
+
+         for query in context.captured_queries:
+            self.assertNotIn('"word_list"', query['sql'])
+            self.assertNotIn('"diarization"', query['sql'])
+
+   @override_settings(HUGGING_FACE_TOKEN='token')
+   def test_edit_page_does_not_select_blobs(self):
+      transcription = Transcription.objects.get()
+      Transcription.objects.filter(pk=transcription.pk).update(upload_file='uploads/audio.mp3')
+
+      with CaptureQueriesContext(connection) as context:
+         response = self.client.get(reverse('webui:edit', args=[transcription.pk]))
+
+      self.assertTrue(response.context['properties']['diarizable'])
+
+      for query in context.captured_queries:
+         columns = query['sql'].split(' FROM ')[0]
+         self.assertNotIn('"word_list"', columns)
+         self.assertNotIn('"diarization"', columns)
+
+      Transcription.objects.filter(pk=transcription.pk).update(word_list=None)
+      response = self.client.get(reverse('webui:edit', args=[transcription.pk]))
+      self.assertFalse(response.context['properties']['diarizable'])
+
+   def test_deferred_fields_load_on_access(self):
+      transcription = Transcription.objects.get()
+      self.assertEqual(transcription.get_deferred_fields(), {'word_list', 'diarization'})
+      self.assertEqual(transcription.word_list[0]['word'], ' Hello')
+
+      with self.assertNumQueries(1):
+         transcription = Transcription.objects.with_transcript().get()
+         self.assertEqual(transcription.diarization[0]['speaker'], 'SPEAKER_00')
+
+
+class TranscriptionListApiTests(TestCase):
+   """
+   Tests the DataTables server-side processing endpoint of the transcriptions page.
+   """
+   def setUp(self):
+      for index in range(12):
+         transcription = Transcription.objects.create(title=f'Transcription {index:02}', notes='needle' if index % 3 == 0 else '', meta={})
+         TranscriptionStatus.objects.create(transcription=transcription, process=TranscriptionStatus.TRANSCRIBING, status=TranscriptionStatus.COMPLETED)
+
+      # In progress transcriptions are not listed
+      transcription = Transcription.objects.create(title='Transcription in progress', meta={})
+      TranscriptionStatus.objects.create(transcription=transcription, process=TranscriptionStatus.TRANSCRIBING, status=TranscriptionStatus.PROCESSING)
+
+   def get(self, **parameters):
+      response = self.client.get(reverse('webui:api_transcriptions'), {'draw': 3, **parameters}, headers={'X-Requested-With': 'XMLHttpRequest'})
+      self.assertEqual(response.status_code, 200)
+      return response.json()
+
+   def test_paging_and_ordering(self):
+      data = self.get(start=5, length=5, **{'order[0][column]': 1, 'order[0][dir]': 'desc'})
+      self.assertEqual(data['draw'], 3)
+      self.assertEqual(data['recordsTotal'], 12)
+      self.assertEqual(data['recordsFiltered'], 12)
+      self.assertEqual([row['title'] for row in data['data']], [f'Transcription {index:02}' for index in range(6, 1, -1)])
+
+   def test_search(self):
+      data = self.get(length=10, **{'search[value]': 'needle'})
+      self.assertEqual(data['recordsTotal'], 12)
+      self.assertEqual(data['recordsFiltered'], 4)
+      self.assertEqual(len(data['data']), 4)
+
+   def test_length_is_capped(self):
+      transcriptions = Transcription.objects.bulk_create([Transcription(title=f'More {index}', meta={}) for index in range(100)])
+      TranscriptionStatus.objects.bulk_create([TranscriptionStatus(transcription=transcription, process=TranscriptionStatus.TRANSCRIBING, status=TranscriptionStatus.COMPLETED) for transcription in transcriptions])
+
+      for length in [-1, 1000]:
+         data = self.get(length=length)
+         self.assertEqual(data['recordsTotal'], 112)
+         self.assertEqual(len(data['data']), 100)
+
+   def test_requires_ajax_header(self):
+      response = self.client.get(reverse('webui:api_transcriptions'))
+      self.assertEqual(response.status_code, 400)
+
+
+class SegmentPageApiTests(TestCase):
+   """
+   Tests the paginated segments endpoint of the edit page.
+   """
+   def setUp(self):
+      self.transcription = Transcription.objects.create(title='Transcription', meta={})
+      Segment.objects.bulk_create([Segment(transcription=self.transcription, start=index * 2.0, end=index * 2.0 + 1.5, text=f'Segment {index}') for index in range(25)])
+
+   def get(self, **parameters):
+      url = reverse('webui:api_transcriptions_segments', args=[self.transcription.id])
+      response = self.client.get(url, parameters, headers={'X-Requested-With': 'XMLHttpRequest'})
+      self.assertEqual(response.status_code, 200)
+      return response.json()
+
+   def test_offset(self):
+      data = self.get(offset=20, limit=10)
+      self.assertEqual(data['offset'], 20)
+      self.assertEqual(data['total'], 25)
+      self.assertEqual(len(data['segments']), 5)
+      self.assertIn('Segment 20', data['segments'][0])
+
+   def test_time_finds_aligned_page(self):
+      data = self.get(time=31.0, limit=10)
+      self.assertEqual(data['offset'], 10)
+      self.assertIn('Segment 10', data['segments'][0])
+
+   def test_missing_transcription(self):
+      url = reverse('webui:api_transcriptions_segments', args=[self.transcription.id + 1])
+      response = self.client.get(url, headers={'X-Requested-With': 'XMLHttpRequest'})
+      self.assertEqual(response.status_code, 404)
+
+
+class SegmentBatchApiTests(TestCase):
+   """
+   Tests the batch segment edit endpoint.
+   """
+   def setUp(self):
+      self.transcription = Transcription.objects.create(title='Transcription', meta={})
+      self.segments = Segment.objects.bulk_create([Segment(transcription=self.transcription, start=index, end=index + 0.5, text=f'Segment {index}') for index in range(3)])
+
+   def post(self, data):
+      return self.client.post(reverse('webui:api_segments_batch'), data, content_type='application/json', headers={'X-Requested-With': 'XMLHttpRequest'})
+
+   def test_batch_is_applied_in_one_transaction(self):
+      first, second, third = self.segments
+      data = {
+         'updates': [
+            {'id': first.id, 'field': 'speaker', 'value': 'A'},
+            {'id': first.id, 'field': 'speaker', 'value': 'B'},
+            {'id': second.id, 'field': 'start', 'value': '1.25'},
+            {'id': third.id, 'field': 'text', 'value': 'Deleted anyway'},
+         ],
+         'deletes': [third.id],
+         'creates': [{'transcription': self.transcription.id, 'start': start, 'end': start + 1, 'text': 'New'} for start in range(5, 10)],
+      }
+
+      # The number of queries does not depend on the number of segments
+      with self.assertNumQueries(8):
+         response = self.post(data)
+
+      self.assertEqual(response.status_code, 200)
+      self.assertEqual(response.json()['updated'], 2)
+      self.assertEqual(len(response.json()['created']), 5)
+      self.assertEqual(Segment.objects.get(pk=first.id).speaker, 'B')
+      self.assertEqual(Segment.objects.get(pk=second.id).start, 1.25)
+      self.assertFalse(Segment.objects.filter(pk=third.id).exists())
+      self.assertTrue(Segment.objects.filter(text='New').exists())
+
+   def test_invalid_batch_saves_nothing(self):
+      first, second, third = self.segments
+      response = self.post({'updates': [{'id': first.id, 'field': 'speaker', 'value': 'A'}, {'id': second.id, 'field': 'end', 'value': 'soon'}]})
+      self.assertEqual(response.status_code, 400)
+      self.assertEqual(Segment.objects.get(pk=first.id).speaker, '')
+
+      response = self.post({'updates': [{'id': first.id, 'field': 'speaker', 'value': 'A'}], 'deletes': [third.id + 100]})
+      self.assertEqual(response.status_code, 404)
+      self.assertEqual(response.json()['missing'], [third.id + 100])
+      self.assertEqual(Segment.objects.get(pk=first.id).speaker, '')
+
+      response = self.post({'creates': [{'transcription': self.transcription.id, 'text': 'New'}, {'transcription': self.transcription.id + 100, 'text': 'New'}]})
+      self.assertEqual(response.status_code, 400)
+      self.assertFalse(Segment.objects.filter(text='New').exists())
+
+
+class ExportTests(TestCase):
+   """
+   Tests the streamed transcript exports.
+   """
+   def setUp(self):
+      cache.clear()
+      self.transcription = Transcription.objects.create(title='Test export', meta={})
+      Segment.objects.bulk_create([
+         Segment(transcription=self.transcription, start=0.0, end=1.5, text='Hello', speaker='ANN'),
+         Segment(transcription=self.transcription, start=3661.25, end=3662.0, text='there', speaker=''),
+         Segment(transcription=self.transcription, start=3663.0, end=3664.0, text='', speaker=''),
+      ])
+
+   def download(self, name):
+      response = self.client.get(reverse(f'webui:{name}', args=[self.transcription.id]))
+      return b''.join(response.streaming_content).decode() if response.streaming else response.content.decode()
+
+   def test_text(self):
+      self.assertEqual(self.download('download_text'), 'ANN:\tHello\n\nthere\n')
+      self.assertEqual(self.download('download_text_blob'), 'Hello there')
+
+   def test_subtitles(self):
+      self.assertEqual(self.download('download_srt').split('\n\n')[:2], ['1\n00:00:00,000 --> 00:00:01,500\nANN: Hello', '2\n01:01:01,250 --> 01:01:02,000\nthere'])
+      self.assertTrue(self.download('download_vtt').startswith('WEBVTT\n\n00:00.000 --> 00:01.500\nANN: Hello\n\n01:01:01.250'))
+
+   def test_json(self):
+      segments = json.loads(self.download('download_json'))
+      self.assertEqual([segment['text'] for segment in segments], ['Hello', 'there', ''])
+      self.assertEqual(set(segments[0]), {'id', 'transcription_id', 'start', 'end', 'text', 'speaker', 'probability'})
+
+
+class ExportCacheTests(TestCase):
+   """
+   Tests conditional GET requests and caching of exports.
+   """
+   def setUp(self):
+      cache.clear()
+      self.transcription = Transcription.objects.create(title='Test export', meta={})
+      self.segment = Segment.objects.create(transcription=self.transcription, start=0.0, end=1.5, text='Hello')
+      self.url = reverse('webui:download_vtt', args=[self.transcription.id])
+
+   def get(self, **headers):
+      response = self.client.get(self.url, headers=headers)
+      content = b''.join(response.streaming_content) if response.streaming else response.content
+      return response, content.decode()
+
+   def test_not_modified(self):
+      response, content = self.get()
+      self.assertEqual(response.status_code, 200)
+      self.assertIn('Last-Modified', response)
+
+      response, content = self.get(if_none_match=response['ETag'])
+      self.assertEqual(response.status_code, 304)
+      self.assertEqual(content, '')
+
+   def test_cached_until_edited(self):
+      first, content = self.get()
+
+      # The export version and the transcription are read once each, no segments. The
+      # cache may be stored in the database, so its queries are not counted.
+      with CaptureQueriesContext(connection) as context:
+         response, cached = self.get()
+
+      self.assertEqual(cached, content)
+      tables = [query['sql'] for query in context.captured_queries if 'webui_' in query['sql']]
+      self.assertEqual(len(tables), 2)
+      self.assertFalse(any('webui_segment' in sql for sql in tables))
+      response = self.client.post(reverse('webui:api_segments_id', args=[self.segment.id]), {'field': 'text', 'value': 'Goodbye'}, content_type='application/json', headers={'X-Requested-With': 'XMLHttpRequest'})
+      self.assertEqual(response.status_code, 200)
+
+      response, content = self.get(if_none_match=first['ETag'])
+      self.assertEqual(response.status_code, 200)
+      self.assertNotEqual(response['ETag'], first['ETag'])
+      self.assertIn('Goodbye', content)
+
+
+class BulkExportTests(TestCase):
+   """
+   Tests the streamed ZIP archive of several transcriptions' exports.
+   """
+   def setUp(self):
+      self.transcriptions = []
+
+      for index in range(3):
+         transcription = Transcription.objects.create(title=f'Interview {index}', notes='needle' if index else '', meta={})
+         TranscriptionStatus.objects.create(transcription=transcription, process=TranscriptionStatus.TRANSCRIBING, status=TranscriptionStatus.COMPLETED)
+         Segment.objects.create(transcription=transcription, start=0.0, end=1.5, text=f'Hello {index}', speaker='ANN')
+         self.transcriptions.append(transcription)
+
+      # In progress transcriptions are not exported
+      transcription = Transcription.objects.create(title='In progress', meta={})
+      TranscriptionStatus.objects.create(transcription=transcription, process=TranscriptionStatus.TRANSCRIBING, status=TranscriptionStatus.PROCESSING)
+
+   def download(self, **parameters):
+      response = self.client.get(reverse('webui:download_zip'), parameters)
+      self.assertEqual(response.status_code, 200)
+      self.assertTrue(response.streaming)
+      return zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+
+   def test_matches_single_exports(self):
+      archive = self.download(after='2000-01-01', format=['srt', 'text'])
+      self.assertIsNone(archive.testzip())
+      self.assertEqual(archive.namelist(), [f'{export_format}/{transcription.id}_Interview_{index}.{extension}' for index, transcription in enumerate(self.transcriptions) for export_format, extension in [('srt', 'srt'), ('text', 'txt')]])
+
+      for transcription in self.transcriptions:
+         response = self.client.get(reverse('webui:download_srt', args=[transcription.id]))
+         self.assertEqual(archive.read(f'srt/{transcription.id}_{transcription.title.replace(" ", "_")}.srt'), b''.join(response.streaming_content))
+
+   def test_filters(self):
+      self.assertEqual(len(self.download(id=[self.transcriptions[0].id], format='vtt').namelist()), 1)
+      self.assertEqual(len(self.download(search='needle', format='json').namelist()), 2)
+
+   def test_invalid_format(self):
+      response = self.client.get(reverse('webui:download_zip'), {'search': 'needle', 'format': 'doc'})
+      self.assertEqual(response.status_code, 400)
+
+   def test_selection_is_required_and_limited(self):
+      response = self.client.get(reverse('webui:download_zip'), {'format': 'srt'})
+      self.assertEqual(response.status_code, 400)
+
+      with override_settings(BULK_EXPORT_MAX_TRANSCRIPTIONS=2):
+         response = self.client.get(reverse('webui:download_zip'), {'after': '2000-01-01'})
+         self.assertEqual(response.status_code, 400)
+         self.assertEqual(len(self.download(search='needle').namelist()), 4)
+
+   def test_command(self):
+      output = io.BytesIO()
+
+      with mock.patch('sys.stdout', mock.Mock(buffer=output)):
+         call_command('export_transcriptions', '-', '--formats', 'vtt')
+
+      self.assertEqual(len(zipfile.ZipFile(output).namelist()), 3)
@@ -0,0 +1,85 @@
+from django.core.files import File
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+import hashlib
+
+
+class HashingUploadHandlerMixin:
+   """
+   Calculates the SHA-256 hash of an uploaded file while it is being received. The hash
+   is saved to the content_hash attribute of the uploaded file.
+   """
+   def new_file(self, *args, **kwargs):
+      # Created first because the memory handler stops later handlers by raising here
+      self.hasher = hashlib.sha256()
+      super().new_file(*args, **kwargs)
+
+   def receive_data_chunk(self, raw_data, start):
+      # The memory handler passes chunks on to the next handler when it is not activated
+      if getattr(self, 'activated', True):
+         self.hasher.update(raw_data)
+
+      return super().receive_data_chunk(raw_data, start)
+
+   def file_complete(self, file_size):
+      file = super().file_complete(file_size)
+
+      if file is not None:
+         file.content_hash = self.hasher.hexdigest()
+
+      return file
+
+
+class HashingMemoryFileUploadHandler(HashingUploadHandlerMixin, MemoryFileUploadHandler):
+   """
+   Memory file upload handler that hashes uploads while they are received.
+   """
+   pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadHandlerMixin, TemporaryFileUploadHandler):
+   """
+   Temporary file upload handler that hashes uploads while they are streamed to disk.
+   """
+   pass
+
+
+class HashingFile(File):
+   """
+   A file that calculates the SHA-256 hash of its contents while it is read in chunks,
+   e.g. while storage saves it.
+   """
+   def __init__(self, *args, **kwargs):
+      super().__init__(*args, **kwargs)
+      self.hasher = hashlib.sha256()
+
+   def chunks(self, chunk_size=None):
+      for chunk in super().chunks(chunk_size):
+         self.hasher.update(chunk)
+         yield chunk
+
+   @property
+   def content_hash(self):
+      return self.hasher.hexdigest()
+
+
+def get_upload_hash(file):
+   """
+   Returns the SHA-256 hash of an uploaded file. Uses the hash calculated by the upload
+   handlers if available, otherwise reads the file.
+
+   Args:
+      file (UploadedFile): The uploaded file.
+
+   Returns:
+      str: The hex digest of the file.
+   """
+   if getattr(file, 'content_hash', None):
+      return file.content_hash
+
+   hasher = hashlib.sha256()
+
+   for chunk in file.chunks():
+      hasher.update(chunk)
+
+   return hasher.hexdigest()
@@ -17,14 +17,20 @@ urlpatterns = [
    path('edit/<int:transcription_id>', views.edit_transcription, name='edit'),
    path('delete/<int:transcription_id>', views.delete_transcription, name='delete'),
    path('cancel/<int:transcription_id>', views.cancel_transcription, name='cancel'),
+   path('resume/<int:transcription_id>', views.resume_transcription, name='resume'),
+   path('rediarize/<int:transcription_id>', views.rediarize_transcription, name='rediarize'),
    # Download routes
    path('download/text/<int:transcription_id>', downloads.download_text, name='download_text'),
    path('download/text_blob/<int:transcription_id>', downloads.download_text_blob, name='download_text_blob'),
    path('download/srt/<int:transcription_id>', downloads.download_srt, name='download_srt'),
    path('download/vtt/<int:transcription_id>', downloads.download_vtt, name='download_vtt'),
    path('download/json/<int:transcription_id>', downloads.download_json, name='download_json'),
+   path('download/zip', downloads.download_zip, name='download_zip'),
    # API routes
+   path('api/transcriptions/', api.api_transcriptions, name='api_transcriptions'),
+   path('api/transcriptions/<int:transcription_id>/segments', api.api_transcriptions_segments, name='api_transcriptions_segments'),
    path('api/transcriptions/<int:transcription_id>', api.api_transcriptions_id, name='api_transcriptions_id'),
+   path('api/segments/batch', api.api_segments_batch, name='api_segments_batch'),
    path('api/segments/<int:segment_id>', api.api_segments_id, name='api_segments_id'),
    path('api/segments/', api.api_segments, name='api_segments'),
 ]
@@ -1,9 +1,12 @@
 from django.conf import settings
 from django.core.cache import cache
+from django.utils import timezone
 
-from pathlib import Path
-import subprocess
-import uuid
+from .models import Transcription, TranscriptionStatus, get_worker_id
+
+from django_q.tasks import async_task
+from datetime import timedelta
+import os
 
 
 def is_float(number):
@@ -91,78 +94,147 @@ def format_seconds(seconds, always_include_hours = False, decimal_marker = '.',
    return total
 
 
-def get_file_duration(file):
+# Lookup tables of zero padded minutes and seconds within an hour, and of milliseconds
+_MINUTES_SECONDS = [f'{minutes:02d}:{seconds:02d}' for minutes in range(60) for seconds in range(60)]
+_MILLISECONDS = [f'{milliseconds:03d}' for milliseconds in range(1_000)]
+
+
+def format_timestamp(seconds, always_include_hours=False, decimal_marker='.'):
    """
-   Gets the duration of a media file using ffprobe.
+   Formats a number of seconds into a subtitle timestamp (e.g., HH:MM:SS.mmm). Gives the
+   same result as format_seconds with milliseconds, using lookup tables so exports can
+   format every segment quickly.
 
    Args:
-      file (str|Path): The path to the media file.
+      seconds (float): The number of seconds to format.
+      always_include_hours (bool): If True, always includes the hours part even if it's 0.
+      decimal_marker (str): The character to use for the decimal point.
 
    Returns:
-      float: The duration of the file in seconds.
-
-   Raises:
-      Exception: If ffprobe fails to get the duration.
+      str: The formatted time string.
    """
-   if not file: return None
+   seconds, milliseconds = divmod(round(seconds * 1000.0), 1_000)
+   hours, seconds = divmod(seconds, 3_600)
+
+   if always_include_hours or hours > 0:
+      return f'{hours:02d}:{_MINUTES_SECONDS[seconds]}{decimal_marker}{_MILLISECONDS[milliseconds]}'
+
+   return f'{_MINUTES_SECONDS[seconds]}{decimal_marker}{_MILLISECONDS[milliseconds]}'
 
-   cmd = [
-      'ffprobe',
-      '-v',
-      'error',
-      '-show_entries',
-      'format=duration',
-      '-of',
-      'default=noprint_wrappers=1:nokey=1',
-      file,
-   ]
 
-   result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+def run_task(task, *args):
+   """
+   Runs a task from webui.media in the Django Q worker, or directly if Django Q is
+   disabled. Tasks are referenced by path so the web process never imports the ML stack.
 
-   if result.returncode == 0:
-      return float(result.stdout)
+   Args:
+      task (str): The name of the function in webui.media to run.
+      *args: The arguments passed to the task.
+   """
+   if settings.USE_DJANGO_Q:
+      async_task(f'webui.media.{task}', *args, hook='webui.utils.fail_task_statuses')
    else:
-      raise Exception(f'Error getting file duration: {result.stderr}')
+      from . import media
+      getattr(media, task)(*args)
 
 
-def extract_audio_to_wav(input_file):
+def fail_task_statuses(task):
    """
-   This function uses ffmpeg to convert a media file to a WAV format and saves it to a
-   temporary directory.
+   A Django Q hook that fails the incomplete statuses of a task's transcription if the
+   task raised an error, so it can be resumed.
 
    Args:
-      input_file (str|Path): The path to the input media file.
+      task (Task): The finished task. Its first argument is the transcription ID.
+   """
+   if task.success or not task.args: return
 
-   Returns:
-      Path: The path to the newly created WAV file, or None if an error occurred.
+   transcription = Transcription.objects.filter(pk=task.args[0]).first()
+
+   if transcription:
+      transcription.fail_incomplete_statuses('Processing stopped with an error.')
+
+
+def is_process_alive(pid):
    """
-   if not input_file: return None
+   Checks if a process with the given ID is running on this host.
 
-   temp_dir = Path(settings.MEDIA_ROOT).joinpath('temp')
+   Args:
+      pid (int): The process ID.
 
+   Returns:
+      bool: True if the process is running.
+   """
    try:
-      temp_dir.mkdir(exist_ok=True)
-   except Exception as e:
-      print(f'Error creating temporary directory: {e}')
-      return None
+      os.kill(pid, 0)
+   except ProcessLookupError:
+      return False
+   except PermissionError:
+      pass
 
-   try:
-      random_filename = str(uuid.uuid4()) + '.wav'
-      output_file = temp_dir.joinpath(random_filename)
-
-      cmd = [
-         'ffmpeg',
-         '-i', input_file,
-         '-acodec', 'pcm_s16le',
-         '-ac', '1',
-         output_file
-      ]
-
-      subprocess.run(cmd, stderr=subprocess.PIPE, check=True)
-      return output_file
-   except subprocess.CalledProcessError as e:
-      print(f'FFmpeg error: {e.stderr.decode()}')
-      return None
-   except Exception as e:
-      print(f'Error: {e}')
-      return None
+   return True
+
+
+def fail_stale_statuses(check_workers=False):
+   """
+   Fails the processing statuses of submissions whose queue worker stopped without
+   finishing them, for example when it was killed by the Q_CLUSTER timeout or ran out
+   of memory. Django Q does not run hooks for those tasks, so their statuses would stay
+   processing forever and could not be resumed.
+
+   A status is stale once it has been processing for longer than the Q_CLUSTER timeout.
+   With check_workers, statuses of workers on this host that are no longer running are
+   also stale. Only queue workers should check workers, as other processes may not see
+   the workers' process IDs.
+
+   Args:
+      check_workers (bool): Whether to check if the workers on this host are running.
+
+   Returns:
+      int: The number of transcriptions that were failed.
+   """
+   if not settings.USE_DJANGO_Q: return 0
+
+   timeout = settings.Q_CLUSTER.get('timeout')
+   statuses = TranscriptionStatus.objects.filter(status=TranscriptionStatus.PROCESSING)
+   host = get_worker_id().rpartition(':')[0]
+   stale = set()
+
+   for status in statuses.only('transcription_id', 'start_time', 'worker'):
+      worker_host, _, pid = (status.worker or '').rpartition(':')
+
+      if timeout and status.start_time and status.start_time < timezone.now() - timedelta(seconds=timeout):
+         stale.add(status.transcription_id)
+      elif check_workers and worker_host == host and pid.isdigit() and not is_process_alive(int(pid)):
+         stale.add(status.transcription_id)
+
+   for transcription in Transcription.objects.filter(pk__in=stale):
+      transcription.fail_incomplete_statuses('The worker stopped before processing finished.')
+
+   return len(stale)
+
+
+def resume_submission(transcription):
+   """
+   Resumes a failed or cancelled submission. Failed statuses are set back to pending
+   and the submission is queued again. Completed processes are skipped and an
+   interrupted transcription continues from its last checkpoint.
+
+   Args:
+      transcription (Transcription): The transcription to resume.
+
+   Returns:
+      bool: True if the submission was queued, False if it was not resumable.
+   """
+   if not transcription.is_resumable():
+      return False
+
+   # Submissions made before the upload URL was saved used it as the title until downloaded
+   upload_url = transcription.meta.get('upload_url')
+
+   if not upload_url and transcription.statuses.filter(process=TranscriptionStatus.DOWNLOADING).exists():
+      upload_url = transcription.title
+
+   diarize = transcription.statuses.filter(process=TranscriptionStatus.DIARIZING).exists()
+   transcription.reset_failed_statuses()
+   run_task('process_submission', transcription.id, upload_url, diarize)
+   return True
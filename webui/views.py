@@ -2,13 +2,16 @@ from django.shortcuts import render, get_object_or_404
 from django.http import HttpResponseRedirect
 from django.urls import reverse
 from django.conf import settings
+from django.contrib import messages
+from django.db import transaction
 
 from .forms import *
 from .models import *
-from .media import *
+from .uploadhandlers import get_upload_hash
+from .utils import fail_stale_statuses, run_task, resume_submission
 
+from pathlib import Path
 import mimetypes
-from django_q.tasks import async_task
 
 
 def index(request):
@@ -17,10 +20,12 @@ def index(request):
    current transcription statuses. Handles form submissions for new transcriptions.
    """
    form = TranscriptionForm()
+   fail_stale_statuses()
 
    current_statuses = []
-   for transcription in Transcription.objects.all().order_by('submitted'):
+   for transcription in Transcription.objects.in_progress().with_statuses().order_by('submitted'):
       current_status = transcription.current_status()
+      statuses = transcription.statuses.all()
 
       if current_status and current_status.status in [TranscriptionStatus.PENDING]:
          current_status.show_cancel = True
@@ -28,8 +33,8 @@ def index(request):
       elif current_status and current_status.status in [TranscriptionStatus.PROCESSING]:
          # If a processing transcription has been cancelled OR cannot be cancelled do
          # not show the cancel button
-         if transcription.statuses.filter(status=TranscriptionStatus.FAILED, start_time__isnull=True).exists() or \
-            not transcription.statuses.filter(status=TranscriptionStatus.PENDING).exists():
+         if any(status.status == TranscriptionStatus.FAILED and status.start_time is None for status in statuses) or \
+            not any(status.status == TranscriptionStatus.PENDING for status in statuses):
             current_status.show_cancel = False
          else:
             current_status.show_cancel = True
@@ -51,6 +56,9 @@ def index(request):
                'vad_filter': form.cleaned_data['vad_filter'],
                'max_segment_length': form.cleaned_data['max_segment_length'],
                'max_segment_time': form.cleaned_data['max_segment_time'],
+               'mode': form.cleaned_data['mode'],
+               'batch_size': form.cleaned_data['batch_size'],
+               'upload_url': form.cleaned_data['upload_url'],
             },
          )
          saved_transcription.save()
@@ -68,7 +76,8 @@ def index(request):
          if request.FILES:
             saved_transcription.title = Path(request.FILES['upload_file'].name).stem
             saved_transcription.upload_file = form.cleaned_data['upload_file']
-            saved_transcription.save(update_fields=['title', 'upload_file'])
+            saved_transcription.content_hash = get_upload_hash(form.cleaned_data['upload_file'])
+            saved_transcription.save(update_fields=['title', 'upload_file', 'content_hash'])
          # Download media
          elif form.cleaned_data['upload_url']:
             upload_url = form.cleaned_data['upload_url']
@@ -77,10 +86,7 @@ def index(request):
          else:
             return
 
-         if settings.USE_DJANGO_Q:
-            async_task(process_submission, saved_transcription.id, upload_url, form.cleaned_data['diarize'])
-         else:
-            process_submission(saved_transcription.id, upload_url, form.cleaned_data['diarize'])
+         run_task('process_submission', saved_transcription.id, upload_url, form.cleaned_data['diarize'])
 
          return HttpResponseRedirect(reverse('webui:index'))
 
@@ -98,23 +104,12 @@ def view_transcription(request, transcription_id):
 
 def list_transcriptions(request):
    """
-   Renders a list of completed or failed transcriptions.
+   Renders the list of completed or failed transcriptions. Rows are loaded a page at a
+   time from api_transcriptions.
    """
-   completed_transcriptions = []
-
-   for transcription in Transcription.objects.all().prefetch_related('statuses'):
-      status = transcription.current_status()
-
-      # Check for status is None is if transcription was created before the TranscriptionStatus model existed
-      if status is None or status.status in [TranscriptionStatus.COMPLETED, TranscriptionStatus.FAILED]:
-         shown_statuses = []
-         shown_statuses.append(transcription.get_status_of(TranscriptionStatus.DOWNLOADING))
-         shown_statuses.append(transcription.get_status_of(TranscriptionStatus.TRANSCRIBING))
-         shown_statuses.append(transcription.get_status_of(TranscriptionStatus.DIARIZING))
-         transcription.shown_statuses = shown_statuses
-         completed_transcriptions.append(transcription)
-
-   return render(request, 'webui/list.html', {'transcriptions': completed_transcriptions, 'transcriptionstatus': TranscriptionStatus})
+   fail_stale_statuses()
+   has_transcriptions = Transcription.objects.finished().exists()
+   return render(request, 'webui/list.html', {'has_transcriptions': has_transcriptions})
 
 
 def add_segment(request, transcription_id):
@@ -124,19 +119,23 @@ def add_segment(request, transcription_id):
    """
    transcription = get_object_or_404(Transcription, pk=transcription_id)
 
-   Segment(
-      transcription=transcription,
-      start=0,
-      end=0,
-      text=''
-   ).save()
+   with transaction.atomic():
+      Segment(
+         transcription=transcription,
+         start=0,
+         end=0,
+         text=''
+      ).save()
+      Transcription.objects.filter(pk=transcription.pk).bump_version()
+
    return HttpResponseRedirect(reverse('webui:edit', args=[transcription_id]))
 
 
 def edit_transcription(request, transcription_id):
    """
    Renders the edit page for a specific transcription, allowing users to modify segments
-   and speaker assignments. Also handles POST requests for mass updating speaker names.
+   and speaker assignments. Segments are loaded by the page as they are scrolled to.
+   Also handles POST requests for mass updating speaker names.
    """
    transcription = get_object_or_404(Transcription, pk=transcription_id)
    segments = transcription.segments.all()
@@ -147,7 +146,9 @@ def edit_transcription(request, transcription_id):
       speaker_new = request.POST.get('speaker-new', '').strip()
 
       if speaker_old and speaker_new:
-         segments.filter(speaker=speaker_old).update(speaker=speaker_new)
+         with transaction.atomic():
+            segments.filter(speaker=speaker_old).update(speaker=speaker_new)
+            Transcription.objects.filter(pk=transcription.pk).bump_version()
 
       return HttpResponseRedirect(reverse('webui:edit', args=[transcription_id]))
 
@@ -157,6 +158,12 @@ def edit_transcription(request, transcription_id):
    if file_mimetype and file_mimetype.startswith('audio'):
       type = 'audio'
 
+   # Segments are saved while transcribing so a processing transcript can be viewed
+   current_status = transcription.current_status()
+   processing = current_status is not None and current_status.status in [TranscriptionStatus.PENDING, TranscriptionStatus.PROCESSING]
+   # The word list is deferred, so it is checked for without loading it
+   diarizable = bool(settings.HUGGING_FACE_TOKEN and transcription.upload_file) and not processing and Transcription.objects.filter(pk=transcription.pk, word_list__isnull=False).exists()
+
    properties = {
       'id': transcription.id,
       'title': transcription.title,
@@ -165,8 +172,11 @@ def edit_transcription(request, transcription_id):
       'file': transcription.upload_file,
       'type': type,
       'speakers': speakers,
+      'processing': processing,
+      'diarizable': diarizable,
+      'segment_count': segments.count(),
    }
-   return render(request, 'webui/edit.html', {'segments': segments, 'properties': properties})
+   return render(request, 'webui/edit.html', {'properties': properties})
 
 
 def delete_transcription(request, transcription_id):
@@ -187,6 +197,47 @@ def cancel_transcription(request, transcription_id):
    return HttpResponseRedirect(reverse('webui:index'))
 
 
+def resume_transcription(request, transcription_id):
+   """
+   Resumes a failed or cancelled transcription.
+   """
+   transcription = get_object_or_404(Transcription, pk=transcription_id)
+   resume_submission(transcription)
+   return HttpResponseRedirect(reverse('webui:index'))
+
+
+def rediarize_transcription(request, transcription_id):
+   """
+   Reruns diarization of a transcription with new speaker counts. If the segmentations
+   and speaker embeddings of a previous diarization are cached only the clustering step
+   is rerun.
+   """
+   transcription = get_object_or_404(Transcription, pk=transcription_id)
+   form = RediarizeForm(request.POST or None)
+
+   if transcription.statuses.filter(status__in=[TranscriptionStatus.PENDING, TranscriptionStatus.PROCESSING]).exists():
+      messages.error(request, 'The transcription is still processing.')
+   elif not form.is_valid():
+      messages.error(request, 'Invalid number of speakers.')
+   else:
+      TranscriptionStatus.objects.update_or_create(
+         transcription=transcription,
+         process=TranscriptionStatus.DIARIZING,
+         defaults={
+            'status': TranscriptionStatus.PENDING,
+            'error_message': None,
+            'start_time': None,
+            'end_time': None,
+            'progress': 0,
+            'estimated_end_time': None,
+         },
+      )
+      run_task('rediarize_file', transcription.id, form.cleaned_data['num_speakers'], form.cleaned_data['min_speakers'], form.cleaned_data['max_speakers'])
+      return HttpResponseRedirect(reverse('webui:index'))
+
+   return HttpResponseRedirect(reverse('webui:edit', args=[transcription_id]))
+
+
 def custom_400(request, exception = None):
    """
    Renders the custom 400 error page.